@@ -1,89 +1,76 @@
 import asyncio
+import functools
 import logging
+import time
 from datetime import datetime
 
 import pytz
-from py_tools.connections.db.mysql import DBManager, BaseOrmTable, \
-    SQLAlchemyManager
-from sqlalchemy import text
-from sqlalchemy.ext.asyncio import create_async_engine
+from py_tools.connections.db.mysql import DBManager, BaseOrmTable
 
 from bot.command import CommandHandler
 from bot.bot_client import BotClient
+from bot.utils.message_helper import notify_broadcast_finished, \
+    notify_sharing_flagged, send_broadcast_message
 from config import config
-from core.emby_api import EmbyApi, EmbyRouterAPI
+from core.database import create_database_if_not_exists, init_db_client, \
+    init_replica_client, log_db_metrics
+from core.diagnostics import LoopLagMonitor
+from core.emby_api import EmbyApiPool, EmbyRouterAPI
+from core.lease import LeaseManager
+from core.scheduler import Scheduler
+from core.startup import StartupTimer
+from core.webhook_server import EmbyWebhookServer
+from models.schema import get_schema_version, migrate_data, \
+    save_schema_version, schema_fingerprint, sync_schema
 from services import UserService
+from services.ban_cleanup_service import BanCleanupService
+from services.broadcast_service import BroadcastService
+from services.sharing_service import SharingService
+from services.webhook_service import EmbyWebhookService
+from services.invite_code_service import InviteCodeService
+from services.stats_service import StatsService
+from services.user_service import expire_register_public_time
+from utils.logger import setup_logging
 
 # Initialize logger
 logger = logging.getLogger(__name__)
 
 
-async def create_database_if_not_exists() -> None:
-    """创建数据库。"""
-    engine_without_db = create_async_engine(
-        f"mysql+asyncmy://{config.db_user}:{config.db_pass}@"
-        f"{config.db_host}:{config.db_port}/",
-        echo=True,
-    )
-    async with engine_without_db.begin() as conn:
-        query = f"CREATE DATABASE IF NOT EXISTS {config.db_name}"
-        logger.info(f"SQL Query: {query}, Context: Creating database")
-        await conn.execute(text(query))
-    await engine_without_db.dispose()
-
-
 async def _init_db() -> None:
-    """初始化数据库连接并创建表。"""
-    await create_database_if_not_exists()
-
-    db_client = SQLAlchemyManager(
-        host=config.db_host,
-        port=config.db_port,
-        user=config.db_user,
-        password=config.db_pass,
-        db_name=config.db_name,
-    )
-    db_client.init_mysql_engine()
-    DBManager.init_db_client(db_client)
-
+    """
+    初始化数据库连接并创建表，建库与业务查询共用同一个引擎。
+    数据库中记录的表结构指纹与当前模型一致时跳过建表与结构同步。
+    """
+    db_client = init_db_client()
+    await create_database_if_not_exists(db_client.db_engine)
+    init_replica_client()
+
+    fingerprint = schema_fingerprint()
+    if await get_schema_version() == fingerprint:
+        logger.info(f"Schema version {fingerprint[:12]} is up to date, "
+                    f"skipping table creation")
+        return
     async with DBManager.connection() as conn:
         logger.info("Context: Creating tables")
         await conn.run_sync(BaseOrmTable.metadata.create_all)
+        await conn.run_sync(sync_schema)
+        await conn.run_sync(migrate_data)
+    await save_schema_version(fingerprint)
+    logger.info(f"Schema version updated to {fingerprint[:12]}")
 
 
 def _init_logger() -> None:
-    """初始化日志记录器。"""
-    handler = logging.StreamHandler()  # 输出到终端
-    formatter = logging.Formatter(
-        fmt="%(levelname)s [%(asctime)s] %(name)s - %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
+    """初始化日志记录器，文件与终端输出在后台线程中完成。"""
+    setup_logging(
+        level=config.log_level,
+        log_file=config.log_file,
+        fmt=config.log_format,
+        levels=config.log_levels,
+        max_bytes=config.log_max_bytes,
+        rotate_when=config.log_rotate_when,
+        backup_count=config.log_backup_count,
+        debug_sample_rate=config.log_debug_sample_rate,
     )
-    handler.setFormatter(formatter)
-
-    # 添加流处理器
-    logger.addHandler(handler)
-
-    # 设置日志级别
-    logger.setLevel(config.log_level)
-
-    # 如果你需要将日志写入文件，可以继续保持原有的文件配置：
-    file_handler = logging.FileHandler("default.log")
-    file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
-
-    # 创建 logger 并设置级别
-    logger_i = logging.getLogger()
-    logger_i.setLevel(config.log_level)
-
-    # 文件处理器，记录到 default.log
-    file_handler = logging.FileHandler("default.log")
-    file_handler.setFormatter(formatter)
-    logger_i.addHandler(file_handler)
-
-    # 控制台处理器，打印到终端
-    console_handler = logging.StreamHandler()
-    console_handler.setFormatter(formatter)
-    logger_i.addHandler(console_handler)
 
 
 def _init_tz() -> None:
@@ -99,25 +86,147 @@ def _init_tz() -> None:
             )
 
 
-async def setup_bot() -> BotClient:
-    """初始化并启动 Bot 客户端。"""
-    bot_client = BotClient(
+def setup_bot() -> BotClient:
+    """初始化 Bot 客户端，登录在启动阶段中与其他初始化并发进行。"""
+    return BotClient(
         api_id=config.api_id,
         api_hash=config.api_hash,
         bot_token=config.bot_token,
         name="emby_bot",
     )
-    await bot_client.start()
-    return bot_client
 
 
-async def fetch_group_members(bot_client: BotClient) -> None:
-    """获取群组成员并更新配置。"""
-    members_in_group = await bot_client.get_group_members(
-        config.telegram_group_ids)
+async def fetch_group_members(bot_client: BotClient,
+                              user_service: UserService) -> None:
+    """获取群组成员并更新配置，同时记录成员的用户名。"""
+    started = time.perf_counter()
+    try:
+        members_in_group = await bot_client.get_group_members(
+            config.telegram_group_ids)
+    except Exception as e:
+        logger.error(f"获取群组成员失败: {e}", exc_info=True)
+        return
     for group_members in members_in_group.values():
         for telegram_id in group_members:
             config.group_members[telegram_id] = group_members[telegram_id]
+            user_service.username_service.observe(
+                telegram_id, group_members[telegram_id].username)
+    config.group_members_loaded = True
+    logger.info(f"群组成员信息已更新，共 {len(config.group_members)} 人，"
+                f"耗时 {time.perf_counter() - started:.2f}s")
+
+
+async def check_emby_servers(emby_pool: EmbyApiPool) -> None:
+    """启动时检查各 Emby 服务器是否可访问，只记录日志，不影响启动"""
+    online = await asyncio.gather(
+        *(asyncio.to_thread(emby_pool.get(name).check_emby_site)
+          for name in emby_pool.names), return_exceptions=True)
+    for name, ok in zip(emby_pool.names, online, strict=True):
+        if ok is True:
+            logger.info(f"Emby 服务器 {name} 可以访问")
+        else:
+            logger.warning(f"Emby 服务器 {name} 无法访问: {ok}")
+
+
+async def check_router(user_service: UserService) -> None:
+    """启动时获取线路列表，同时确认路由服务可用，失败时由定时任务稍后重试"""
+    try:
+        await user_service.refresh_router_list()
+        logger.info(f"线路列表已加载，共 {len(config.router_list or [])} 条")
+    except Exception as e:
+        logger.warning(f"获取线路列表失败: {e}")
+
+
+def setup_scheduler(user_service: UserService, lease_manager: LeaseManager,
+                    broadcast_service: BroadcastService,
+                    ban_cleanup_service: BanCleanupService,
+                    sharing_service: SharingService) -> Scheduler:
+    """
+    注册定时任务，把过期检查、缓存刷新等工作移出请求路径。
+    singleton 任务在多实例部署时只由持有租约的实例执行。
+    """
+    scheduler = Scheduler(lease_manager=lease_manager)
+    scheduler.add_interval_job(
+        "expire_register_public_time", expire_register_public_time,
+        seconds=30, jitter=5, singleton=True,
+    )
+    # 启动阶段已获取过一次线路列表
+    scheduler.add_interval_job(
+        "refresh_router_list", user_service.refresh_router_list,
+        seconds=600, jitter=30, timeout=60,
+    )
+    # 每个实例各自探测，统计反映本实例到各线路的网络状况
+    scheduler.add_interval_job(
+        "probe_routes", user_service.probe_routes,
+        seconds=config.route_probe_interval, jitter=5, run_on_start=True,
+        timeout=config.route_probe_timeout * 3,
+    )
+    scheduler.add_cron_job(
+        "purge_invite_codes",
+        lambda: InviteCodeService.purge_invite_codes(
+            config.invite_code_retention_days,
+            archive=config.invite_code_archive,
+        ),
+        "30 4 * * *", jitter=60, singleton=True,
+    )
+    # 默认只通过 /clean_banned 预览后手动清理，开启 BAN_CLEANUP_AUTO 后每天自动执行
+    if config.ban_retention_days > 0 and config.ban_cleanup_auto:
+        scheduler.add_cron_job(
+            "cleanup_banned_emby", ban_cleanup_service.cleanup,
+            "0 5 * * *", jitter=60, singleton=True,
+        )
+    scheduler.add_interval_job(
+        "refresh_stats_snapshot", StatsService.refresh_snapshot,
+        seconds=600, jitter=30, singleton=True,
+    )
+    # 新建的群发任务会立即开始，这里负责重启或切换实例后继续未完成的任务
+    scheduler.add_interval_job(
+        "resume_broadcasts", broadcast_service.resume,
+        seconds=30, jitter=5, run_on_start=True, singleton=True,
+    )
+    # 水位保存在数据库中，由持有租约的实例增量同步
+    if config.playback_sync_interval > 0:
+        scheduler.add_interval_job(
+            "sync_playback", user_service.playback_service.sync,
+            seconds=config.playback_sync_interval, jitter=30,
+            run_on_start=True, timeout=config.playback_sync_interval,
+            singleton=True,
+        )
+    # 媒体库：持有租约的实例增量同步并每天全量同步一次（清理已删除的条目），
+    # 每个实例在数据有变化时重建各自的内存索引
+    if config.library_sync_interval > 0:
+        library_service = user_service.library_service
+        scheduler.add_interval_job(
+            "sync_library", library_service.sync,
+            seconds=config.library_sync_interval, jitter=60,
+            run_on_start=True, timeout=1800, singleton=True,
+        )
+        scheduler.add_cron_job(
+            "full_sync_library", library_service.full_sync,
+            "0 4 * * *", jitter=60, singleton=True,
+        )
+        scheduler.add_interval_job(
+            "refresh_library_index", library_service.refresh,
+            seconds=60, jitter=5, run_on_start=True, timeout=300,
+        )
+    # 共享检测：轮询会话记录设备与 IP，每小时评分一次
+    if config.session_poll_interval > 0:
+        scheduler.add_interval_job(
+            "poll_sessions", sharing_service.poll,
+            seconds=config.session_poll_interval, jitter=5,
+            timeout=config.session_poll_interval, singleton=True,
+        )
+        scheduler.add_interval_job(
+            "score_sharing", sharing_service.score,
+            seconds=3600, jitter=60, timeout=600, singleton=True,
+        )
+    # 每个实例写回各自收到的更新中观察到的用户名变化
+    scheduler.add_interval_job(
+        "flush_usernames", user_service.username_service.flush,
+        seconds=10, jitter=2, timeout=60,
+    )
+    scheduler.add_interval_job("log_db_metrics", log_db_metrics, seconds=300)
+    return scheduler
 
 
 async def main() -> None:
@@ -128,36 +237,110 @@ async def main() -> None:
     now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     logger.info(f"程序启动时间: {now}")
 
-    await _init_db()
-    logger.info("数据库初始化完成。")
-
-    # 初始化 Bot 客户端
-    bot_client = await setup_bot()
-    logger.info("Bot 客户端初始化完成。")
-
-    # 初始化 Emby API 和命令处理器
-    emby_api = EmbyApi(config.emby_url, config.emby_api)
-    emby_router_api = EmbyRouterAPI(config.api_url, config.api_key)
+    loop_lag_monitor = None
+    if config.loop_lag_threshold_ms > 0:
+        loop_lag_monitor = LoopLagMonitor(config.loop_lag_threshold_ms)
+        loop_lag_monitor.start()
+
+    # 处理器在登录前注册，数据库就绪前收到的更新会在 bot_client.ready 上等待
+    bot_client = setup_bot()
+    emby_pool = EmbyApiPool.from_config(config.emby_servers)
+    emby_router_api = EmbyRouterAPI(config.api_url, config.api_key,
+                                    timeout=config.router_timeout,
+                                    hedge=config.router_hedge)
+    user_service = UserService(emby_api=emby_pool.default,
+                               emby_router_api=emby_router_api,
+                               emby_pool=emby_pool)
+    lease_manager = LeaseManager(config.instance_id, ttl=config.lease_ttl)
+    broadcast_service = BroadcastService(
+        functools.partial(send_broadcast_message, bot_client.client),
+        functools.partial(notify_broadcast_finished, bot_client.client),
+        rate=config.broadcast_rate,
+        concurrency=config.broadcast_concurrency,
+        batch_size=config.broadcast_batch_size,
+        is_leader=lambda: lease_manager.is_leader(Scheduler.LEASE_NAME),
+    )
+    ban_cleanup_service = BanCleanupService(
+        user_service, config.ban_retention_days,
+        archive=config.ban_cleanup_archive,
+        concurrency=config.ban_cleanup_concurrency,
+    )
+    sharing_service = SharingService(
+        user_service,
+        window_days=config.sharing_window_days,
+        max_ips=config.sharing_max_ips,
+        max_devices=config.sharing_max_devices,
+        max_streams=config.sharing_max_streams,
+        auto_ban=config.sharing_auto_ban,
+        notify=functools.partial(notify_sharing_flagged, bot_client.client),
+    )
     CommandHandler(
         bot_client=bot_client,
-        user_service=UserService(emby_api=emby_api,
-                                 emby_router_api=emby_router_api),
+        user_service=user_service,
+        broadcast_service=broadcast_service,
+        ban_cleanup_service=ban_cleanup_service,
+        sharing_service=sharing_service,
     )
+    # 未配置 WEBHOOK_TOKEN 时在登录前报错退出
+    webhook_server = None
+    if config.webhook_enabled:
+        webhook_server = EmbyWebhookServer(
+            EmbyWebhookService(user_service).handle,
+            host=config.webhook_host,
+            port=config.webhook_port,
+            token=config.webhook_token,
+        )
     logger.info("Emby API 和命令处理器初始化完成。")
 
+    # 数据库、Bot 登录与外部服务检查互不依赖，并发执行
+    timer = StartupTimer()
+    try:
+        await timer.gather([
+            ("database", _init_db()),
+            ("bot_login", bot_client.start()),
+            ("emby_check", check_emby_servers(emby_pool)),
+            ("router_check", check_router(user_service)),
+        ], parallel=config.startup_parallel)
+    except Exception:
+        if bot_client.client.is_connected:
+            await bot_client.stop()
+        raise
+    bot_client.ready.set()
+    logger.info(f"启动完成：{timer.summary()}")
+
+    scheduler = setup_scheduler(user_service, lease_manager,
+                                broadcast_service, ban_cleanup_service,
+                                sharing_service)
+    lease_manager.start()
+    scheduler.start()
+    logger.info(f"定时任务调度器已启动，实例标识: {config.instance_id}")
+
+    if webhook_server is not None:
+        await webhook_server.start()
+
+    # 成员列表在后台加载，加载完成前的成员校验直接向 Telegram 查询
+    members_task = asyncio.create_task(
+        fetch_group_members(bot_client, user_service))
     try:
-        # 获取群组成员
-        await fetch_group_members(bot_client)
-        logger.info("群组成员信息已更新。")
-
-        # 设置命令并进入空闲状态
         logger.info("命令处理器设置完成，Bot 进入运行状态。")
         await bot_client.idle()
 
     except Exception as e:
         logger.error(f"启动 Bot 失败: {e}", exc_info=True)
     finally:
+        members_task.cancel()
+        if webhook_server is not None:
+            await webhook_server.stop()
+        await scheduler.stop()
+        await broadcast_service.stop()
+        try:
+            await user_service.username_service.flush()
+        except Exception as e:
+            logger.warning(f"写回用户名失败: {e}")
+        await lease_manager.stop()
         await bot_client.stop()
+        if loop_lag_monitor is not None:
+            await loop_lag_monitor.stop()
         logger.info("Bot 已停止。")
 
 
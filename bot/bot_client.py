@@ -1,3 +1,4 @@
+import asyncio
 import logging
 
 from pyrogram import Client, idle
@@ -16,6 +17,8 @@ class BotClient:
         self.client = Client(
             name=name, api_id=api_id, api_hash=api_hash, bot_token=bot_token
         )
+        # 启动阶段完成（数据库可用）后设置，之前收到的更新在处理前等待
+        self.ready = asyncio.Event()
         logger.info(f"Bot client initialized with name: {name}")
 
     async def get_group_members(self, group_ids: list[int]):
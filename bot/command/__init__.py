@@ -1,4 +1,5 @@
 import logging
+from typing import Optional
 
 from bot import BotClient
 from bot.command.admin_command import AdminCommandHandler
@@ -6,19 +7,26 @@ from bot.command.event_command import EventHandler
 from bot.command.user_command import UserCommandHandler
 from bot.command_router import setup_command_routes
 from services import UserService
+from services.ban_cleanup_service import BanCleanupService
+from services.broadcast_service import BroadcastService
+from services.sharing_service import SharingService
 
 logger = logging.getLogger(__name__)
 
 
 class CommandHandler:
-    def __init__(self, bot_client: BotClient, user_service: UserService):
+    def __init__(self, bot_client: BotClient, user_service: UserService,
+                 broadcast_service: Optional[BroadcastService] = None,
+                 ban_cleanup_service: Optional[BanCleanupService] = None,
+                 sharing_service: Optional[SharingService] = None):
         self.bot_client = bot_client
         self.user_service = user_service
         self.code_to_message_id = {}
         self.user_command_handler = UserCommandHandler(bot_client,
                                                        user_service)
-        self.admin_command_handler = AdminCommandHandler(bot_client,
-                                                         user_service)
+        self.admin_command_handler = AdminCommandHandler(
+            bot_client, user_service, broadcast_service, ban_cleanup_service,
+            sharing_service)
         self.event_handler = EventHandler(bot_client, user_service)
         setup_command_routes(bot_client, self.user_command_handler,
                              self.admin_command_handler, self.event_handler)
@@ -1,43 +1,87 @@
+import asyncio
+import functools
+import html
+import io
 import logging
+import os
 from datetime import datetime
+from typing import Optional
 
 from pyrogram.enums import ParseMode
 from pyrogram.types import Message
 
 from bot import BotClient
 from bot.utils import with_parsed_args, reply_html, send_error, \
-    with_ensure_args
-from bot.utils.message_helper import get_user_telegram_id
+    with_ensure_args, parse_timestamp_to_normal_date
+from bot.utils.message_helper import get_user_telegram_id, \
+    format_broadcast, notify_broadcast_finished, send_broadcast_message, \
+    format_sharing_review, notify_sharing_flagged
+from config import config
+from core import diagnostics
 from services import UserService
+from services.ban_cleanup_service import BanCleanupService
+from services.broadcast_service import AUDIENCES, BroadcastService
+from services.emby_move_service import EmbyMoveService
+from services.export_service import ExportService, EXPORT_FORMATS
+from services.import_service import ImportService
+from services.invite_code_service import InviteCodeService
+from services.sharing_service import SharingService
+from services.stats_service import StatsService
 
 logger = logging.getLogger(__name__)
 
+PROFILE_MAX_SECONDS = 120
+
 
 class AdminCommandHandler:
-    def __init__(self, bot_client: BotClient, user_service: UserService):
+    def __init__(self, bot_client: BotClient, user_service: UserService,
+                 broadcast_service: Optional[BroadcastService] = None,
+                 ban_cleanup_service: Optional[BanCleanupService] = None,
+                 sharing_service: Optional[SharingService] = None):
         self.bot_client = bot_client
         self.user_service = user_service
         self.code_to_message_id = {}
+        self.move_service = EmbyMoveService(user_service)
+        self.broadcast_service = broadcast_service or BroadcastService(
+            functools.partial(send_broadcast_message, bot_client.client),
+            functools.partial(notify_broadcast_finished, bot_client.client))
+        self.ban_cleanup_service = ban_cleanup_service or BanCleanupService(
+            user_service, config.ban_retention_days,
+            archive=config.ban_cleanup_archive,
+            concurrency=config.ban_cleanup_concurrency)
+        self.sharing_service = sharing_service or SharingService(
+            user_service,
+            window_days=config.sharing_window_days,
+            max_ips=config.sharing_max_ips,
+            max_devices=config.sharing_max_devices,
+            max_streams=config.sharing_max_streams,
+            auto_ban=config.sharing_auto_ban,
+            notify=functools.partial(notify_sharing_flagged,
+                                     bot_client.client))
+        # 保存后台任务的引用，避免被垃圾回收
+        self._background_tasks = set()
         logger.info("AdminCommandHandler initialized")
 
     @with_parsed_args
     async def new_code(self, message: Message, args: list[str]):
         """
-        /new_code [数量]
+        /new_code [数量] [有效天数]
         """
-        num = 1
+        num, expire_days = 1, None
         if args:
             try:
                 num = int(args[0])
+                if len(args) > 1:
+                    expire_days = float(args[1])
             except ValueError:
-                return await reply_html(message,
-                                        "❌ 请输入有效数量 /new_code [整数]")
+                return await reply_html(
+                    message, "❌ 请输入有效数量 /new_code [整数] [有效天数]")
 
         num = min(num, 20)
         try:
             code_list = await (
                 self.user_service
-                .create_invite_code(message.from_user.id, num)
+                .create_invite_code(message.from_user.id, num, expire_days)
             )
             await self.send_code(code_list, message)
         except Exception as e:
@@ -46,21 +90,23 @@ class AdminCommandHandler:
     @with_parsed_args
     async def new_whitelist_code(self, message: Message, args: list[str]):
         """
-        /new_whitelist_code [数量]
+        /new_whitelist_code [数量] [有效天数]
         """
-        num = 1
+        num, expire_days = 1, None
         if args:
             try:
                 num = int(args[0])
+                if len(args) > 1:
+                    expire_days = float(args[1])
             except ValueError:
                 return await reply_html(
                     message,
-                    "❌ 请输入有效数量 /new_whitelist_code [整数]")
+                    "❌ 请输入有效数量 /new_whitelist_code [整数] [有效天数]")
 
         num = min(num, 20)
         try:
             code_list = await self.user_service.create_whitelist_code(
-                message.from_user.id, num)
+                message.from_user.id, num, expire_days)
             await self.send_code(code_list, message, whitelist=True)
         except Exception as e:
             await send_error(message, e, prefix="创建白名单邀请码失败")
@@ -94,6 +140,18 @@ class AdminCommandHandler:
                     message.chat.id, msg.id
                 )
 
+        if code_list:
+            batch_text = f"🗂 批次号：<code>{code_list[0].batch_id}</code>"
+            if code_list[0].expire_time:
+                expire_at = datetime.fromtimestamp(
+                    code_list[0].expire_time).strftime("%Y-%m-%d %H:%M:%S")
+                batch_text += f"\n⏰ 过期时间：<code>{expire_at}</code>"
+            await self.bot_client.client.send_message(
+                chat_id=message.from_user.id,
+                text=batch_text,
+                parse_mode=ParseMode.HTML,
+            )
+
     @with_parsed_args
     async def ban_emby(self, message: Message, args: list[str]):
         """
@@ -102,8 +160,9 @@ class AdminCommandHandler:
         reason = args[0] if args else "管理员禁用"
 
         operator_id = message.from_user.id
-        telegram_id = await get_user_telegram_id(self.bot_client.client,
-                                                 message)
+        telegram_id = await get_user_telegram_id(
+            self.bot_client.client, message,
+            self.user_service.username_service)
         try:
             if await self.user_service.emby_ban(telegram_id, reason,
                                                 operator_id):
@@ -121,8 +180,9 @@ class AdminCommandHandler:
         /unban_emby (群里需回复某人或手动指定)
         """
         operator_id = message.from_user.id
-        telegram_id = await get_user_telegram_id(self.bot_client.client,
-                                                 message)
+        telegram_id = await get_user_telegram_id(
+            self.bot_client.client, message,
+            self.user_service.username_service)
         try:
             if await self.user_service.emby_unban(telegram_id, operator_id):
                 await reply_html(
@@ -178,3 +238,521 @@ class AdminCommandHandler:
             )
         except Exception as e:
             await send_error(message, e, prefix="开放注册失败")
+
+    @with_parsed_args
+    async def export_users(self, message: Message, args: list[str]):
+        """
+        /export_users [csv|jsonl]
+        导出用户表为压缩文件
+        """
+        fmt = args[0].lower() if args else "csv"
+        if fmt not in EXPORT_FORMATS:
+            return await reply_html(message,
+                                    "❌ 用法：/export_users [csv|jsonl]")
+
+        await reply_html(message, "⏳ 正在导出用户数据，请稍候…")
+        path = None
+        try:
+            path, total = await ExportService.export_users(fmt)
+            now = datetime.now().strftime("%Y%m%d%H%M%S")
+            await message.reply_document(
+                path,
+                file_name=f"users-{now}.{fmt}.gz",
+                caption=f"✅ 导出完成，共 {total} 个用户",
+            )
+        except Exception as e:
+            await send_error(message, e, prefix="导出失败")
+        finally:
+            if path and os.path.exists(path):
+                os.remove(path)
+
+    @with_parsed_args
+    async def import_users(self, message: Message, args: list[str]):
+        """
+        /import_users [verify] (回复旧版 Bot 导出的 CSV / JSON / JSONL 文件)
+        批量导入用户，加上 verify 会校验 emby_id 是否存在于 Emby
+        """
+        document_message = message.reply_to_message
+        if not document_message or not document_message.document:
+            return await reply_html(
+                message, "❌ 请回复一个导出文件使用 /import_users [verify]")
+
+        await reply_html(message, "⏳ 正在导入用户数据，请稍候…")
+        path = None
+        try:
+            path = await document_message.download()
+            emby_pool = self.user_service.emby_pool \
+                if args and args[0] == "verify" else None
+            report = await ImportService.import_users(path, emby_pool)
+            reply_text = (
+                f"✅ 导入完成，耗时 <code>{report['elapsed']}s</code>\n"
+                f"• 总行数：<code>{report['total']}</code>\n"
+                f"• 已导入：<code>{report['imported']}</code>\n"
+                f"• 无效行：<code>{report['invalid']}</code>\n"
+                f"• Emby 中不存在的 emby_id：<code>"
+                f"{report['emby_unverified']}</code>\n"
+                f"• 已被其他用户绑定的 emby_id：<code>"
+                f"{report['emby_conflict']}</code>\n"
+            )
+            if report["errors"]:
+                reply_text += "\n".join(
+                    html.escape(error) for error in report["errors"])
+            await reply_html(message, reply_text)
+        except Exception as e:
+            await send_error(message, e, prefix="导入失败")
+        finally:
+            if path and os.path.exists(path):
+                os.remove(path)
+
+    @with_parsed_args
+    @with_ensure_args(2, "/revoke_codes batch &lt;批次号&gt; "
+                         "或 /revoke_codes user &lt;telegram_id&gt;")
+    async def revoke_codes(self, message: Message, args: list[str]):
+        """
+        /revoke_codes batch <批次号>
+        /revoke_codes user <telegram_id>
+        撤销尚未使用的邀请码
+        """
+        scope, target = args[0], args[1]
+        try:
+            if scope == "batch":
+                count = await InviteCodeService.revoke_invite_codes(
+                    message.from_user.id, batch_id=target)
+            elif scope == "user" and target.lstrip("-").isdigit():
+                count = await InviteCodeService.revoke_invite_codes(
+                    message.from_user.id, creator_id=int(target))
+            else:
+                return await reply_html(
+                    message,
+                    "❌ 用法：/revoke_codes batch &lt;批次号&gt; "
+                    "或 /revoke_codes user &lt;telegram_id&gt;")
+            await reply_html(message, f"✅ 已撤销 <code>{count}</code> 个未使用的邀请码")
+        except Exception as e:
+            await send_error(message, e, prefix="撤销邀请码失败")
+
+    async def stats(self, message: Message):
+        """
+        /stats
+        查看用户、邀请码统计及近 7 天趋势
+        """
+        try:
+            daily_stats = await StatsService.get_daily_stats(7)
+            if not daily_stats:
+                return await reply_html(message, "暂无统计数据，请稍后再试")
+
+            snapshot = next(
+                (row for row in daily_stats if row.snapshot_time), None)
+            reply_text = "📊 <b>统计信息</b>\n"
+            if snapshot:
+                snapshot_at = datetime.fromtimestamp(
+                    snapshot.snapshot_time).strftime("%Y-%m-%d %H:%M:%S")
+                reply_text += (
+                    f"• 用户总数：<code>{snapshot.total_users}</code>\n"
+                    f"• Emby 账号：<code>{snapshot.emby_users}</code>\n"
+                    f"• 已禁用：<code>{snapshot.banned_users}</code>\n"
+                    f"• 白名单：<code>{snapshot.whitelist_users}</code>\n"
+                    f"• 未使用邀请码：<code>{snapshot.unused_codes}</code>\n"
+                    f"• 统计时间：<code>{snapshot_at}</code>\n"
+                )
+
+            today = daily_stats[0]
+            if today.day == datetime.now().strftime("%Y-%m-%d"):
+                reply_text += (
+                    f"\n📅 <b>今日</b>：新用户 <code>{today.users_created}</code>，"
+                    f"开号 <code>{today.emby_created}</code>，"
+                    f"禁用 <code>{today.emby_banned}</code>，"
+                    f"解禁 <code>{today.emby_unbanned}</code>，"
+                    f"发码 <code>{today.codes_issued}</code>，"
+                    f"用码 <code>{today.codes_used}</code>\n"
+                )
+
+            reply_text += "\n📈 <b>近 7 天</b>（开号 / 禁用 / 发码 / 用码）：\n"
+            for row in daily_stats:
+                reply_text += (
+                    f"<code>{row.day}  {row.emby_created:>4} "
+                    f"{row.emby_banned:>4} {row.codes_issued:>4} "
+                    f"{row.codes_used:>4}</code>\n"
+                )
+            await reply_html(message, reply_text)
+        except Exception as e:
+            await send_error(message, e, prefix="查询统计失败")
+
+    @staticmethod
+    async def _reply_report(message: Message, report: str, name: str,
+                            caption: str):
+        document = io.BytesIO(report.encode("utf-8"))
+        document.name = f"{name}-{datetime.now():%Y%m%d%H%M%S}.txt"
+        await message.reply_document(document, file_name=document.name,
+                                     caption=caption)
+
+    @with_parsed_args
+    async def profile(self, message: Message, args: list[str]):
+        """
+        /profile [秒数] [sample|cpu]
+        分析运行中的事件循环，sample 为低开销的栈采样，cpu 为 cProfile
+        """
+        seconds, mode = 10, "sample"
+        for arg in args:
+            if arg.isdigit():
+                seconds = int(arg)
+            elif arg in ("sample", "cpu"):
+                mode = arg
+            else:
+                return await reply_html(
+                    message, "❌ 用法：/profile [秒数] [sample|cpu]")
+        if not 1 <= seconds <= PROFILE_MAX_SECONDS:
+            return await reply_html(
+                message, f"❌ 分析时长需在 1 ~ {PROFILE_MAX_SECONDS} 秒之间")
+        if diagnostics.profiling_busy():
+            return await reply_html(message, "❌ 已有分析任务在运行，请稍后再试")
+
+        await reply_html(
+            message, f"⏳ 正在进行 <code>{seconds}s</code> 的 {mode} 分析…")
+        try:
+            if mode == "cpu":
+                report = await diagnostics.profile_cpu(seconds)
+            else:
+                report = await diagnostics.profile_sampling(seconds)
+            await self._reply_report(message, report, f"profile-{mode}",
+                                     f"✅ {mode} 分析完成，耗时 {seconds}s")
+        except Exception as e:
+            await send_error(message, e, prefix="性能分析失败")
+
+    @with_parsed_args
+    async def memsnap(self, message: Message, args: list[str]):
+        """
+        /memsnap [start|stop|条数]
+        开启 tracemalloc 内存追踪，之后每次调用返回占用前 N 的位置及与上次相比的增长
+        """
+        action = args[0].lower() if args else ""
+        try:
+            if action == "stop":
+                diagnostics.stop_memory_tracing()
+                return await reply_html(message, "✅ 已停止内存追踪")
+            if action == "start" or not diagnostics.memory_tracing():
+                diagnostics.start_memory_tracing()
+                return await reply_html(
+                    message,
+                    "✅ 已开始内存追踪，只统计此后分配的内存，"
+                    "稍后再次发送 /memsnap 获取快照")
+            limit = int(action) if action.isdigit() else 30
+            report = await asyncio.to_thread(
+                diagnostics.memory_snapshot, min(limit, 200))
+            await self._reply_report(message, report, "memsnap",
+                                     "✅ 内存快照已生成")
+        except Exception as e:
+            await send_error(message, e, prefix="内存快照失败")
+
+    async def emby_servers(self, message: Message):
+        """
+        /emby_servers
+        查看各 Emby 服务器的账号数、上限与在线状态
+        """
+        try:
+            overview = await self.move_service.server_overview()
+            reply_text = "🖥 <b>Emby 服务器</b>\n"
+            for name, info in overview.items():
+                capacity = info["capacity"] or "不限"
+                reply_text += (
+                    f"{'🟢' if info['online'] else '🔴'} <code>{name}</code>"
+                    f"{'（默认）' if info['default'] else ''}："
+                    f"账号 <code>{info['accounts']}</code> / {capacity}，"
+                    f"权重 {info['weight']:g}\n"
+                )
+            await reply_html(message, reply_text)
+        except Exception as e:
+            await send_error(message, e, prefix="查询 Emby 服务器失败")
+
+    @with_parsed_args
+    @with_ensure_args(2, "/move_emby <源服务器> <目标服务器> [数量]")
+    async def move_emby(self, message: Message, args: list[str]):
+        """
+        /move_emby <源服务器> <目标服务器> [数量]
+        在后台分批把账号迁移到目标服务器，迁移后私聊通知用户新密码
+        """
+        source, target = args[0], args[1]
+        limit = None
+        if len(args) > 2:
+            if not args[2].isdigit():
+                return await reply_html(
+                    message, "❌ 用法：/move_emby &lt;源服务器&gt; "
+                             "&lt;目标服务器&gt; [数量]")
+            limit = int(args[2])
+        pool = self.user_service.emby_pool
+        for name in (source, target):
+            if name not in pool.names:
+                return await reply_html(
+                    message, f"❌ 未知的 Emby 服务器：<code>{name}</code>，"
+                             f"可选：{', '.join(pool.names)}")
+        if source == target:
+            return await reply_html(message, "❌ 源服务器与目标服务器相同")
+        if self.move_service.is_running():
+            return await reply_html(message, "❌ 已有迁移任务在运行，请稍后再试")
+
+        status = await reply_html(
+            message, f"⏳ 开始迁移 <code>{source}</code> → "
+                     f"<code>{target}</code>…")
+        task = asyncio.create_task(
+            self._run_move(status, source, target, limit))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _run_move(self, status: Message, source: str, target: str,
+                        limit: Optional[int]):
+        client = self.bot_client.client
+
+        async def on_moved(user, emby_name: str, password: str):
+            try:
+                await client.send_message(
+                    user.telegram_id,
+                    f"ℹ️ 您的 Emby 账号已迁移到新服务器 <code>{target}</code>\n"
+                    f"用户名：<code>{emby_name}</code>\n"
+                    f"新密码：<code>{password}</code>",
+                    parse_mode=ParseMode.HTML,
+                )
+            except Exception as e:
+                logger.warning(
+                    f"Failed to notify moved user {user.telegram_id}: {e}")
+
+        async def on_progress(report):
+            await status.edit_text(
+                f"⏳ 迁移中 <code>{source}</code> → <code>{target}</code>："
+                f"成功 {report['moved']}，失败 {report['failed']}",
+                parse_mode=ParseMode.HTML)
+
+        try:
+            report = await self.move_service.move_users(
+                source, target, limit=limit,
+                batch_size=config.emby_move_batch_size,
+                on_moved=on_moved, on_progress=on_progress)
+            reply_text = (
+                f"✅ 迁移完成 <code>{source}</code> → <code>{target}</code>：\n"
+                f"• 成功：<code>{report['moved']}</code>\n"
+                f"• 失败：<code>{report['failed']}</code>\n"
+            )
+            if report["errors"]:
+                reply_text += "\n".join(
+                    html.escape(error) for error in report["errors"])
+            await status.edit_text(reply_text, parse_mode=ParseMode.HTML)
+        except Exception as e:
+            logger.error(f"Emby move task failed: {e}", exc_info=True)
+            await status.edit_text(f"❌ 迁移失败：{e}")
+
+    @with_parsed_args
+    async def clean_banned(self, message: Message, args: list[str]):
+        """
+        /clean_banned [天数] [confirm]
+        预览禁用超过保留天数的 Emby 账号，加上 confirm 后在后台删除并解除绑定
+        """
+        confirm = "confirm" in args
+        days_args = [arg for arg in args if arg != "confirm"]
+        retention_days = None
+        if days_args:
+            try:
+                retention_days = float(days_args[0])
+            except ValueError:
+                return await reply_html(
+                    message, "❌ 用法：/clean_banned [天数] [confirm]")
+        if self.ban_cleanup_service.is_running():
+            return await reply_html(message, "❌ 已有清理任务在运行，请稍后再试")
+
+        try:
+            if not confirm:
+                report = await self.ban_cleanup_service.preview(retention_days)
+                return await reply_html(
+                    message, self._format_ban_cleanup_preview(
+                        report, retention_days))
+            status = await reply_html(message, "⏳ 开始清理长期禁用的 Emby 账号…")
+        except Exception as e:
+            return await send_error(message, e, prefix="清理禁用账号失败")
+        task = asyncio.create_task(
+            self._run_ban_cleanup(status, retention_days))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    def _format_ban_cleanup_preview(self, report: dict,
+                                    retention_days: Optional[float]) -> str:
+        days = retention_days or self.ban_cleanup_service.retention_days
+        command = f"/clean_banned {days:g} confirm" \
+            if retention_days else "/clean_banned confirm"
+        if not report["total"]:
+            return f"✅ 没有禁用超过 {days:g} 天的 Emby 账号"
+        reply_text = (
+            f"🧹 <b>长期禁用账号清理预览</b>（未做任何修改）\n"
+            f"• 禁用超过 <code>{days:g}</code> 天的账号："
+            f"<code>{report['total']}</code>\n"
+            f"• 最早禁用时间："
+            f"{parse_timestamp_to_normal_date(report['oldest'])}\n"
+        )
+        for server, count in report["servers"].items():
+            reply_text += f"• 服务器 <code>{server}</code>：{count}\n"
+        reply_text += "\n"
+        for user in report["samples"]:
+            reply_text += (
+                f"<code>{user.telegram_id}</code> "
+                f"{html.escape(user.emby_name or '')} "
+                f"{parse_timestamp_to_normal_date(user.ban_time)} "
+                f"{html.escape(user.reason or '')}\n"
+            )
+        if report["total"] > len(report["samples"]):
+            reply_text += f"…共 {report['total']} 个\n"
+        archive = "，删除前写入归档表" if self.ban_cleanup_service.archive \
+            else ""
+        reply_text += (f"\n确认后发送 <code>{command}</code> "
+                       f"删除这些 Emby 账号{archive}")
+        return reply_text
+
+    async def _run_ban_cleanup(self, status: Message,
+                               retention_days: Optional[float]):
+        async def on_progress(report):
+            await status.edit_text(
+                f"⏳ 清理中：已删除 {report['deleted']}，失败 {report['failed']}")
+
+        try:
+            report = await self.ban_cleanup_service.cleanup(
+                retention_days, on_progress=on_progress)
+            reply_text = (
+                f"✅ 长期禁用账号清理完成：\n"
+                f"• 已删除：<code>{report['deleted']}</code>\n"
+                f"• 已解禁或换绑而跳过：<code>{report['skipped']}</code>\n"
+                f"• 失败：<code>{report['failed']}</code>\n"
+            )
+            if report["errors"]:
+                reply_text += "\n".join(
+                    html.escape(error) for error in report["errors"])
+            await status.edit_text(reply_text, parse_mode=ParseMode.HTML)
+        except Exception as e:
+            logger.error(f"Banned account cleanup failed: {e}", exc_info=True)
+            await status.edit_text(f"❌ 清理失败：{e}")
+
+    @with_parsed_args
+    @with_ensure_args(1, "/broadcast &lt;接收者范围&gt; &lt;内容&gt;")
+    async def broadcast(self, message: Message, args: list[str]):
+        """
+        /broadcast <接收者范围> <内容>
+        向符合条件的用户私聊群发消息，也可以回复一条消息并只写接收者范围
+        """
+        audience = args[0]
+        if audience not in AUDIENCES:
+            return await reply_html(
+                message, "❌ 可选的接收者范围：\n" + "\n".join(
+                    f"<code>{name}</code> - {desc}"
+                    for name, (desc, _) in AUDIENCES.items()))
+        parts = message.text.split(None, 2)
+        content = parts[2].strip() if len(parts) > 2 else ""
+        if not content and message.reply_to_message:
+            content = message.reply_to_message.text or ""
+        if not content:
+            return await reply_html(message, "❌ 群发内容不能为空")
+        try:
+            broadcast = await self.broadcast_service.create(
+                content, audience, message.from_user.id)
+            await reply_html(
+                message, format_broadcast(broadcast)
+                + "\n完成后会私聊通知您，"
+                  f"可用 /broadcast_cancel {broadcast.id} 取消")
+        except Exception as e:
+            await send_error(message, e, prefix="创建群发任务失败")
+
+    @with_parsed_args
+    async def broadcast_status(self, message: Message, args: list[str]):
+        """
+        /broadcast_status [任务编号]
+        查看指定群发任务或最近 5 个任务的进度
+        """
+        try:
+            if args and args[0].isdigit():
+                broadcast = await self.broadcast_service.get(int(args[0]))
+                if broadcast is None:
+                    return await reply_html(message, "❌ 群发任务不存在")
+                broadcasts = [broadcast]
+            else:
+                broadcasts = await self.broadcast_service.recent()
+            if not broadcasts:
+                return await reply_html(message, "暂无群发任务")
+            await reply_html(message,
+                             "\n".join(map(format_broadcast, broadcasts)))
+        except Exception as e:
+            await send_error(message, e, prefix="查询群发任务失败")
+
+    @with_parsed_args
+    @with_ensure_args(1, "/broadcast_cancel &lt;任务编号&gt;")
+    async def broadcast_cancel(self, message: Message, args: list[str]):
+        """
+        /broadcast_cancel <任务编号>
+        取消正在进行的群发任务
+        """
+        if not args[0].isdigit():
+            return await reply_html(message, "❌ 请输入有效的任务编号")
+        try:
+            if await self.broadcast_service.cancel(int(args[0])):
+                await reply_html(message, "✅ 群发任务已取消，正在发送的一批完成后停止")
+            else:
+                await reply_html(message, "❌ 任务不存在或已结束")
+        except Exception as e:
+            await send_error(message, e, prefix="取消群发任务失败")
+
+    @with_parsed_args
+    async def sharing(self, message: Message, args: list[str]):
+        """
+        /sharing [审核编号]
+        查看疑似共享账号的审核队列，指定编号时显示该用户最近使用的设备与 IP
+        """
+        try:
+            if not args:
+                reviews = await self.sharing_service.pending()
+                if not reviews:
+                    return await reply_html(message, "✅ 没有待审核的账号")
+                return await reply_html(
+                    message, "".join(map(format_sharing_review, reviews))
+                    + "\n/sharing &lt;编号&gt; 查看详情")
+            if not args[0].isdigit():
+                return await reply_html(message, "❌ 请输入有效的审核编号")
+            review = await self.sharing_service.get(int(args[0]))
+            if review is None:
+                return await reply_html(message, "❌ 审核记录不存在")
+            reply_text = format_sharing_review(review) + "\n"
+            for o in await self.sharing_service.observations(
+                    review.telegram_id):
+                reply_text += (
+                    f"• {o.day} <code>{html.escape(o.ip)}</code> "
+                    f"{html.escape(o.device_name or o.device_id)}"
+                    f"（{o.samples} 次）\n"
+                )
+            reply_text += (
+                f"\n/sharing_ban {review.id} 禁用账号，"
+                f"/sharing_dismiss {review.id} 标记为正常")
+            await reply_html(message, reply_text)
+        except Exception as e:
+            await send_error(message, e, prefix="查询审核队列失败")
+
+    @with_parsed_args
+    @with_ensure_args(1, "/sharing_ban &lt;审核编号&gt;")
+    async def sharing_ban(self, message: Message, args: list[str]):
+        """
+        /sharing_ban <审核编号>
+        禁用疑似共享账号的用户
+        """
+        await self._resolve_sharing(message, args[0], ban=True)
+
+    @with_parsed_args
+    @with_ensure_args(1, "/sharing_dismiss &lt;审核编号&gt;")
+    async def sharing_dismiss(self, message: Message, args: list[str]):
+        """
+        /sharing_dismiss <审核编号>
+        标记为正常使用，统计窗口内不再重复标记
+        """
+        await self._resolve_sharing(message, args[0], ban=False)
+
+    async def _resolve_sharing(self, message: Message, review_id: str,
+                               ban: bool):
+        if not review_id.isdigit():
+            return await reply_html(message, "❌ 请输入有效的审核编号")
+        try:
+            review = await self.sharing_service.resolve(
+                int(review_id), message.from_user.id, ban=ban)
+            result = "已禁用该用户的 Emby 账号" if ban else "已标记为正常使用"
+            await reply_html(
+                message, f"✅ 审核 <code>{review.id}</code>：{result}")
+        except Exception as e:
+            await send_error(message, e, prefix="处理审核失败")
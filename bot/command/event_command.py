@@ -29,6 +29,20 @@ class EventHandler:
                     await callback_query.answer("尚未加载线路列表，请稍后重试")
                     return
 
+                if index == "auto":
+                    selected_router = \
+                        await self.user_service.auto_select_router(
+                            callback_query.from_user.id)
+                    stats = self.user_service.get_route_stats(
+                        selected_router["index"])
+                    await callback_query.answer("线路已更新")
+                    await callback_query.message.edit(
+                        f"已自动选择 <b>{selected_router['name']}</b>"
+                        f"（延迟约 {stats['p50']:.0f}ms）\n"
+                        "生效可能会有 30 秒延迟，请耐心等候。"
+                    )
+                    return
+
                 selected_router = next(
                     (r for r in config.router_list if r['index'] == index),
                     None)
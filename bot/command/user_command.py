@@ -1,15 +1,18 @@
+import html
 import logging
 from datetime import datetime
 
 from pyrogram.types import Message, InlineKeyboardButton, InlineKeyboardMarkup
 
 from bot import BotClient
-from bot.utils import reply_html, send_error, parse_iso8601_to_normal_date, \
-    with_parsed_args, with_ensure_args
+from bot.utils import reply_html, send_error, with_parsed_args, \
+    with_ensure_args
 from bot.utils.message_helper import get_user_telegram_id
 from config import config
 from models.invite_code_model import InviteCodeType
 from services import UserService
+from services.playback_service import RANK_PERIODS
+from utils.time_helper import format_duration
 
 logger = logging.getLogger(__name__)
 
@@ -53,15 +56,14 @@ class UserCommandHandler:
         /info
         如果是私聊，查看自己信息；如果群里回复某人，则查看对方信息
         """
-        telegram_id = await get_user_telegram_id(self.bot_client.client,
-                                                 message)
+        telegram_id = await get_user_telegram_id(
+            self.bot_client.client, message,
+            self.user_service.username_service)
         try:
-            user, emby_info = await self.user_service.emby_info(telegram_id)
-            last_active = (
-                parse_iso8601_to_normal_date(emby_info.get("LastActivityDate"))
-                if emby_info.get("LastActivityDate") else "无")
-            date_created = parse_iso8601_to_normal_date(
-                emby_info.get("DateCreated", ""))
+            user, emby_profile = await self.user_service.emby_info(
+                telegram_id)
+            last_active = emby_profile["last_activity_date"] or "无"
+            date_created = emby_profile["date_created"]
             ban_status = "正常" if (
                     user.ban_time is None or user.ban_time == 0) else "已禁用"
 
@@ -82,10 +84,73 @@ class UserCommandHandler:
                 if user.reason:
                     reply_text += f"• 被ban原因：<code>{user.reason}</code>\n"
 
+            if config.playback_sync_interval > 0:
+                watched = await self.user_service.playback_service \
+                    .user_summary(user.telegram_id)
+                reply_text += (
+                    f"• 观看时长：今日 <code>{format_duration(watched['today'])}"
+                    f"</code>，近 7 天 <code>{format_duration(watched['week'])}"
+                    f"</code>，累计 <code>{format_duration(watched['total'])}"
+                    f"</code>（{watched['plays']} 次播放）\n"
+                )
+
             await reply_html(message, reply_text)
         except Exception as e:
             await send_error(message, e, prefix="查询失败")
 
+    @with_parsed_args
+    async def rank(self, message: Message, args: list[str]):
+        """
+        /rank [day|week|month|all]
+        查看观看时长排行榜，默认近 7 天
+        """
+        period = args[0].lower() if args else "week"
+        if period not in RANK_PERIODS:
+            return await reply_html(
+                message, "❌ 用法：/rank [day|week|month|all]")
+        try:
+            ranking = await self.user_service.playback_service.rank(period)
+            title = RANK_PERIODS[period][0]
+            if not ranking:
+                return await reply_html(message, f"📊 {title}暂无观看记录")
+            reply_text = f"🏆 <b>{title}观看时长排行</b>\n"
+            for i, item in enumerate(ranking, start=1):
+                reply_text += (
+                    f"{i}. <code>{html.escape(item['emby_name'] or '匿名')}</code>："
+                    f"{format_duration(item['duration'])}"
+                    f"（{item['plays']} 次）\n"
+                )
+            await reply_html(message, reply_text)
+        except Exception as e:
+            await send_error(message, e, prefix="查询失败")
+
+    @with_parsed_args
+    @with_ensure_args(1, "/search <关键词>")
+    async def search(self, message: Message, args: list[str]):
+        """
+        /search <关键词>
+        搜索片库，支持标题、原名、拼音与拼音首字母
+        """
+        query = " ".join(args)
+        try:
+            items = self.user_service.library_service.search(query)
+            if not items:
+                return await reply_html(
+                    message, f"🔍 没有找到与 {html.escape(query)} 相关的影片")
+            reply_text = f"🔍 <b>{html.escape(query)}</b> 的搜索结果：\n"
+            for item in items:
+                icon, kind = ("📺", "剧集") if item["item_type"] == "Series" \
+                    else ("🎬", "电影")
+                reply_text += f"{icon} {html.escape(item['name'])}"
+                if item["year"]:
+                    reply_text += f" ({item['year']})"
+                if item["original_title"]:
+                    reply_text += f" {html.escape(item['original_title'])}"
+                reply_text += f" · {kind}\n"
+            await reply_html(message, reply_text)
+        except Exception as e:
+            await send_error(message, e, prefix="搜索失败")
+
     @with_parsed_args
     @with_ensure_args(1, "/use_code <邀请码>")
     async def use_code(self, message: Message, args: list[str]):
@@ -138,6 +203,7 @@ class UserCommandHandler:
             user_router_index = user_router.get('index', '')
             message_text = f"当前线路：<code>{user_router_index}</code>\n请选择线路："
             message_buttons = []
+            has_healthy_route = False
 
             for router in router_list:
                 index = router.get('index')
@@ -145,6 +211,13 @@ class UserCommandHandler:
                 # 已选线路高亮
                 button_text = f"🔵 {name}" if index == user_router_index \
                     else f"⚪ {name}"
+                stats = self.user_service.get_route_stats(index)
+                if stats and stats["healthy"]:
+                    has_healthy_route = True
+                    button_text += (f" · {stats['p50']:.0f}ms"
+                                    f" · {stats['availability']:.0%}")
+                elif stats:
+                    button_text += " · 🔴 不可用"
                 (
                     message_buttons
                     .append(
@@ -154,6 +227,11 @@ class UserCommandHandler:
                     )
                 )
 
+            if has_healthy_route:
+                message_text += "\n（延迟为中位数，百分比为近期可用率）"
+                message_buttons.insert(0, [InlineKeyboardButton(
+                    "⚡ 自动选择最快线路", callback_data="SELECTROUTE_auto")])
+
             keyboard = InlineKeyboardMarkup(message_buttons)
             await reply_html(message, message_text, reply_markup=keyboard)
         except Exception as e:
@@ -217,17 +295,34 @@ class UserCommandHandler:
             "/select_line - 选择线路\n"
             "/reset_emby_password - 重置Emby账号密码\n"
             "/count - 查看服务器内影片数量\n"
+            "/rank [day|week|month|all] - 查看观看时长排行榜\n"
+            "/search &lt;关键词&gt; - 搜索片库（支持拼音与首字母）\n"
             "/help - 显示本帮助\n"
         )
         if await self.user_service.is_admin(message.from_user.id):
             help_message += (
                 "\n<b>管理命令：</b>\n"
-                "/new_code [数量] - 创建新的普通邀请码\n"
-                "/new_whitelist_code [数量] - 创建新的白名单邀请码\n"
+                "/new_code [数量] [有效天数] - 创建新的普通邀请码\n"
+                "/new_whitelist_code [数量] [有效天数] - 创建新的白名单邀请码\n"
+                "/revoke_codes batch|user [批次号|ID] - 撤销未使用的邀请码\n"
                 "/register_until [YYYY-MM-DD HH:MM:SS] - 限时开放注册\n"
                 "/register_amount [人数] - 开放指定注册名额\n"
                 "/info (群里回复某人) - 查看他人信息\n"
                 "/ban_emby [原因] - 禁用某用户的Emby账号\n"
                 "/unban_emby - 解禁某用户的Emby账号\n"
+                "/stats - 查看用户与邀请码统计\n"
+                "/export_users [csv|jsonl] - 导出用户数据（私聊）\n"
+                "/import_users [verify] - 回复导出文件批量导入用户（私聊）\n"
+                "/profile [秒数] [sample|cpu] - 分析事件循环性能（私聊）\n"
+                "/memsnap [start|stop|条数] - 内存占用快照（私聊）\n"
+                "/emby_servers - 查看各 Emby 服务器的账号数与状态\n"
+                "/move_emby &lt;源&gt; &lt;目标&gt; [数量] - 批量迁移 Emby 账号\n"
+                "/clean_banned [天数] [confirm] - 预览并清理长期禁用的 Emby 账号\n"
+                "/broadcast &lt;范围&gt; &lt;内容&gt; - 向用户群发消息（私聊）\n"
+                "/broadcast_status [编号] - 查看群发进度\n"
+                "/broadcast_cancel &lt;编号&gt; - 取消群发\n"
+                "/sharing [编号] - 查看疑似共享账号的审核队列（私聊）\n"
+                "/sharing_ban &lt;编号&gt; - 禁用疑似共享的账号（私聊）\n"
+                "/sharing_dismiss &lt;编号&gt; - 标记为正常使用（私聊）\n"
             )
         await reply_html(message, help_message)
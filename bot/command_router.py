@@ -21,6 +21,8 @@ def setup_command_routes(bot_client: BotClient,
         ),
         ("count", user_in_group_on_filter, user_command_handler.count),
         ("info", user_in_group_on_filter, user_command_handler.info),
+        ("rank", user_in_group_on_filter, user_command_handler.rank),
+        ("search", user_in_group_on_filter, user_command_handler.search),
         ("use_code", filters.private & user_in_group_on_filter,
          user_command_handler.use_code),
         ("create", filters.private & user_in_group_on_filter,
@@ -40,6 +42,34 @@ def setup_command_routes(bot_client: BotClient,
          admin_command_handler.register_until),
         ("register_amount", admin_user_on_filter,
          admin_command_handler.register_amount),
+        ("export_users", filters.private & admin_user_on_filter,
+         admin_command_handler.export_users),
+        ("import_users", filters.private & admin_user_on_filter,
+         admin_command_handler.import_users),
+        ("revoke_codes", admin_user_on_filter,
+         admin_command_handler.revoke_codes),
+        ("stats", admin_user_on_filter, admin_command_handler.stats),
+        ("profile", filters.private & admin_user_on_filter,
+         admin_command_handler.profile),
+        ("memsnap", filters.private & admin_user_on_filter,
+         admin_command_handler.memsnap),
+        ("emby_servers", admin_user_on_filter,
+         admin_command_handler.emby_servers),
+        ("move_emby", admin_user_on_filter, admin_command_handler.move_emby),
+        ("clean_banned", filters.private & admin_user_on_filter,
+         admin_command_handler.clean_banned),
+        ("broadcast", filters.private & admin_user_on_filter,
+         admin_command_handler.broadcast),
+        ("broadcast_status", admin_user_on_filter,
+         admin_command_handler.broadcast_status),
+        ("broadcast_cancel", admin_user_on_filter,
+         admin_command_handler.broadcast_cancel),
+        ("sharing", filters.private & admin_user_on_filter,
+         admin_command_handler.sharing),
+        ("sharing_ban", filters.private & admin_user_on_filter,
+         admin_command_handler.sharing_ban),
+        ("sharing_dismiss", filters.private & admin_user_on_filter,
+         admin_command_handler.sharing_dismiss),
     ]
 
     # 循环注册消息处理器
@@ -68,6 +98,24 @@ def setup_command_routes(bot_client: BotClient,
 
             make_handler()
 
+    # 分组 -1 先于命令处理器执行且不影响后续分组：等待启动完成，并记录发送者的用户名
+    username_service = user_command_handler.user_service.username_service
+
+    @bot_client.client.on_message(group=-1)
+    async def before_message(_, message):
+        await bot_client.ready.wait()
+        if message.from_user:
+            username_service.observe(message.from_user.id,
+                                     message.from_user.username)
+        for member in message.new_chat_members or ():
+            username_service.observe(member.id, member.username)
+
+    @bot_client.client.on_callback_query(group=-1)
+    async def before_callback_query(_, callback_query):
+        await bot_client.ready.wait()
+        username_service.observe(callback_query.from_user.id,
+                                 callback_query.from_user.username)
+
     # 注册回调查询处理器
     @bot_client.client.on_callback_query()
     async def c_select_line_cb(client, callback_query):
@@ -1,5 +1,7 @@
 import logging
 
+from pyrogram.enums import ChatMemberStatus
+from pyrogram.errors import UserNotParticipant
 from pyrogram.filters import create
 
 from config import config
@@ -8,12 +10,34 @@ from services import UserService
 logger = logging.getLogger(__name__)
 
 
-async def user_in_group_on_filter(_, __, update) -> bool:
+async def _is_group_member(client, telegram_id: int) -> bool:
+    """成员列表尚未加载完成时，直接向 Telegram 查询成员身份并补充到列表中"""
+    for group_id in config.telegram_group_ids:
+        try:
+            member = await client.get_chat_member(int(group_id), telegram_id)
+        except UserNotParticipant:
+            continue
+        except Exception as e:
+            logger.warning(f"Error checking membership of user {telegram_id} "
+                           f"in group {group_id}: {e}")
+            continue
+        if member.status not in (ChatMemberStatus.LEFT,
+                                 ChatMemberStatus.BANNED):
+            config.group_members[telegram_id] = member.user
+            return True
+    return False
+
+
+async def user_in_group_on_filter(_, client, update) -> bool:
     user = update.from_user or update.sender_chat
     telegram_id = user.id
     if config.group_members and telegram_id in config.group_members:
         logger.debug(f"User {telegram_id} is in group")
         return True
+    if not config.group_members_loaded \
+            and await _is_group_member(client, telegram_id):
+        logger.debug(f"User {telegram_id} is in group (checked online)")
+        return True
     if config.channel_members and telegram_id in config.channel_members:
         logger.debug(f"User {telegram_id} is in channel")
         return True
@@ -26,7 +50,8 @@ async def admin_user_on_filter(_, __, update) -> bool:
     user = update.from_user or update.sender_chat
     telegram_id = user.id
     try:
-        user = await UserService.get_or_create_user_by_telegram_id(telegram_id)
+        user = await UserService.get_or_create_user_by_telegram_id(
+            telegram_id, read_replica=True)
         if user.is_admin:
             logger.debug(f"User {telegram_id} is an admin")
             return True
@@ -45,7 +70,8 @@ async def emby_user_on_filter(_, __, update) -> bool:
     user = update.from_user or update.sender_chat
     telegram_id = user.id
     try:
-        user = await UserService.get_or_create_user_by_telegram_id(telegram_id)
+        user = await UserService.get_or_create_user_by_telegram_id(
+            telegram_id, read_replica=True)
         if user.has_emby_account() and not user.is_emby_baned():
             logger.debug(f"User {telegram_id} is an Emby user")
             return True
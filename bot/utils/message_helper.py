@@ -1,11 +1,27 @@
 import logging
+from typing import List, Optional
 
-from pyrogram.errors import UsernameNotOccupied, PeerIdInvalid
+from pyrogram.enums import ParseMode
+from pyrogram.errors import UsernameNotOccupied, PeerIdInvalid, FloodWait, \
+    InputUserDeactivated, UserDeactivated, UserDeactivatedBan, UserIsBlocked
+
+from config import config
+from models import Broadcast, SharingReview
+from services.broadcast_service import AUDIENCES, RecipientUnreachable, \
+    RetryAfter
+from services.username_service import UsernameService
+from utils.time_helper import parse_timestamp_to_normal_date
 
 logger = logging.getLogger(__name__)
 
 
-async def get_user_telegram_id(client, message):
+async def get_user_telegram_id(client, message,
+                               username_service: Optional[
+                                   UsernameService] = None):
+    """
+    获取命令针对的用户：默认是自己，回复消息时为被回复的人，也可以用参数指定 ID 或 @username。
+    用户名优先通过 username_service 从缓存与数据库解析，都查不到时才请求 Telegram。
+    """
     # 默认获取自己的 ID
     telegram_id = message.from_user.id
     telegram_username = None
@@ -33,11 +49,25 @@ async def get_user_telegram_id(client, message):
             logger.debug(
                 f"Telegram username from arguments: {telegram_username}")
 
+    if telegram_username and username_service is not None:
+        try:
+            resolved = await username_service.lookup(telegram_username)
+        except Exception as e:
+            resolved = None
+            logger.warning(f"Username lookup failed, falling back to "
+                           f"Telegram: {e}")
+        if resolved is not None:
+            logger.debug(f"Telegram ID resolved from cache for username "
+                         f"{telegram_username}: {resolved}")
+            return resolved
+
     # 通过用户名查找 ID
     if telegram_username:
         try:
             user = await client.get_users(telegram_username)
             telegram_id = user.id
+            if username_service is not None:
+                username_service.observe(user.id, user.username)
             logger.debug(
                 f"Telegram ID resolved from username "
                 f"{telegram_username}: "
@@ -64,3 +94,63 @@ async def get_user_telegram_id(client, message):
             return None
 
     return telegram_id
+
+
+async def send_broadcast_message(client, telegram_id: int, text: str):
+    """群发单条消息，把 Pyrogram 的异常转换为 BroadcastService 约定的异常"""
+    try:
+        await client.send_message(telegram_id, text)
+    except FloodWait as e:
+        raise RetryAfter(e.value) from e
+    except (UserIsBlocked, InputUserDeactivated, UserDeactivated,
+            UserDeactivatedBan, PeerIdInvalid) as e:
+        raise RecipientUnreachable(str(e)) from e
+
+
+def format_broadcast(broadcast: Broadcast) -> str:
+    """群发任务的进度说明（HTML）"""
+    text = (
+        f"📣 群发任务 <code>{broadcast.id}</code>（{broadcast.status}）\n"
+        f"• 接收者：{AUDIENCES[broadcast.audience][0]}，"
+        f"共 <code>{broadcast.total}</code> 人\n"
+        f"• 已处理：<code>{broadcast.processed()}</code>\n"
+        f"• 送达：<code>{broadcast.delivered}</code>\n"
+        f"• 已屏蔽/注销：<code>{broadcast.blocked}</code>\n"
+        f"• 失败：<code>{broadcast.failed}</code>\n"
+    )
+    if broadcast.finish_time:
+        finish_time = parse_timestamp_to_normal_date(broadcast.finish_time)
+        text += f"• 结束时间：{finish_time}\n"
+    return text
+
+
+def format_sharing_review(review: SharingReview) -> str:
+    """疑似共享账号审核记录的说明（HTML）"""
+    return (
+        f"🔍 审核 <code>{review.id}</code>（{review.status}）："
+        f"用户 <code>{review.telegram_id}</code>，"
+        f"IP {review.distinct_ips} 个，设备 {review.distinct_devices} 个，"
+        f"最多同时播放 {review.peak_streams} 个\n"
+    )
+
+
+async def notify_sharing_flagged(client, reviews: List[SharingReview]):
+    """有新的疑似共享账号时通知所有管理员"""
+    text = "⚠️ <b>发现疑似共享的账号</b>\n" + "".join(
+        map(format_sharing_review, reviews[:20]))
+    if len(reviews) > 20:
+        text += f"…共 {len(reviews)} 个\n"
+    text += "\n/sharing 查看审核队列"
+    for admin_id in config.admin_list:
+        try:
+            await client.send_message(admin_id, text,
+                                      parse_mode=ParseMode.HTML)
+        except Exception as e:
+            logger.warning(f"Failed to notify admin {admin_id}: {e}")
+
+
+async def notify_broadcast_finished(client, broadcast: Broadcast):
+    """群发完成后通知发起人"""
+    await client.send_message(
+        broadcast.created_by, "✅ 群发完成\n" + format_broadcast(broadcast),
+        parse_mode=ParseMode.HTML)
@@ -1,5 +1,7 @@
+import json
 import logging
 import os
+import socket
 
 from dotenv import load_dotenv
 
@@ -13,6 +15,15 @@ class Config:
     def __init__(self):
         self.timezone = os.getenv("TIMEZONE")
         self.log_level = os.getenv("LOG_LEVEL", "INFO")
+        # 日志文件为空时只输出到终端；设置 LOG_ROTATE_WHEN 后按时间轮转，否则按大小轮转
+        self.log_file = os.getenv("LOG_FILE", "default.log")
+        self.log_format = os.getenv("LOG_FORMAT", "text").lower()
+        self.log_levels = os.getenv("LOG_LEVELS", "")
+        self.log_max_bytes = int(os.getenv("LOG_MAX_BYTES", "10485760"))
+        self.log_rotate_when = os.getenv("LOG_ROTATE_WHEN", "")
+        self.log_backup_count = int(os.getenv("LOG_BACKUP_COUNT", "7"))
+        self.log_debug_sample_rate = int(
+            os.getenv("LOG_DEBUG_SAMPLE_RATE", "1"))
         self.bot_token = os.getenv("BOT_TOKEN")
         self.api_id = os.getenv("API_ID")
         self.api_hash = os.getenv("API_HASH")
@@ -21,17 +32,128 @@ class Config:
         )
         self.emby_url = os.getenv("EMBY_URL")
         self.emby_api = os.getenv("EMBY_API_KEY")
+        # 多台 Emby 服务器（JSON 数组），未配置时只使用 EMBY_URL 这一台；
+        # 第一台为默认服务器，存量账号都归属于它
+        self.emby_servers = json.loads(os.getenv("EMBY_SERVERS") or "[]") \
+            or [{"name": "default", "url": self.emby_url,
+                 "api_key": self.emby_api}]
+        # 新账号的分配策略：capacity 按账号数，load 按正在播放的会话数
+        self.emby_placement = os.getenv("EMBY_PLACEMENT", "capacity").lower()
+        self.emby_move_batch_size = int(
+            os.getenv("EMBY_MOVE_BATCH_SIZE", "20"))
+        # Emby 用户资料缓存（/info 使用）的有效期（秒）与容量
+        self.emby_user_cache_ttl = float(
+            os.getenv("EMBY_USER_CACHE_TTL", "300"))
+        self.emby_user_cache_size = int(
+            os.getenv("EMBY_USER_CACHE_SIZE", "10000"))
+        self.emby_count_cache_ttl = float(
+            os.getenv("EMBY_COUNT_CACHE_TTL", "300"))
+        # Emby webhook 接收服务，开启后可调大上面的缓存有效期
+        self.webhook_enabled = os.getenv(
+            "WEBHOOK_ENABLED", "false").lower() == "true"
+        self.webhook_host = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+        self.webhook_port = int(os.getenv("WEBHOOK_PORT", "8081"))
+        self.webhook_token = os.getenv("WEBHOOK_TOKEN", "")
+        # 邀请码默认有效天数（0 为永不过期）、已使用邀请码保留天数、清理时是否归档
+        self.invite_code_expire_days = float(
+            os.getenv("INVITE_CODE_EXPIRE_DAYS", "0"))
+        self.invite_code_retention_days = float(
+            os.getenv("INVITE_CODE_RETENTION_DAYS", "30"))
+        self.invite_code_archive = os.getenv(
+            "INVITE_CODE_ARCHIVE", "false").lower() == "true"
+        # 禁用超过多少天的 Emby 账号会被清理（0 为不清理）、是否每天自动清理、
+        # 删除前是否归档，以及同时进行的 Emby 删除请求数
+        self.ban_retention_days = float(
+            os.getenv("BAN_RETENTION_DAYS", "0"))
+        self.ban_cleanup_auto = os.getenv(
+            "BAN_CLEANUP_AUTO", "false").lower() == "true"
+        self.ban_cleanup_archive = os.getenv(
+            "BAN_CLEANUP_ARCHIVE", "true").lower() == "true"
+        self.ban_cleanup_concurrency = int(
+            os.getenv("BAN_CLEANUP_CONCURRENCY", "5"))
+        # 从 Playback Reporting 插件同步播放记录的间隔（秒，0 为不同步）与每批条数
+        self.playback_sync_interval = int(
+            os.getenv("PLAYBACK_SYNC_INTERVAL", "0"))
+        self.playback_sync_batch_size = int(
+            os.getenv("PLAYBACK_SYNC_BATCH_SIZE", "1000"))
+        # 从 Emby 增量同步媒体库到搜索索引的间隔（秒，0 为不同步）与每页条数
+        self.library_sync_interval = int(
+            os.getenv("LIBRARY_SYNC_INTERVAL", "3600"))
+        self.library_sync_page_size = int(
+            os.getenv("LIBRARY_SYNC_PAGE_SIZE", "500"))
+        # 轮询 Emby 会话的间隔（秒，0 为不轮询），用于账号共享检测
+        self.session_poll_interval = int(
+            os.getenv("SESSION_POLL_INTERVAL", "0"))
+        # 共享检测：统计天数，窗口内允许的不同 IP 数、设备数与同时播放数，超过后是否自动禁用
+        self.sharing_window_days = int(os.getenv("SHARING_WINDOW_DAYS", "7"))
+        self.sharing_max_ips = int(os.getenv("SHARING_MAX_IPS", "10"))
+        self.sharing_max_devices = int(os.getenv("SHARING_MAX_DEVICES", "6"))
+        self.sharing_max_streams = int(os.getenv("SHARING_MAX_STREAMS", "2"))
+        self.sharing_auto_ban = os.getenv(
+            "SHARING_AUTO_BAN", "false").lower() == "true"
+        # 路由服务地址，多个地址以逗号分隔，靠前的优先，故障时自动切换
         self.api_url = os.getenv("API_URL")
         self.api_key = os.getenv("API_KEY")
+        self.router_timeout = float(os.getenv("ROUTER_TIMEOUT", "10"))
+        # 读请求在首个地址超过其 p95 耗时未返回时向下一个地址发出对冲请求
+        self.router_hedge = os.getenv("ROUTER_HEDGE", "true").lower() == "true"
+        # 线路探测：入口地址默认取线路信息中的 url / host 字段，也可按 index 显式指定
+        self.route_probe_urls = os.getenv("ROUTE_PROBE_URLS", "")
+        self.route_probe_path = os.getenv("ROUTE_PROBE_PATH",
+                                          "/emby/System/Info/Public")
+        self.route_probe_interval = float(
+            os.getenv("ROUTE_PROBE_INTERVAL", "60"))
+        self.route_probe_timeout = float(os.getenv("ROUTE_PROBE_TIMEOUT", "5"))
+        self.route_probe_window = int(os.getenv("ROUTE_PROBE_WINDOW", "30"))
+        # 群发：每秒发送条数（Telegram 对 Bot 的全局限制约为 30 条/秒）、并发数、每批保存进度的人数
+        self.broadcast_rate = float(os.getenv("BROADCAST_RATE", "20"))
+        self.broadcast_concurrency = int(
+            os.getenv("BROADCAST_CONCURRENCY", "10"))
+        self.broadcast_batch_size = int(
+            os.getenv("BROADCAST_BATCH_SIZE", "50"))
+        # 数据库类型：mysql 或 sqlite，sqlite 时使用 DB_PATH 指定的数据库文件
+        self.db_type = os.getenv("DB_TYPE", "mysql").lower()
+        self.db_path = os.getenv("DB_PATH", "data/embybot.db")
         self.db_host = os.getenv("DB_HOST")
         self.db_port = os.getenv("DB_PORT")
         self.db_user = os.getenv("DB_USER")
         self.db_pass = os.getenv("DB_PASS")
         self.db_name = os.getenv("DB_NAME")
+        # 连接池参数，按突发流量下的并发量调整
+        self.db_pool_size = int(os.getenv("DB_POOL_SIZE", "30"))
+        self.db_max_overflow = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+        self.db_pool_timeout = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+        self.db_pool_recycle = int(os.getenv("DB_POOL_RECYCLE", "600"))
+        self.db_pool_pre_ping = os.getenv(
+            "DB_POOL_PRE_PING", "true").lower() == "true"
+        # 只读副本，未配置时所有查询走主库；端口、账号默认与主库相同
+        self.db_replica_host = os.getenv("DB_REPLICA_HOST")
+        self.db_replica_port = os.getenv("DB_REPLICA_PORT") or self.db_port
+        self.db_replica_user = os.getenv("DB_REPLICA_USER") or self.db_user
+        self.db_replica_pass = os.getenv("DB_REPLICA_PASS") or self.db_pass
+        self.db_replica_path = os.getenv("DB_REPLICA_PATH")
+        # 用户写入后其读请求固定走主库的时长（秒），应大于复制延迟
+        self.db_replica_sticky_seconds = float(
+            os.getenv("DB_REPLICA_STICKY_SECONDS", "10"))
+        # 慢查询阈值（毫秒），0 表示不记录
+        self.db_slow_query_ms = float(os.getenv("DB_SLOW_QUERY_MS", "200"))
+        self.db_echo = os.getenv("DB_ECHO", "false").lower() == "true"
         # 处理以逗号分隔的管理员列表
         self.admin_list = list(map(int, os.getenv("ADMIN_LIST").split(",")))
+        # 多实例部署时的实例标识与租约有效期（秒）
+        self.instance_id = (os.getenv("INSTANCE_ID")
+                            or f"{socket.gethostname()}-{os.getpid()}")
+        self.lease_ttl = float(os.getenv("LEASE_TTL", "15"))
+        # 事件循环卡顿超过该阈值（毫秒）时记录日志及阻塞位置，0 表示关闭
+        self.loop_lag_threshold_ms = float(
+            os.getenv("LOOP_LAG_THRESHOLD_MS", "200"))
+        # 启动时数据库初始化、Bot 登录与外部服务检查是否并发执行
+        self.startup_parallel = os.getenv(
+            "STARTUP_PARALLEL", "true").lower() == "true"
         self.router_list = {}
         self.group_members = {}
+        # 成员列表在启动后于后台加载，完成前成员校验直接向 Telegram 查询
+        self.group_members_loaded = False
 
         logger.info(f"Configuration loaded")
 
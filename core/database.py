@@ -0,0 +1,332 @@
+import logging
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+from py_tools.connections.db.mysql import DBManager, SQLAlchemyManager
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from config import config
+from utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class DBMetrics:
+    """连接池与 SQL 执行耗时统计，用于评估连接池大小"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.wait_total = 0.0
+            self.wait_max = 0.0
+            self.checkout_total = 0.0
+            self.checkout_max = 0.0
+            self.queries = 0
+            self.slow_queries = 0
+            self.query_total = 0.0
+            self.query_max = 0.0
+
+    def record_wait(self, seconds: float):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+
+    def record_checkout(self, seconds: float):
+        with self._lock:
+            self.checkout_total += seconds
+            self.checkout_max = max(self.checkout_max, seconds)
+
+    def record_query(self, seconds: float, slow: bool):
+        with self._lock:
+            self.queries += 1
+            self.slow_queries += slow
+            self.query_total += seconds
+            self.query_max = max(self.query_max, seconds)
+
+    def snapshot(self) -> Dict:
+        """返回当前统计（耗时单位为毫秒）"""
+        with self._lock:
+            checkouts = self.checkouts or 1
+            queries = self.queries or 1
+            return {
+                "checkouts": self.checkouts,
+                "wait_avg_ms": round(self.wait_total / checkouts * 1000, 2),
+                "wait_max_ms": round(self.wait_max * 1000, 2),
+                "checkout_avg_ms": round(
+                    self.checkout_total / checkouts * 1000, 2),
+                "checkout_max_ms": round(self.checkout_max * 1000, 2),
+                "queries": self.queries,
+                "slow_queries": self.slow_queries,
+                "query_avg_ms": round(self.query_total / queries * 1000, 2),
+                "query_max_ms": round(self.query_max * 1000, 2),
+            }
+
+
+db_metrics = DBMetrics()
+
+
+class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """记录获取连接等待时间的连接池"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_metrics.record_wait(time.perf_counter() - start)
+
+
+def instrument_engine(engine: AsyncEngine, slow_query_ms: float) -> None:
+    """为引擎挂载连接占用时长统计与慢查询日志"""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "checkout")
+    def _on_checkout(_, connection_record, __):
+        connection_record.info["checkout_at"] = time.perf_counter()
+
+    @event.listens_for(sync_engine, "checkin")
+    def _on_checkin(_, connection_record):
+        checkout_at = connection_record.info.pop("checkout_at", None)
+        if checkout_at is not None:
+            db_metrics.record_checkout(time.perf_counter() - checkout_at)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_execute(conn, cursor, statement, parameters, context,
+                        executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_execute(conn, cursor, statement, parameters, context,
+                       executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        slow = slow_query_ms > 0 and elapsed * 1000 >= slow_query_ms
+        db_metrics.record_query(elapsed, slow)
+        if slow:
+            logger.warning(
+                f"Slow query ({elapsed * 1000:.1f}ms): "
+                f"{' '.join(statement.split())[:500]}")
+
+
+def _use_database(engine: AsyncEngine, db_name: str) -> None:
+    """
+    引擎连接的是数据库服务器而不指定库，每个新建连接执行 USE 选择业务库，
+    这样启动时的 CREATE DATABASE 也能复用同一个引擎。
+    """
+    state = {"ready": False}
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _on_connect(dbapi_connection, _):
+        if state["ready"]:
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f"USE `{db_name}`")
+            cursor.close()
+
+    engine.sync_engine.info["use_database"] = state
+
+
+class SQLiteManager(SQLAlchemyManager):
+    """嵌入式 SQLite 数据库，适合小型部署与进程内测试"""
+
+    def __init__(self, path: str, **kwargs):
+        super().__init__(db_name=path, **kwargs)
+
+    def get_db_url(self, protocol: str = "sqlite+aiosqlite"):
+        return f"{protocol}:///{self.db_name}"
+
+
+# SQLite 忙等待时间（毫秒），写锁被占用时在驱动线程内等待而不是立即报错
+SQLITE_BUSY_TIMEOUT_MS = 5000
+
+
+def _setup_sqlite(engine: AsyncEngine) -> None:
+    """
+    开启 WAL 并接管事务的 BEGIN：pysqlite 默认延迟到第一条写语句才开启事务，
+    这里改为由 SQLAlchemy 显式发出 BEGIN，需要写锁的事务可指定 IMMEDIATE。
+    """
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _on_connect(dbapi_connection, _):
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+    @event.listens_for(engine.sync_engine, "begin")
+    def _on_begin(conn):
+        mode = conn.get_execution_options().get("sqlite_begin", "DEFERRED")
+        conn.exec_driver_sql(f"BEGIN {mode}")
+
+
+def is_sqlite() -> bool:
+    return config.db_type == "sqlite"
+
+
+async def lock_for_write(session: AsyncSession) -> None:
+    """
+    在事务的第一条语句之前调用，使该事务与其他写事务串行执行。
+    MySQL 下由调用方的 SELECT ... FOR UPDATE 加行锁；SQLite 没有行锁，
+    改为以 BEGIN IMMEDIATE 开启事务，提前获取数据库写锁。
+    """
+    if is_sqlite():
+        await session.connection(
+            execution_options={"sqlite_begin": "IMMEDIATE"})
+
+
+def _pool_options() -> Dict:
+    return dict(
+        pool_size=config.db_pool_size,
+        pool_pre_ping=config.db_pool_pre_ping,
+        pool_recycle=config.db_pool_recycle,
+        log=logger,
+    )
+
+
+def _engine_options() -> Dict:
+    return dict(
+        echo=config.db_echo,
+        max_overflow=config.db_max_overflow,
+        pool_timeout=config.db_pool_timeout,
+        poolclass=InstrumentedAsyncQueuePool,
+    )
+
+
+def init_db_client() -> SQLAlchemyManager:
+    """根据配置初始化全局唯一的数据库引擎，并注册到 DBManager"""
+    if is_sqlite():
+        db_dir = os.path.dirname(config.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        db_client = SQLiteManager(config.db_path, **_pool_options())
+        db_client.init_db_engine(protocol="sqlite+aiosqlite",
+                                 **_engine_options())
+        _setup_sqlite(db_client.db_engine)
+    else:
+        db_client = SQLAlchemyManager(
+            host=config.db_host,
+            port=config.db_port,
+            user=config.db_user,
+            password=config.db_pass,
+            db_name="",
+            **_pool_options(),
+        )
+        db_client.init_mysql_engine(**_engine_options())
+        _use_database(db_client.db_engine, config.db_name)
+    instrument_engine(db_client.db_engine, config.db_slow_query_ms)
+    DBManager.init_db_client(db_client)
+    logger.info(
+        f"Database engine initialized, type: {config.db_type}, "
+        f"pool_size: {config.db_pool_size}, "
+        f"max_overflow: {config.db_max_overflow}, "
+        f"pool_recycle: {config.db_pool_recycle}")
+    return db_client
+
+
+class ReplicaSQLAlchemyManager(SQLAlchemyManager):
+    """只读副本的 MySQL 引擎，与主库分别持有各自的单例"""
+
+
+class ReplicaSQLiteManager(SQLiteManager):
+    """只读副本的 SQLite 引擎，用于本地以两个数据库文件验证读写分离"""
+
+
+class ReplicaDBManager(DBManager):
+    """只读副本的会话入口，DB_CLIENT 与主库的 DBManager 相互独立"""
+    DB_CLIENT: Optional[SQLAlchemyManager] = None
+
+
+def replica_enabled() -> bool:
+    return bool(config.db_replica_host or config.db_replica_path)
+
+
+def init_replica_client() -> Optional[SQLAlchemyManager]:
+    """配置了只读副本时初始化副本引擎，副本的表结构由主从复制同步"""
+    if not replica_enabled():
+        return None
+    if is_sqlite():
+        db_client = ReplicaSQLiteManager(config.db_replica_path,
+                                         **_pool_options())
+        db_client.init_db_engine(protocol="sqlite+aiosqlite",
+                                 **_engine_options())
+        _setup_sqlite(db_client.db_engine)
+    else:
+        db_client = ReplicaSQLAlchemyManager(
+            host=config.db_replica_host,
+            port=config.db_replica_port,
+            user=config.db_replica_user,
+            password=config.db_replica_pass,
+            db_name=config.db_name,
+            **_pool_options(),
+        )
+        db_client.init_mysql_engine(**_engine_options())
+    instrument_engine(db_client.db_engine, config.db_slow_query_ms)
+    ReplicaDBManager.init_db_client(db_client)
+    logger.info("Read replica engine initialized")
+    return db_client
+
+
+# 最近写入过的用户，在副本追上之前其读请求固定走主库（read-your-writes）
+_recent_writes = TTLCache(maxsize=100000,
+                          ttl=config.db_replica_sticky_seconds)
+
+
+def mark_user_written(telegram_id: int) -> None:
+    """记录用户数据刚被修改，此后一段时间内该用户的读请求走主库"""
+    if ReplicaDBManager.DB_CLIENT is not None:
+        _recent_writes.set(telegram_id, True)
+
+
+@asynccontextmanager
+async def read_session(telegram_id: Optional[int] = None
+                       ) -> AsyncIterator[AsyncSession]:
+    """
+    可容忍复制延迟的只读查询会话：配置了副本时走副本，
+    指定用户最近有写入或未配置副本时走主库。
+    """
+    manager = DBManager
+    if (ReplicaDBManager.DB_CLIENT is not None
+            and (telegram_id is None or telegram_id not in _recent_writes)):
+        manager = ReplicaDBManager
+    async with manager.transaction() as session:
+        yield session
+
+
+async def create_database_if_not_exists(engine: AsyncEngine) -> None:
+    """使用共享引擎创建业务库，完成后新连接会自动选择该库，SQLite 无需建库"""
+    if is_sqlite():
+        return
+    async with engine.connect() as conn:
+        query = f"CREATE DATABASE IF NOT EXISTS `{config.db_name}`"
+        logger.info(f"SQL Query: {query}, Context: Creating database")
+        await conn.execute(text(query))
+        await conn.execute(text(f"USE `{config.db_name}`"))
+        await conn.commit()
+    engine.sync_engine.info["use_database"]["ready"] = True
+
+
+def pool_status(engine: AsyncEngine) -> str:
+    """连接池当前状态描述"""
+    return engine.sync_engine.pool.status()
+
+
+async def log_db_metrics() -> None:
+    """定时任务：输出连接池与查询统计并清零"""
+    engine = DBManager.DB_CLIENT.db_engine
+    status = f"pool: {pool_status(engine)}"
+    if ReplicaDBManager.DB_CLIENT is not None:
+        replica_engine = ReplicaDBManager.DB_CLIENT.db_engine
+        status += f", replica pool: {pool_status(replica_engine)}"
+    logger.info(f"DB metrics: {db_metrics.snapshot()}, {status}")
+    db_metrics.reset()
@@ -0,0 +1,235 @@
+import asyncio
+import cProfile
+import gc
+import io
+import logging
+import pstats
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+import traceback
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 事件循环空闲时主线程停留在这些函数中，采样时单独统计
+_IDLE_FUNCTIONS = {"select", "poll"}
+TRACEMALLOC_FRAMES = 10
+
+# 同一时间只允许一个分析任务，cProfile 也不支持嵌套启用
+_profile_lock = asyncio.Lock()
+_last_snapshot: Optional[tracemalloc.Snapshot] = None
+
+
+class LoopLagMonitor:
+    """
+    事件循环卡顿监控。心跳协程按固定间隔休眠，实际唤醒时间超出预期的部分即为卡顿时长；
+    看门狗线程发现心跳停止超过阈值时抓取事件循环线程的调用栈，
+    卡顿结束后连同时长一起写入日志，便于定位阻塞事件循环的同步调用。
+    """
+
+    def __init__(self, threshold_ms: float, interval: float = 0.1):
+        """
+        :param threshold_ms: 记录卡顿的阈值（毫秒）
+        :param interval: 心跳间隔（秒）
+        """
+        self.threshold = threshold_ms / 1000
+        self.interval = interval
+        self.stalls = 0
+        self.max_lag = 0.0
+        self._beat = time.monotonic()
+        self._stall_stack: Optional[str] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop_event = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    async def _heartbeat_loop(self):
+        while True:
+            before = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self._beat = time.monotonic()
+            lag = self._beat - before - self.interval
+            self.max_lag = max(self.max_lag, lag)
+            if lag < self.threshold:
+                continue
+            self.stalls += 1
+            stack, self._stall_stack = self._stall_stack, None
+            logger.warning(
+                f"Event loop stalled for {lag * 1000:.0f}ms"
+                + (f", blocked at:\n{stack}" if stack else ""))
+
+    def _watch(self):
+        while not self._stop_event.wait(self.interval):
+            stalled = time.monotonic() - self._beat
+            if stalled < self.threshold + self.interval \
+                    or self._stall_stack is not None:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is not None:
+                self._stall_stack = "".join(traceback.format_stack(frame))
+
+    def snapshot(self) -> Dict:
+        return {"stalls": self.stalls,
+                "max_lag_ms": round(self.max_lag * 1000, 1)}
+
+    def start(self):
+        """在事件循环所在线程中调用，启动心跳协程与看门狗线程"""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop_event.clear()
+        self._task = asyncio.create_task(self._heartbeat_loop())
+        self._watchdog = threading.Thread(
+            target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+        logger.info(f"Loop lag monitor started, threshold: "
+                    f"{self.threshold * 1000:.0f}ms")
+
+    async def stop(self):
+        self._stop_event.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+def profiling_busy() -> bool:
+    return _profile_lock.locked()
+
+
+async def profile_cpu(seconds: float, limit: int = 60) -> str:
+    """
+    使用 cProfile 分析事件循环线程在接下来 seconds 秒内执行的所有回调。
+    :return: 按累计耗时与自身耗时排序的文本报告
+    """
+    async with _profile_lock:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.disable()
+
+    stream = io.StringIO()
+    stream.write(f"cProfile {seconds}s @ {datetime.now():%Y-%m-%d %H:%M:%S}\n")
+    stats = pstats.Stats(profiler, stream=stream).strip_dirs()
+    for sort_key in ("cumulative", "tottime"):
+        stream.write(f"\n===== sorted by {sort_key} =====\n")
+        stats.sort_stats(sort_key).print_stats(limit)
+    return stream.getvalue()
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}" \
+           f":{frame.f_lineno})"
+
+
+def _collect_samples(thread_id: int, seconds: float,
+                     interval: float) -> Counter:
+    samples = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        stack = []
+        while frame is not None:
+            stack.append(frame)
+            frame = frame.f_back
+        if stack:
+            samples[tuple(_frame_name(f) for f in reversed(stack))] += 1
+        time.sleep(interval)
+    return samples
+
+
+async def profile_sampling(seconds: float, interval: float = 0.005,
+                           limit: int = 40) -> str:
+    """
+    在独立线程中定时抓取事件循环线程的调用栈，开销远低于 cProfile，
+    适合在线上长时间采样；报告末尾附带 flamegraph.pl 可直接使用的折叠栈。
+    """
+    async with _profile_lock:
+        samples = await asyncio.to_thread(
+            _collect_samples, threading.get_ident(), seconds, interval)
+
+    total = sum(samples.values()) or 1
+    idle = sum(n for stack, n in samples.items()
+               if stack[-1].split(" ", 1)[0] in _IDLE_FUNCTIONS)
+    self_time, inclusive = Counter(), Counter()
+    for stack, n in samples.items():
+        self_time[stack[-1]] += n
+        for name in set(stack):
+            inclusive[name] += n
+
+    lines = [
+        f"Sampling profile {seconds}s @ {datetime.now():%Y-%m-%d %H:%M:%S}, "
+        f"interval {interval * 1000:.0f}ms",
+        f"samples: {total}, idle: {idle / total:.1%}, "
+        f"busy: {1 - idle / total:.1%}",
+        "",
+        "===== self samples =====",
+    ]
+    lines += [f"{n:>7} {n / total:>7.1%}  {name}"
+              for name, n in self_time.most_common(limit)]
+    lines += ["", "===== inclusive samples ====="]
+    lines += [f"{n:>7} {n / total:>7.1%}  {name}"
+              for name, n in inclusive.most_common(limit)]
+    lines += ["", "===== collapsed stacks ====="]
+    lines += [f"{';'.join(stack)} {n}" for stack, n in samples.most_common()]
+    return "\n".join(lines) + "\n"
+
+
+def memory_tracing() -> bool:
+    return tracemalloc.is_tracing()
+
+
+def start_memory_tracing() -> None:
+    global _last_snapshot
+    _last_snapshot = None
+    tracemalloc.start(TRACEMALLOC_FRAMES)
+
+
+def stop_memory_tracing() -> None:
+    global _last_snapshot
+    _last_snapshot = None
+    tracemalloc.stop()
+
+
+def memory_snapshot(limit: int = 30) -> str:
+    """
+    生成 tracemalloc 快照，报告按代码行统计的内存占用前 limit 项，
+    以及与上一次快照相比增长最多的位置。需要先调用 start_memory_tracing。
+    """
+    global _last_snapshot
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    current, peak = tracemalloc.get_traced_memory()
+    # Linux 下 ru_maxrss 的单位为 KB
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    lines = [
+        f"tracemalloc snapshot @ {datetime.now():%Y-%m-%d %H:%M:%S}",
+        f"traced: {current / 1024 / 1024:.1f}MB, "
+        f"peak: {peak / 1024 / 1024:.1f}MB, max rss: {max_rss:.1f}MB",
+        f"gc counts: {gc.get_count()}, objects: {len(gc.get_objects())}",
+        "",
+        "===== top by line =====",
+    ]
+    lines += [str(stat) for stat in
+              snapshot.statistics("lineno")[:limit]]
+    if _last_snapshot is not None:
+        lines += ["", "===== growth since last snapshot ====="]
+        lines += [str(stat) for stat in
+                  snapshot.compare_to(_last_snapshot, "lineno")[:limit]]
+    lines += ["", "===== top by traceback ====="]
+    for stat in snapshot.statistics("traceback")[:min(limit, 10)]:
+        lines.append(f"{stat.count} blocks, {stat.size / 1024:.1f}KiB")
+        lines += [f"  {line}" for line in stat.traceback.format()]
+    _last_snapshot = snapshot
+    return "\n".join(lines) + "\n"
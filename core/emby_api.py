@@ -1,10 +1,18 @@
 import logging
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional
 
 import requests
 
 logger = logging.getLogger(__name__)
 
 
+class EmbyNotFound(Exception):
+    """请求的 Emby 资源不存在（HTTP 404），例如用户已被删除"""
+
+
 class EmbyApi:
     """
     用于与 Emby 服务器交互的API封装，支持超时机制和异常处理。
@@ -83,6 +91,9 @@ class EmbyApi:
             )
             raise Exception(f"请求 Emby 时发生未知错误: {str(e)}")
 
+        if response.status_code == 404:
+            logger.warning(f"Emby resource not found: {path}")
+            raise EmbyNotFound(f"Emby 中不存在该资源: {path}")
         try:
             response.raise_for_status()
             logger.debug(
@@ -99,7 +110,7 @@ class EmbyApi:
         :return: 成功返回 JSON 数据，失败抛出异常
         """
         path = f"/emby/Users/{emby_id}"
-        logger.info(f"Getting user with Emby ID: {emby_id}")
+        logger.debug(f"Getting user with Emby ID: {emby_id}")
         try:
             return self._request("GET", path)
         except Exception as e:
@@ -109,6 +120,19 @@ class EmbyApi:
             )
             raise
 
+    def get_users(self):
+        """
+        一次性获取 Emby 中的全部用户列表。
+        :return: 用户信息 JSON 列表，失败抛出异常
+        """
+        path = "/emby/Users"
+        logger.debug("Getting all Emby users")
+        try:
+            return self._request("GET", path) or []
+        except Exception as e:
+            logger.error(f"Failed to get Emby users: {e}", exc_info=True)
+            raise
+
     def create_user(self, name: str):
         """
         在 Emby 中创建新用户。
@@ -125,6 +149,24 @@ class EmbyApi:
                          exc_info=True)
             raise
 
+    def delete_user(self, emby_id: str):
+        """
+        删除 Emby 用户。
+        :param emby_id: Emby 用户 ID
+        :return: 成功返回结果 JSON，失败抛出异常
+        """
+        # Emby 同时提供 DELETE /Users/{Id} 与 POST /Users/{Id}/Delete，这里沿用 POST
+        path = f"/emby/Users/{emby_id}/Delete"
+        logger.info(f"Deleting user with Emby ID: {emby_id}")
+        try:
+            return self._request("POST", path)
+        except Exception as e:
+            logger.error(
+                f"Failed to delete user with Emby ID {emby_id}: {e}",
+                exc_info=True
+            )
+            raise
+
     def ban_user(self, emby_id: str):
         """
         禁用 Emby 用户：设置其 Policy，使其无法登录或观看。
@@ -214,7 +256,8 @@ class EmbyApi:
         :return: 成功返回更新后的用户信息 JSON，失败抛出异常
         """
         path = f"/emby/Users/{emby_id}/Policy"
-        logger.info(
+        # 策略字段较多且每次封禁/解禁都会调用，只在 DEBUG 级别输出
+        logger.debug(
             f"Updating user policy for Emby ID: "
             f"{emby_id} with data: {policy_data}"
         )
@@ -271,7 +314,7 @@ class EmbyApi:
         :return: 若状态码为 200 则返回 True，否则抛出异常或返回 False
         """
         path = "/emby/System/Info"
-        logger.info("Checking Emby site availability")
+        logger.debug("Checking Emby site availability")
         try:
             self._request("GET", path)
             return True
@@ -287,67 +330,329 @@ class EmbyApi:
         :return: 包含影视数量信息的 JSON
         """
         path = "/emby/Items/Counts"
-        logger.info("Getting Emby item counts")
+        logger.debug("Getting Emby item counts")
         try:
             return self._request("GET", path)
         except Exception as e:
             logger.error(f"Failed to get Emby item counts: {e}", exc_info=True)
             raise
 
+    def get_sessions(self):
+        """
+        获取当前的会话列表，包含 NowPlayingItem 的会话即为正在播放。
+        :return: 会话信息 JSON 列表，失败抛出异常
+        """
+        path = "/emby/Sessions"
+        logger.debug("Getting Emby sessions")
+        try:
+            return self._request("GET", path) or []
+        except Exception as e:
+            logger.error(f"Failed to get Emby sessions: {e}", exc_info=True)
+            raise
+
+    def get_items(self, start_index: int = 0, limit: int = 500,
+                  min_date_last_saved: Optional[str] = None):
+        """
+        分页获取媒体库中的电影与剧集。
+        :param start_index: 起始位置
+        :param limit: 每页数量
+        :param min_date_last_saved: 只返回该时间（ISO 8601，UTC）之后新增或修改的条目
+        :return: (条目列表, 总数)，失败抛出异常
+        """
+        path = "/emby/Items"
+        params = {
+            "Recursive": "true",
+            "IncludeItemTypes": "Movie,Series",
+            "Fields": "OriginalTitle,ProductionYear,DateCreated",
+            "SortBy": "DateCreated,SortName",
+            "SortOrder": "Ascending",
+            "StartIndex": start_index,
+            "Limit": limit,
+        }
+        if min_date_last_saved:
+            params["MinDateLastSaved"] = min_date_last_saved
+        logger.debug(f"Getting Emby items from {start_index}")
+        try:
+            data = self._request("GET", path, params=params) or {}
+        except Exception as e:
+            logger.error(f"Failed to get Emby items: {e}", exc_info=True)
+            raise
+        return data.get("Items") or [], data.get("TotalRecordCount") or 0
+
+    def get_playback_activity(self, after_rowid: int, limit: int = 1000):
+        """
+        通过 Playback Reporting 插件按 rowid 增量读取播放记录。
+        :param after_rowid: 只返回 rowid 大于该值的记录
+        :param limit: 最多返回的记录数
+        :return: 按 rowid 升序的记录列表，每项包含 rowid、DateCreated、UserId、
+            PlayDuration（秒）；未安装插件时抛出异常
+        """
+        path = "/emby/user_usage_stats/submit_custom_query"
+        query = (
+            "SELECT rowid, DateCreated, UserId, PlayDuration "
+            "FROM PlaybackActivity "
+            f"WHERE rowid > {int(after_rowid)} "
+            f"ORDER BY rowid LIMIT {int(limit)}"
+        )
+        logger.debug(f"Getting playback activity after rowid {after_rowid}")
+        try:
+            data = self._request("POST", path, data={
+                "CustomQueryString": query, "ReplaceUserId": False,
+            }) or {}
+        except Exception as e:
+            logger.error(f"Failed to get playback activity: {e}",
+                         exc_info=True)
+            raise
+        # 插件返回的列名字段拼写为 colums
+        columns = data.get("colums") or data.get("columns") or []
+        return [dict(zip(columns, row, strict=True))
+                for row in data.get("results") or []]
+
+
+class EmbyApiPool:
+    """
+    多台 Emby 服务器，按名称访问。第一台为默认服务器，
+    user.emby_server 为空（单服务器时期创建的账号）时归属默认服务器。
+    """
+
+    def __init__(self, apis: Dict[str, EmbyApi],
+                 capacity: Optional[Dict[str, int]] = None,
+                 weight: Optional[Dict[str, float]] = None):
+        """
+        :param apis: 服务器名称到 EmbyApi 的映射，第一项为默认服务器
+        :param capacity: 各服务器的账号上限，缺省或 0 表示不限
+        :param weight: 各服务器的分配权重，缺省为 1
+        """
+        if not apis:
+            raise ValueError("at least one Emby server is required")
+        self.apis = dict(apis)
+        self.capacity = {name: int((capacity or {}).get(name) or 0)
+                         for name in self.apis}
+        self.weight = {name: float((weight or {}).get(name) or 1)
+                       for name in self.apis}
+        self.default_name = next(iter(self.apis))
+        logger.info(f"EmbyApiPool initialized with servers: {self.names}")
+
+    @classmethod
+    def from_config(cls, servers: List[Dict]) -> "EmbyApiPool":
+        """
+        :param servers: 服务器配置列表，每项包含 name、url、api_key，
+            可选 capacity（账号上限）与 weight（分配权重）
+        """
+        apis, capacity, weight = {}, {}, {}
+        for server in servers:
+            name = server["name"]
+            if name in apis:
+                raise ValueError(f"duplicate Emby server name: {name}")
+            apis[name] = EmbyApi(server["url"], server["api_key"])
+            capacity[name] = server.get("capacity")
+            weight[name] = server.get("weight")
+        return cls(apis, capacity, weight)
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.apis)
+
+    @property
+    def default(self) -> EmbyApi:
+        return self.apis[self.default_name]
+
+    def resolve(self, name: Optional[str]) -> str:
+        """把 user.emby_server 转换为服务器名称，空值为默认服务器"""
+        name = name or self.default_name
+        if name not in self.apis:
+            raise Exception(f"未知的 Emby 服务器：{name}")
+        return name
+
+    def storage_name(self, name: str) -> Optional[str]:
+        """写入 user.emby_server 的值，默认服务器存为空，保持与单服务器数据兼容"""
+        return None if name == self.default_name else name
+
+    def get(self, name: Optional[str]) -> EmbyApi:
+        return self.apis[self.resolve(name)]
+
+    def get_user_servers(self) -> Dict[str, str]:
+        """获取所有服务器的用户，返回 emby_id 到服务器名称的映射"""
+        servers = {}
+        for name, api in self.apis.items():
+            for emby_user in api.get_users():
+                servers[emby_user.get("Id")] = name
+        return servers
+
+
+class _EndpointHealth:
+    """单个路由服务地址的健康状态与最近的响应耗时"""
+
+    def __init__(self, url: str, window: int = 100):
+        self.url = url
+        self.latencies: deque = deque(maxlen=window)
+        self.failures = 0
+        self.down_until = 0.0
+
+    def is_up(self) -> bool:
+        return self.down_until <= time.monotonic()
+
+    def p95(self) -> Optional[float]:
+        if len(self.latencies) < 5:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
 
 class EmbyRouterAPI:
     """
     如果有多条线路可供用户选择，封装了对 Emby Router 服务器的 API 访问。
+    支持配置多个路由服务地址：连续失败的地址暂时摘除并切换到下一个，
+    读请求在首个地址超过其 p95 耗时仍未返回时向下一个地址发出对冲请求，取先返回的结果。
     """
 
-    def __init__(self, api_url: str, api_key: str = "", timeout: int = 10):
+    # 连续失败达到该次数后摘除地址，cooldown 秒后重新尝试
+    MAX_FAILURES = 3
+    COOLDOWN = 30
+    # 没有足够耗时样本时的对冲等待时间（秒）
+    DEFAULT_HEDGE_DELAY = 1.0
+    MIN_HEDGE_DELAY = 0.05
+
+    def __init__(self, api_url: str, api_key: str = "", timeout: int = 10,
+                 hedge: bool = True):
         """
-        :param api_url: 路由服务的基础URL
+        :param api_url: 路由服务的基础URL，多个地址以逗号分隔，靠前的优先
         :param api_key: 路由服务使用的Token（如果需要鉴权）
         :param timeout: 请求超时，默认为10秒
+        :param hedge: 读请求是否启用对冲
         """
-        self.api_url = api_url.rstrip("/")
+        urls = [url.strip().rstrip("/") for url in api_url.split(",")
+                if url.strip()]
+        self.api_url = urls[0]
+        self.endpoints = [_EndpointHealth(url) for url in urls]
         self.api_key = api_key
         self.timeout = timeout
+        self.hedge = hedge and len(self.endpoints) > 1
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(4, len(self.endpoints) * 2),
+            thread_name_prefix="router-api")
         logger.info(
-            f"EmbyRouterAPI initialized with URL: {self.api_url}"
-            f", timeout: {self.timeout}"
+            f"EmbyRouterAPI initialized with URL: {', '.join(urls)}"
+            f", timeout: {self.timeout}, hedge: {self.hedge}"
         )
 
-    def call_api(self, path: str):
-        """
-        路由API通用请求方法。
-        :param path: API路径
-        :return: 成功时返回 JSON，失败抛出异常
-        """
-        url = f"{self.api_url}{path}"
+    def _ordered_endpoints(self) -> List[_EndpointHealth]:
+        """可用的地址按配置顺序在前，已摘除的地址排在最后作为兜底"""
+        return sorted(self.endpoints, key=lambda e: not e.is_up())
+
+    def _record(self, endpoint: _EndpointHealth,
+                latency: Optional[float]) -> None:
+        if latency is not None:
+            if endpoint.failures >= self.MAX_FAILURES:
+                logger.info(f"Router endpoint {endpoint.url} recovered")
+            endpoint.latencies.append(latency)
+            endpoint.failures = 0
+            endpoint.down_until = 0.0
+            return
+        endpoint.failures += 1
+        if endpoint.failures >= self.MAX_FAILURES:
+            endpoint.down_until = time.monotonic() + self.COOLDOWN
+            if endpoint.failures == self.MAX_FAILURES:
+                logger.warning(
+                    f"Router endpoint {endpoint.url} marked down after "
+                    f"{endpoint.failures} consecutive failures")
+
+    def _request(self, endpoint: _EndpointHealth, path: str):
+        url = f"{endpoint.url}{path}"
         headers = {
             "Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
         logger.debug(f"Calling API at {url}")
+        started = time.monotonic()
         try:
-            response = requests.get(url, headers=headers, timeout=self.timeout)
+            # 连接超时单独设置得更短，地址不可达时尽快切换
+            response = requests.get(
+                url, headers=headers,
+                timeout=(min(3, self.timeout), self.timeout))
             response.raise_for_status()  # 如果状态码非 200-299，自动抛出异常
-            return response.json()
+            result = response.json()
         except requests.exceptions.Timeout:
-            logger.error("Request to router service timed out", exc_info=True)
+            self._record(endpoint, None)
+            logger.error(f"Request to router service {endpoint.url} timed out",
+                         exc_info=True)
             raise Exception("请求路由服务超时，请稍后重试或检查网络连接。")
         except requests.exceptions.ConnectionError as e:
+            self._record(endpoint, None)
             logger.error(f"Failed to connect to router service: {e}",
                          exc_info=True)
             raise Exception(f"无法连接到路由服务: {str(e)}")
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, ValueError) as e:
+            self._record(endpoint, None)
             logger.error(
                 f"An unknown error occurred while requesting router service: "
                 f"{e}",
                 exc_info=True,
             )
             raise Exception(f"请求路由服务时发生错误: {str(e)}")
+        self._record(endpoint, time.monotonic() - started)
+        return result
+
+    def _hedge_delay(self, endpoint: _EndpointHealth) -> float:
+        p95 = endpoint.p95()
+        if p95 is None:
+            return self.DEFAULT_HEDGE_DELAY
+        return max(self.MIN_HEDGE_DELAY, p95)
+
+    def _call_hedged(self, path: str):
+        """
+        按顺序向各地址发出请求：上一个请求超过其 p95 耗时未返回或已失败时发出下一个，
+        返回最先成功的结果。落后的请求无法中断，会在后台线程中自然结束。
+        """
+        pending = {}
+        endpoints = iter(self._ordered_endpoints())
+        last_error: Optional[Exception] = None
+        while True:
+            # 已没有可发出的地址时一直等到剩余请求结束；
+            # 请求失败时 wait 会提前返回，下一轮立即向下一个地址发出请求
+            endpoint = next(endpoints, None)
+            timeout = None
+            if endpoint is not None:
+                future = self._executor.submit(self._request, endpoint, path)
+                pending[future] = endpoint
+                timeout = self._hedge_delay(endpoint)
+            if not pending:
+                raise last_error or Exception("没有可用的路由服务地址。")
+            done, _ = wait(pending, timeout=timeout,
+                           return_when=FIRST_COMPLETED)
+            for future in done:
+                del pending[future]
+                try:
+                    return future.result()
+                except Exception as e:
+                    last_error = e
+
+    def call_api(self, path: str, hedge: bool = True):
+        """
+        路由API通用请求方法。
+        :param path: API路径
+        :param hedge: 是否允许对冲，写请求应传 False，只在失败时切换地址
+        :return: 成功时返回 JSON，失败抛出异常
+        """
+        if hedge and self.hedge:
+            return self._call_hedged(path)
+        last_error: Optional[Exception] = None
+        for endpoint in self._ordered_endpoints():
+            try:
+                return self._request(endpoint, path)
+            except Exception as e:
+                last_error = e
+        raise last_error
+
+    def health(self) -> List[Dict]:
+        """各路由服务地址的状态"""
+        return [{"url": e.url, "up": e.is_up(), "failures": e.failures,
+                 "p95_ms": round(e.p95() * 1000, 1) if e.p95() else None}
+                for e in self.endpoints]
 
     def query_all_route(self):
         """
         获取所有可用线路。
         """
-        logger.info("Querying all routes")
+        logger.debug("Querying all routes")
         try:
             return self.call_api("/api/route")
         except Exception as e:
@@ -358,7 +663,7 @@ class EmbyRouterAPI:
         """
         获取指定用户当前所选的线路信息。
         """
-        logger.info(f"Querying user route for user ID: {user_id}")
+        logger.debug(f"Querying user route for user ID: {user_id}")
         try:
             return self.call_api(f"/api/route/{user_id}")
         except Exception as e:
@@ -376,7 +681,8 @@ class EmbyRouterAPI:
             f"Updating user route for user ID: "
             f"{user_id} to index: {new_index}")
         try:
-            return self.call_api(f"/api/route/{user_id}/{new_index}")
+            return self.call_api(f"/api/route/{user_id}/{new_index}",
+                                 hedge=False)
         except Exception as e:
             logger.error(
                 f"Failed to update user route for user ID "
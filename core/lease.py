@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from core.database import lock_for_write
+from models import Lease
+from models.lease_model import LeaseOrm
+
+logger = logging.getLogger(__name__)
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class LeaseManager:
+    """
+    基于数据库的租约选主。多个实例共用同一个数据库时，同一时刻只有一个实例
+    持有某个租约；持有者通过心跳续约，宕机后备用实例会在租约过期后接管。
+
+    每次易主时 token 都会递增（fencing token），持有者可以在关键写入前调用
+    `ensure_held` 确认自己仍然是当前持有者。
+    """
+
+    def __init__(self, holder: str, ttl: float = 15,
+                 heartbeat: Optional[float] = None):
+        """
+        :param holder: 当前实例的唯一标识
+        :param ttl: 租约有效期（秒）
+        :param heartbeat: 心跳间隔（秒），默认为 ttl 的三分之一
+        """
+        self.holder = holder
+        self.ttl = ttl
+        self.heartbeat = heartbeat or ttl / 3
+        self._names: set = set()
+        self._tokens: Dict[str, int] = {}
+        self._deadlines: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        logger.info(
+            f"LeaseManager initialized with holder: {holder}, ttl: {ttl}")
+
+    def register(self, name: str):
+        """登记需要竞争的租约，心跳循环会持续尝试获取或续约"""
+        self._names.add(name)
+
+    def is_leader(self, name: str) -> bool:
+        """
+        本地判断是否仍持有租约。本地截止时间比数据库中的过期时间早一个心跳，
+        保证数据库不可用时本实例先于其他实例放弃执行。
+        """
+        deadline = self._deadlines.get(name)
+        return deadline is not None and deadline > time.monotonic()
+
+    def token(self, name: str) -> Optional[int]:
+        """当前持有的 fencing token，未持有返回 None"""
+        return self._tokens.get(name) if self.is_leader(name) else None
+
+    async def try_acquire(self, name: str) -> Optional[int]:
+        """尝试获取或续约租约，成功返回 fencing token，失败返回 None"""
+        started = time.monotonic()
+        now = _now_ms()
+        expire_time = now + int(self.ttl * 1000)
+        try:
+            async with LeaseOrm().transaction() as session:
+                await lock_for_write(session)
+                stmt = select(Lease).where(
+                    Lease.name == name).with_for_update()
+                result = await session.execute(stmt)
+                lease = result.scalars().first()
+
+                if lease is None:
+                    lease = Lease(name=name, holder=self.holder, token=1,
+                                  expire_time=expire_time)
+                    session.add(lease)
+                elif (lease.holder == self.holder
+                      and lease.token == self._tokens.get(name)
+                      and lease.expire_time >= now):
+                    lease.expire_time = expire_time
+                elif lease.expire_time < now or lease.holder == self.holder:
+                    lease.holder = self.holder
+                    lease.token += 1
+                    lease.expire_time = expire_time
+                else:
+                    self._lose(name)
+                    return None
+                token = lease.token
+        except IntegrityError:
+            # 并发插入同名租约，由另一个实例抢先获得
+            self._lose(name)
+            return None
+
+        if self._tokens.get(name) != token:
+            logger.info(
+                f"Lease {name} acquired by {self.holder}, token: {token}")
+        self._tokens[name] = token
+        self._deadlines[name] = started + self.ttl - self.heartbeat
+        return token
+
+    def _lose(self, name: str):
+        if self._deadlines.pop(name, None) is not None:
+            logger.warning(f"Lease {name} lost by {self.holder}")
+        self._tokens.pop(name, None)
+
+    async def ensure_held(self, name: str, token: int) -> None:
+        """
+        校验 fencing token 是否仍然有效，租约已被其他实例接管时抛出异常。
+        适合在执行不可重复的写操作前调用。
+        """
+        lease = await LeaseOrm().query_one(conds=[Lease.name == name])
+        if (not lease or lease.holder != self.holder
+                or lease.token != token or lease.expire_time < _now_ms()):
+            self._lose(name)
+            raise Exception(f"租约 {name} 已失效，当前实例不再是执行者。")
+
+    async def release(self, name: str) -> None:
+        """主动释放租约，备用实例可立即接管"""
+        token = self._tokens.get(name)
+        self._lose(name)
+        if token is None:
+            return
+        await LeaseOrm().update(
+            values={"expire_time": 0},
+            conds=[Lease.name == name, Lease.holder == self.holder,
+                   Lease.token == token],
+        )
+        logger.info(f"Lease {name} released by {self.holder}")
+
+    async def _heartbeat_loop(self):
+        while True:
+            for name in list(self._names):
+                try:
+                    await self.try_acquire(name)
+                except Exception as e:
+                    self._lose(name)
+                    logger.error(f"Lease {name} heartbeat failed: {e}",
+                                 exc_info=True)
+            await asyncio.sleep(self.heartbeat)
+
+    def start(self):
+        """启动心跳循环"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._heartbeat_loop())
+
+    async def stop(self):
+        """停止心跳并释放所有租约"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for name in list(self._names):
+            try:
+                await self.release(name)
+            except Exception as e:
+                logger.error(f"Failed to release lease {name}: {e}",
+                             exc_info=True)
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# 线路信息中可能携带入口地址的字段
+ROUTE_URL_FIELDS = ("url", "host", "address")
+
+
+def parse_probe_urls(spec: str) -> Dict[str, str]:
+    """解析 "1=https://a.example,2=https://b.example" 格式的线路探测地址"""
+    urls = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        index, _, url = item.partition("=")
+        if not url:
+            raise ValueError(f"invalid ROUTE_PROBE_URLS item: {item}")
+        urls[index.strip()] = url.strip()
+    return urls
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+class RouteProber:
+    """
+    线路探测：定时并发请求每条线路的入口，按线路保留最近 window 次结果，
+    计算延迟分位数与可用率，供 /select_line 展示和自动选择线路使用。
+    """
+
+    def __init__(self, probe_urls: Optional[Dict[str, str]] = None,
+                 path: str = "/emby/System/Info/Public", timeout: float = 5,
+                 window: int = 30, min_availability: float = 0.8,
+                 concurrency: int = 10):
+        """
+        :param probe_urls: 线路 index 到入口地址的映射，未配置的线路使用线路信息中的 url 字段
+        :param path: 探测请求的路径
+        :param timeout: 单次探测超时（秒），超时计为失败
+        :param window: 每条线路保留的探测次数
+        :param min_availability: 可用率低于该值的线路视为不健康
+        :param concurrency: 同时进行的探测请求数
+        """
+        self.probe_urls = probe_urls or {}
+        self.path = path
+        self.timeout = timeout
+        self.window = window
+        self.min_availability = min_availability
+        self.concurrency = concurrency
+        # None 表示该次探测失败
+        self._samples: Dict[str, Deque[Optional[float]]] = {}
+
+    def target(self, route: Dict) -> Optional[str]:
+        index = str(route.get("index"))
+        base = self.probe_urls.get(index) or next(
+            (route[f] for f in ROUTE_URL_FIELDS if route.get(f)), None)
+        if not base:
+            return None
+        if "://" not in base:
+            base = f"https://{base}"
+        return f"{base.rstrip('/')}{self.path}"
+
+    async def _probe_one(self, session: aiohttp.ClientSession,
+                         semaphore: asyncio.Semaphore,
+                         url: str) -> Optional[float]:
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                async with session.get(url, allow_redirects=False) as resp:
+                    # 5xx 说明线路后端异常，其余状态码只要能响应即视为可达
+                    if resp.status >= 500:
+                        return None
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.debug(f"Route probe {url} failed: {e!r}")
+                return None
+            return (time.perf_counter() - started) * 1000
+
+    async def probe(self, routes: List[Dict]) -> None:
+        """并发探测一轮所有线路"""
+        targets = {str(r.get("index")): self.target(r) for r in routes}
+        targets = {index: url for index, url in targets.items() if url}
+        if not targets:
+            return
+        semaphore = asyncio.Semaphore(self.concurrency)
+        # 每次探测都新建连接，延迟中包含握手耗时，与用户首次连接的体验一致
+        connector = aiohttp.TCPConnector(force_close=True)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(connector=connector,
+                                         timeout=timeout) as session:
+            results = await asyncio.gather(
+                *(self._probe_one(session, semaphore, url)
+                  for url in targets.values()))
+        for index, latency in zip(targets, results, strict=True):
+            self._samples.setdefault(
+                index, deque(maxlen=self.window)).append(latency)
+        for index in set(self._samples) - set(targets):
+            del self._samples[index]
+        logger.debug(
+            f"Route probe finished: {dict(zip(targets, results, strict=True))}")
+
+    def stats(self, index: str) -> Optional[Dict]:
+        """线路的 p50 / p95 延迟（毫秒）、可用率与是否健康，尚无数据时返回 None"""
+        samples = self._samples.get(str(index))
+        if not samples:
+            return None
+        ok = sorted(s for s in samples if s is not None)
+        availability = len(ok) / len(samples)
+        return {
+            "p50": round(_percentile(ok, 0.5), 1) if ok else None,
+            "p95": round(_percentile(ok, 0.95), 1) if ok else None,
+            "availability": availability,
+            "samples": len(samples),
+            "healthy": (samples[-1] is not None
+                        and availability >= self.min_availability),
+        }
+
+    def pick(self, routes: List[Dict], key: int,
+             tolerance: float = 0.2) -> Optional[Dict]:
+        """
+        在健康线路中选择延迟接近最快的一条：p50 不超过最快线路的 (1 + tolerance) 倍
+        （另加 20ms 抖动余量）的线路都是候选，按 key 取模分散用户，避免全部挤到同一条线路。
+        :param key: 用于分散的稳定值，如 telegram_id
+        """
+        candidates = []
+        for route in routes:
+            stats = self.stats(route.get("index"))
+            if stats and stats["healthy"]:
+                candidates.append((stats["p50"], route))
+        if not candidates:
+            return None
+        best = min(p50 for p50, _ in candidates)
+        near = [route for p50, route in sorted(candidates, key=lambda c: c[0])
+                if p50 <= best * (1 + tolerance) + 20]
+        return near[key % len(near)]
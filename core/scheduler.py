@@ -0,0 +1,299 @@
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, \
+    TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from core.lease import LeaseManager
+
+logger = logging.getLogger(__name__)
+
+JobFunc = Callable[[], Awaitable[None]]
+
+
+class IntervalTrigger:
+    """
+    固定间隔触发器。
+    """
+
+    def __init__(self, seconds: float, run_on_start: bool = False):
+        """
+        :param seconds: 两次执行之间的间隔秒数
+        :param run_on_start: 调度器启动后是否立即执行一次
+        """
+        if seconds <= 0:
+            raise ValueError("interval seconds must be positive")
+        self.seconds = seconds
+        self.run_on_start = run_on_start
+
+    def next_run(self, last_run: Optional[datetime],
+                 now: datetime) -> datetime:
+        if last_run is None:
+            return now if self.run_on_start else now + timedelta(
+                seconds=self.seconds)
+        return max(now, last_run + timedelta(seconds=self.seconds))
+
+    def __repr__(self):
+        return f"<IntervalTrigger(seconds={self.seconds})>"
+
+
+class CronTrigger:
+    """
+    五段式 cron 触发器：分 时 日 月 周（0 或 7 表示周日）。
+    支持 `*`、`*/n`、`a-b`、`a-b/n` 以及逗号分隔的列表。
+    """
+
+    _RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expr: str):
+        fields = expr.split()
+        if len(fields) != 5:
+            raise ValueError(f"invalid cron expression: {expr}")
+        self.expr = expr
+        (self.minutes, self.hours, self.days, self.months,
+         weekdays) = [
+            self._parse_field(field, low, high)
+            for field, (low, high) in zip(fields, self._RANGES, strict=True)
+        ]
+        # cron 的周日可以写成 0 或 7，统一转换成 Python 的 weekday（周一为 0）
+        self.weekdays = {(day - 1) % 7 for day in weekdays}
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    @staticmethod
+    def _parse_field(field: str, low: int, high: int) -> set:
+        values = set()
+        for part in field.split(","):
+            step = 1
+            if "/" in part:
+                part, step_str = part.split("/", 1)
+                step = int(step_str)
+                if step <= 0:
+                    raise ValueError(f"invalid cron step: {field}")
+            if part == "*":
+                start, end = low, high
+            elif "-" in part:
+                start_str, end_str = part.split("-", 1)
+                start, end = int(start_str), int(end_str)
+            else:
+                start = int(part)
+                end = high if step > 1 else start
+            if start < low or end > high or start > end:
+                raise ValueError(f"cron field out of range: {field}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, dt: datetime) -> bool:
+        day_ok = dt.day in self.days
+        weekday_ok = dt.weekday() in self.weekdays
+        # 与 cron 语义保持一致：日和周都被限制时，满足任意一个即可
+        if self._any_day:
+            return weekday_ok
+        if self._any_weekday:
+            return day_ok
+        return day_ok or weekday_ok
+
+    def next_run(self, last_run: Optional[datetime],
+                 now: datetime) -> datetime:
+        dt = now.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt + timedelta(days=366 * 4)
+        while dt < limit:
+            if dt.month not in self.months:
+                dt = (dt.replace(day=1, hour=0, minute=0)
+                      + timedelta(days=32)).replace(day=1)
+                continue
+            if not self._day_matches(dt):
+                dt = dt.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if dt.hour not in self.hours:
+                dt = dt.replace(minute=0) + timedelta(hours=1)
+                continue
+            if dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+                continue
+            return dt
+        raise ValueError(f"cron expression never fires: {self.expr}")
+
+    def __repr__(self):
+        return f"<CronTrigger(expr={self.expr!r})>"
+
+
+class Job:
+    """
+    调度任务，记录执行耗时等统计信息。
+    """
+
+    def __init__(self, name: str, func: JobFunc, trigger,
+                 jitter: float = 0, timeout: Optional[float] = None,
+                 singleton: bool = False):
+        """
+        :param name: 任务名称，需唯一
+        :param func: 无参数的协程函数
+        :param trigger: IntervalTrigger 或 CronTrigger
+        :param jitter: 每次执行额外随机延迟的最大秒数，避免多个任务同时触发
+        :param timeout: 单次执行的超时时间（秒），为空则不限制
+        :param singleton: 多实例部署时是否只在持有调度租约的实例上执行
+        """
+        self.name = name
+        self.func = func
+        self.trigger = trigger
+        self.jitter = jitter
+        self.timeout = timeout
+        self.singleton = singleton
+
+        self.running = False
+        self.next_run_at: Optional[datetime] = None
+        self.last_run_at: Optional[datetime] = None
+        self.last_duration = 0.0
+        self.max_duration = 0.0
+        self.total_duration = 0.0
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_error: Optional[str] = None
+
+    def stats(self) -> Dict:
+        return {
+            "name": self.name,
+            "trigger": repr(self.trigger),
+            "singleton": self.singleton,
+            "running": self.running,
+            "next_run_at": self.next_run_at,
+            "last_run_at": self.last_run_at,
+            "runs": self.runs,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "last_duration": round(self.last_duration, 3),
+            "avg_duration": round(self.total_duration / self.runs, 3)
+            if self.runs else 0.0,
+            "max_duration": round(self.max_duration, 3),
+            "last_error": self.last_error,
+        }
+
+
+class Scheduler:
+    """
+    基于 asyncio 的进程内任务调度器，支持 cron / 固定间隔任务、随机抖动，
+    并保证同一任务不会重叠执行。
+
+    传入 lease_manager 后，singleton 任务只会在持有调度租约的实例上执行。
+    """
+
+    LEASE_NAME = "scheduler"
+
+    def __init__(self, lease_manager: Optional["LeaseManager"] = None):
+        self.jobs: Dict[str, Job] = {}
+        self.lease_manager = lease_manager
+        if lease_manager is not None:
+            lease_manager.register(self.LEASE_NAME)
+        self._tasks: List[asyncio.Task] = []
+        self._running_tasks: set = set()
+        self._started = False
+
+    def add_job(self, job: Job) -> Job:
+        if job.name in self.jobs:
+            raise ValueError(f"job already exists: {job.name}")
+        self.jobs[job.name] = job
+        if self._started:
+            self._tasks.append(asyncio.create_task(self._job_loop(job)))
+        logger.info(f"Job registered: {job.name} {job.trigger!r}")
+        return job
+
+    def add_interval_job(self, name: str, func: JobFunc, seconds: float,
+                         run_on_start: bool = False, **kwargs) -> Job:
+        """添加固定间隔任务"""
+        return self.add_job(
+            Job(name, func, IntervalTrigger(seconds, run_on_start),
+                **kwargs))
+
+    def add_cron_job(self, name: str, func: JobFunc, expr: str,
+                     **kwargs) -> Job:
+        """添加 cron 任务"""
+        return self.add_job(Job(name, func, CronTrigger(expr), **kwargs))
+
+    def start(self):
+        """启动调度器，需在事件循环中调用"""
+        if self._started:
+            return
+        self._started = True
+        for job in self.jobs.values():
+            self._tasks.append(asyncio.create_task(self._job_loop(job)))
+        logger.info(f"Scheduler started with {len(self.jobs)} jobs")
+
+    async def stop(self):
+        """停止调度器，并取消所有正在执行的任务"""
+        if not self._started:
+            return
+        self._started = False
+        tasks = self._tasks + list(self._running_tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._running_tasks.clear()
+        logger.info("Scheduler stopped")
+
+    def is_leader(self) -> bool:
+        """当前实例是否负责执行 singleton 任务"""
+        return (self.lease_manager is None
+                or self.lease_manager.is_leader(self.LEASE_NAME))
+
+    def stats(self) -> List[Dict]:
+        """获取所有任务的执行统计"""
+        return [job.stats() for job in self.jobs.values()]
+
+    async def _job_loop(self, job: Job):
+        while True:
+            now = datetime.now()
+            job.next_run_at = job.trigger.next_run(job.last_run_at, now)
+            delay = (job.next_run_at - now).total_seconds()
+            if job.jitter:
+                delay += random.uniform(0, job.jitter)
+            await asyncio.sleep(max(delay, 0))
+            job.last_run_at = job.next_run_at
+
+            if job.singleton and not self.is_leader():
+                logger.debug(f"Not the leader, skipping job {job.name}")
+                continue
+            if job.running:
+                job.skipped += 1
+                logger.warning(
+                    f"Job {job.name} is still running, skipping this run")
+                continue
+            task = asyncio.create_task(self._run_job(job))
+            self._running_tasks.add(task)
+            task.add_done_callback(self._running_tasks.discard)
+
+    async def _run_job(self, job: Job):
+        job.running = True
+        start = time.perf_counter()
+        try:
+            if job.timeout:
+                await asyncio.wait_for(job.func(), job.timeout)
+            else:
+                await job.func()
+            job.last_error = None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            job.failures += 1
+            job.last_error = str(e) or type(e).__name__
+            logger.error(f"Job {job.name} failed: {e}", exc_info=True)
+        finally:
+            duration = time.perf_counter() - start
+            job.running = False
+            job.runs += 1
+            job.last_duration = duration
+            job.total_duration += duration
+            job.max_duration = max(job.max_duration, duration)
+            logger.debug(f"Job {job.name} finished in {duration:.3f}s")
+
+    async def run_now(self, name: str):
+        """立即执行指定任务（同样遵循不重叠原则）"""
+        job = self.jobs[name]
+        if job.running:
+            raise Exception(f"任务 {name} 正在执行中。")
+        await self._run_job(job)
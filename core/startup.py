@@ -0,0 +1,55 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    """
+    记录启动各阶段的耗时。阶段可以并发执行，summary 中的总耗时为实际经过的时间，
+    各阶段耗时之和超出总耗时的部分即为并发节省的时间。
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+
+    async def run(self, name: str, awaitable: Awaitable) -> Any:
+        """执行一个阶段并记录耗时，失败时同样记录并继续抛出异常"""
+        started = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.phases[name] = time.perf_counter() - started
+            logger.info(f"Startup phase {name} finished in "
+                        f"{self.phases[name]:.2f}s")
+
+    async def gather(self, phases: List[Tuple[str, Awaitable]],
+                     parallel: bool = True) -> List[Any]:
+        """
+        执行多个阶段，parallel 为 False 时按顺序执行。
+        所有阶段结束后才抛出第一个异常，避免失败时还有阶段在后台运行。
+        """
+        if parallel:
+            results = await asyncio.gather(
+                *(self.run(name, aw) for name, aw in phases),
+                return_exceptions=True)
+        else:
+            results = []
+            for name, aw in phases:
+                try:
+                    results.append(await self.run(name, aw))
+                except Exception as e:
+                    results.append(e)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return results
+
+    def summary(self) -> str:
+        total = time.perf_counter() - self.started
+        phases = ", ".join(f"{name} {seconds:.2f}s"
+                           for name, seconds in self.phases.items())
+        return f"{phases}; total {total:.2f}s"
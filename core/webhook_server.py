@@ -0,0 +1,98 @@
+import hmac
+import json
+import logging
+from typing import Awaitable, Callable, Dict, Optional
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+WebhookHandler = Callable[[Dict], Awaitable[bool]]
+
+
+class EmbyWebhookServer:
+    """
+    接收 Emby webhook / 通知 POST 请求的本地 HTTP 服务。
+    同时兼容 application/json 与 multipart/form-data（data 字段为 JSON）两种格式。
+    """
+
+    def __init__(self, handler: WebhookHandler, host: str = "0.0.0.0",
+                 port: int = 8081, token: str = "",
+                 path: str = "/emby/webhook"):
+        """
+        :param handler: 事件处理协程，参数为解析后的 JSON
+        :param host: 监听地址
+        :param port: 监听端口
+        :param token: 鉴权 token，通过查询参数 ?token= 传入，不能为空
+        :param path: 接收通知的路径
+        """
+        # webhook 事件会解绑账号、修改封禁状态，不允许未鉴权的请求
+        if not token:
+            raise ValueError("WEBHOOK_TOKEN is required when the webhook "
+                             "server is enabled")
+        self.handler = handler
+        self.host = host
+        self.port = port
+        self.token = token
+        self.path = path
+        self._runner: Optional[web.AppRunner] = None
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_request)
+        return app
+
+    async def handle_request(self, request: web.Request) -> web.Response:
+        if not hmac.compare_digest(
+                request.query.get("token", ""), self.token):
+            logger.warning(
+                f"Rejected webhook request from {request.remote}: bad token")
+            return web.Response(status=401)
+
+        try:
+            payload = await self._read_payload(request)
+        except (ValueError, json.JSONDecodeError) as e:
+            logger.warning(f"Invalid webhook payload: {e}")
+            return web.Response(status=400)
+
+        try:
+            handled = await self.handler(payload)
+        except Exception as e:
+            logger.error(f"Failed to handle webhook event "
+                         f"{payload.get('Event')}: {e}", exc_info=True)
+            return web.Response(status=500)
+        logger.debug(
+            f"Webhook event {payload.get('Event')} handled: {handled}")
+        return web.Response(status=204)
+
+    @staticmethod
+    async def _read_payload(request: web.Request) -> Dict:
+        if request.content_type.startswith("multipart/") or \
+                request.content_type == "application/x-www-form-urlencoded":
+            form = await request.post()
+            data = form.get("data")
+            if data is None:
+                raise ValueError("missing data field")
+            if isinstance(data, web.FileField):
+                data = data.file.read()
+            payload = json.loads(data)
+        else:
+            payload = json.loads(await request.read())
+        if not isinstance(payload, dict):
+            raise ValueError("payload must be a JSON object")
+        return payload
+
+    async def start(self):
+        self._runner = web.AppRunner(self.build_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        logger.info(
+            f"Emby webhook server listening on "
+            f"http://{self.host}:{self.port}{self.path}")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+            logger.info("Emby webhook server stopped")
@@ -1,3 +1,10 @@
 from .config_model import Config
 from .invite_code_model import InviteCode
 from .user_model import User
+from .lease_model import Lease
+from .stats_model import DailyStats
+from .broadcast_model import Broadcast
+from .sync_state_model import SyncState
+from .playback_model import PlaybackDaily
+from .session_model import SharingReview
+from .library_model import LibraryItem
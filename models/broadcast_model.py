@@ -0,0 +1,62 @@
+import enum
+import logging
+
+from py_tools.connections.db.mysql import DBManager
+from py_tools.connections.db.mysql.orm_model import BaseOrmTableWithTS
+from sqlalchemy import String, BigInteger, Enum, Integer, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastStatus(enum.Enum):
+    RUNNING = "running"  # 发送中（包括等待重启后恢复）
+    DONE = "done"  # 已发送完毕
+    CANCELLED = "cancelled"  # 已被管理员取消
+
+    def __str__(self):
+        return self.value
+
+
+class Broadcast(BaseOrmTableWithTS):
+    """
+    群发任务。接收者按 user.id 升序分批发送，每批发送完成后记录游标与计数，
+    重启后从游标处继续，不会重复发送已完成的批次。
+    """
+    __tablename__ = "broadcast"
+
+    content: Mapped[str] = mapped_column(Text, nullable=False)
+    # 接收者范围，见 services.broadcast_service.AUDIENCES
+    audience: Mapped[str] = mapped_column(String(20), nullable=False)
+    status: Mapped[BroadcastStatus] = mapped_column(
+        Enum(BroadcastStatus), index=True, nullable=False,
+        default=BroadcastStatus.RUNNING
+    )
+    created_by: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    # 已处理的最后一个 user.id
+    cursor: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    # 创建时符合条件的接收者数量
+    total: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    delivered: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # 屏蔽了 Bot、已注销或从未与 Bot 对话的接收者
+    blocked: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    failed: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    finish_time: Mapped[int] = mapped_column(BigInteger, nullable=True)
+
+    def __repr__(self):
+        return (
+            f"<Broadcast(id={self.id}, audience={self.audience}, "
+            f"status={self.status}, cursor={self.cursor}, "
+            f"total={self.total}, delivered={self.delivered}, "
+            f"blocked={self.blocked}, failed={self.failed})>"
+        )
+
+    def processed(self) -> int:
+        return self.delivered + self.blocked + self.failed
+
+
+class BroadcastOrm(DBManager):
+    orm_table = Broadcast
+
+
+logger.info("Broadcast model initialized")
@@ -1,5 +1,6 @@
 import enum
 import logging
+from datetime import datetime
 
 from py_tools.connections.db.mysql import DBManager
 from py_tools.connections.db.mysql.orm_model import BaseOrmTableWithTS
@@ -31,21 +32,53 @@ class InviteCode(BaseOrmTableWithTS):
     is_used: Mapped[bool] = mapped_column(Boolean, default=False,
                                           nullable=False)
     used_time: Mapped[int] = mapped_column(BigInteger, default=None,
-                                           nullable=True)
+                                           nullable=True, index=True)
     used_user_id: Mapped[int] = mapped_column(
         BigInteger, default=None, nullable=True, index=True
     )
+    # 过期时间戳，为空表示永不过期
+    expire_time: Mapped[int] = mapped_column(BigInteger, default=None,
+                                             nullable=True, index=True)
+    # 同一次 /new_code 生成的邀请码共用一个批次号，便于批量撤销
+    batch_id: Mapped[str] = mapped_column(String(32), default=None,
+                                          nullable=True, index=True)
 
     def __repr__(self):
         return (
             f"<InviteCode(code={self.code}, telegram_id={self.telegram_id}, "
             f"code_type={self.code_type}, is_used={self.is_used}, "
-            f"used_time={self.used_time}, used_user_id={self.used_user_id})>"
+            f"used_time={self.used_time}, used_user_id={self.used_user_id}, "
+            f"expire_time={self.expire_time}, batch_id={self.batch_id})>"
         )
 
+    def is_expired(self, now: float) -> bool:
+        """判断邀请码在指定时间是否已过期"""
+        return bool(self.expire_time) and self.expire_time < now
+
+
+class InviteCodeArchive(BaseOrmTableWithTS):
+    """已清理邀请码的归档表，created_at 为归档时间"""
+    __tablename__ = "invite_code_archive"
+
+    code: Mapped[str] = mapped_column(String(50), index=True, nullable=False)
+    telegram_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    code_type: Mapped[InviteCodeType] = mapped_column(
+        Enum(InviteCodeType), nullable=False
+    )
+    is_used: Mapped[bool] = mapped_column(Boolean, nullable=False)
+    used_time: Mapped[int] = mapped_column(BigInteger, nullable=True)
+    used_user_id: Mapped[int] = mapped_column(BigInteger, nullable=True)
+    expire_time: Mapped[int] = mapped_column(BigInteger, nullable=True)
+    batch_id: Mapped[str] = mapped_column(String(32), nullable=True)
+    code_created_at: Mapped[datetime] = mapped_column(nullable=True)
+
 
 class InviteCodeOrm(DBManager):
     orm_table = InviteCode
 
 
+class InviteCodeArchiveOrm(DBManager):
+    orm_table = InviteCodeArchive
+
+
 logger.info("InviteCode model initialized")
@@ -0,0 +1,35 @@
+import logging
+
+from py_tools.connections.db.mysql import DBManager
+from py_tools.connections.db.mysql.orm_model import BaseOrmTableWithTS
+from sqlalchemy import String, BigInteger
+from sqlalchemy.orm import Mapped, mapped_column
+
+logger = logging.getLogger(__name__)
+
+
+class Lease(BaseOrmTableWithTS):
+    """多实例部署时用于选主的租约，token 为单调递增的 fencing token"""
+    __tablename__ = "lease"
+
+    name: Mapped[str] = mapped_column(
+        String(50), index=True, unique=True, nullable=False
+    )
+    holder: Mapped[str] = mapped_column(String(100), nullable=False)
+    token: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    # 租约过期时间（毫秒时间戳）
+    expire_time: Mapped[int] = mapped_column(BigInteger, nullable=False,
+                                             default=0)
+
+    def __repr__(self):
+        return (
+            f"<Lease(name={self.name}, holder={self.holder}, "
+            f"token={self.token}, expire_time={self.expire_time})>"
+        )
+
+
+class LeaseOrm(DBManager):
+    orm_table = Lease
+
+
+logger.info("Lease model initialized")
@@ -0,0 +1,45 @@
+import logging
+
+from py_tools.connections.db.mysql import DBManager
+from py_tools.connections.db.mysql.orm_model import BaseOrmTableWithTS
+from sqlalchemy import Index, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+logger = logging.getLogger(__name__)
+
+
+class LibraryItem(BaseOrmTableWithTS):
+    """
+    Emby 媒体库中的电影与剧集，由定时任务分页同步，/search 使用其构建的内存索引查询。
+    """
+    __tablename__ = "library_item"
+    __table_args__ = (
+        Index("ix_library_item_server_item_id", "server", "item_id",
+              unique=True),
+    )
+
+    # 所在的 Emby 服务器名称
+    server: Mapped[str] = mapped_column(String(50), nullable=False)
+    item_id: Mapped[str] = mapped_column(String(50), nullable=False)
+    # Movie 或 Series
+    item_type: Mapped[str] = mapped_column(String(20), nullable=False)
+    name: Mapped[str] = mapped_column(String(255), nullable=False)
+    original_title: Mapped[str] = mapped_column(String(255), nullable=True)
+    year: Mapped[int] = mapped_column(Integer, nullable=True)
+    # 中文标题的全拼与首字母，如 liulangdiqiu / lldq
+    pinyin: Mapped[str] = mapped_column(String(512), nullable=True)
+    initials: Mapped[str] = mapped_column(String(255), nullable=True)
+
+    def __repr__(self):
+        return (
+            f"<LibraryItem(server={self.server}, item_id={self.item_id}, "
+            f"item_type={self.item_type}, name={self.name}, "
+            f"year={self.year})>"
+        )
+
+
+class LibraryItemOrm(DBManager):
+    orm_table = LibraryItem
+
+
+logger.info("LibraryItem model initialized")
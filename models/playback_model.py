@@ -0,0 +1,41 @@
+import logging
+
+from py_tools.connections.db.mysql import DBManager
+from py_tools.connections.db.mysql.orm_model import BaseOrmTableWithTS
+from sqlalchemy import BigInteger, Index, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+logger = logging.getLogger(__name__)
+
+
+class PlaybackDaily(BaseOrmTableWithTS):
+    """
+    按用户按天汇总的播放数据，由定时任务从 Emby 播放记录增量累加。
+    以 telegram_id 而不是 emby_id 汇总，迁移服务器后历史数据仍归属同一用户。
+    """
+    __tablename__ = "playback_daily"
+    __table_args__ = (
+        Index("ix_playback_daily_day_telegram_id", "day", "telegram_id",
+              unique=True),
+        Index("ix_playback_daily_telegram_id_day", "telegram_id", "day"),
+    )
+
+    day: Mapped[str] = mapped_column(String(10), nullable=False)
+    telegram_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    plays: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # 观看时长（秒）
+    duration: Mapped[int] = mapped_column(BigInteger, nullable=False,
+                                          default=0)
+
+    def __repr__(self):
+        return (
+            f"<PlaybackDaily(day={self.day}, telegram_id={self.telegram_id}, "
+            f"plays={self.plays}, duration={self.duration})>"
+        )
+
+
+class PlaybackDailyOrm(DBManager):
+    orm_table = PlaybackDaily
+
+
+logger.info("PlaybackDaily model initialized")
@@ -0,0 +1,90 @@
+import hashlib
+import logging
+from typing import Optional
+
+from py_tools.connections.db.mysql import BaseOrmTable
+from sqlalchemy import func, inspect, text, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.schema import CreateColumn
+
+from models.sync_state_model import get_state, set_state
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION_KEY = "schema_version"
+
+
+def _lowercase_telegram_names(sync_conn) -> None:
+    """用户名改为小写保存之前写入的 telegram_name 保留了原始大小写，统一转为小写"""
+    user = BaseOrmTable.metadata.tables["user"]
+    sync_conn.execute(update(user)
+                      .where(user.c.telegram_name.is_not(None))
+                      .values(telegram_name=func.lower(user.c.telegram_name)))
+
+
+# 数据迁移：名称计入表结构指纹，表结构或迁移列表变化后的首次启动在结构同步之后执行，
+# 执行失败时指纹不会保存、下次启动重试，因此必须可以重复执行
+DATA_MIGRATIONS = [
+    ("lowercase_telegram_name", _lowercase_telegram_names),
+]
+
+
+def schema_fingerprint() -> str:
+    """根据所有表的列与索引定义计算表结构指纹，模型变化后指纹随之变化"""
+    parts = []
+    for table in BaseOrmTable.metadata.sorted_tables:
+        parts.append(f"table {table.name}")
+        parts += [f"column {c.name} {c.type!r} {c.nullable}"
+                  for c in table.columns]
+        parts += sorted(
+            f"index {i.name} {[c.name for c in i.columns]} {i.unique}"
+            for i in table.indexes)
+    parts += [f"migration {name}" for name, _ in DATA_MIGRATIONS]
+    return hashlib.sha1("\n".join(parts).encode()).hexdigest()
+
+
+async def get_schema_version() -> Optional[str]:
+    """读取数据库中记录的表结构指纹，表尚未创建时返回 None"""
+    try:
+        return await get_state(SCHEMA_VERSION_KEY)
+    except SQLAlchemyError as e:
+        logger.info(f"Schema version unavailable: {e.__class__.__name__}")
+        return None
+
+
+async def save_schema_version(fingerprint: str) -> None:
+    await set_state(SCHEMA_VERSION_KEY, fingerprint)
+
+
+def sync_schema(sync_conn) -> None:
+    """
+    为已存在的表补充新增的列与索引（create_all 只会创建缺失的表）。
+    仅做增量变更，新增列需允许为空。通过 conn.run_sync(sync_schema) 调用。
+    """
+    inspector = inspect(sync_conn)
+    preparer = sync_conn.dialect.identifier_preparer
+    for table in BaseOrmTable.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing_columns = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            ddl = CreateColumn(column).compile(dialect=sync_conn.dialect)
+            logger.info(f"Adding column {table.name}.{column.name}")
+            sync_conn.execute(text(
+                f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {ddl}"
+            ))
+
+        existing_indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                logger.info(f"Creating index {index.name}")
+                index.create(sync_conn)
+
+
+def migrate_data(sync_conn) -> None:
+    """执行数据迁移，通过 conn.run_sync(migrate_data) 在 sync_schema 之后调用"""
+    for name, migration in DATA_MIGRATIONS:
+        logger.info(f"Running data migration {name}")
+        migration(sync_conn)
@@ -0,0 +1,97 @@
+import enum
+import logging
+
+from py_tools.connections.db.mysql import DBManager
+from py_tools.connections.db.mysql.orm_model import BaseOrmTableWithTS
+from sqlalchemy import BigInteger, Enum, Index, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+logger = logging.getLogger(__name__)
+
+
+class SessionObservation(BaseOrmTableWithTS):
+    """
+    轮询 Emby 会话时观察到的设备与 IP，每个用户每天每个设备 + IP 组合一行，
+    重复观察只更新 last_seen 与 samples。
+    """
+    __tablename__ = "session_observation"
+    __table_args__ = (
+        Index("ix_session_observation_key", "day", "telegram_id",
+              "device_id", "ip", unique=True),
+        Index("ix_session_observation_telegram_id_day", "telegram_id",
+              "day"),
+    )
+
+    day: Mapped[str] = mapped_column(String(10), nullable=False)
+    telegram_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    device_id: Mapped[str] = mapped_column(String(100), nullable=False)
+    device_name: Mapped[str] = mapped_column(String(100), nullable=True)
+    ip: Mapped[str] = mapped_column(String(64), nullable=False)
+    first_seen: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    last_seen: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    # 被观察到的次数
+    samples: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
+
+
+class SessionDaily(BaseOrmTableWithTS):
+    """每个用户每天同时播放的最大会话数"""
+    __tablename__ = "session_daily"
+    __table_args__ = (
+        Index("ix_session_daily_day_telegram_id", "day", "telegram_id",
+              unique=True),
+    )
+
+    day: Mapped[str] = mapped_column(String(10), nullable=False)
+    telegram_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    peak_streams: Mapped[int] = mapped_column(Integer, nullable=False,
+                                              default=0)
+
+
+class SharingReviewStatus(enum.Enum):
+    PENDING = "pending"  # 等待管理员处理
+    BANNED = "banned"  # 已禁用账号（管理员操作或自动禁用）
+    DISMISSED = "dismissed"  # 管理员确认为正常使用
+
+    def __str__(self):
+        return self.value
+
+
+class SharingReview(BaseOrmTableWithTS):
+    """疑似共享账号的审核队列，记录被标记时统计窗口内的指标"""
+    __tablename__ = "sharing_review"
+
+    telegram_id: Mapped[int] = mapped_column(BigInteger, index=True,
+                                             nullable=False)
+    status: Mapped[SharingReviewStatus] = mapped_column(
+        Enum(SharingReviewStatus), index=True, nullable=False,
+        default=SharingReviewStatus.PENDING
+    )
+    distinct_ips: Mapped[int] = mapped_column(Integer, nullable=False)
+    distinct_devices: Mapped[int] = mapped_column(Integer, nullable=False)
+    peak_streams: Mapped[int] = mapped_column(Integer, nullable=False)
+    # 处理人，自动禁用时为空
+    reviewed_by: Mapped[int] = mapped_column(BigInteger, nullable=True)
+    review_time: Mapped[int] = mapped_column(BigInteger, nullable=True)
+
+    def __repr__(self):
+        return (
+            f"<SharingReview(id={self.id}, telegram_id={self.telegram_id}, "
+            f"status={self.status}, distinct_ips={self.distinct_ips}, "
+            f"distinct_devices={self.distinct_devices}, "
+            f"peak_streams={self.peak_streams})>"
+        )
+
+
+class SessionObservationOrm(DBManager):
+    orm_table = SessionObservation
+
+
+class SessionDailyOrm(DBManager):
+    orm_table = SessionDaily
+
+
+class SharingReviewOrm(DBManager):
+    orm_table = SharingReview
+
+
+logger.info("Session model initialized")
@@ -0,0 +1,59 @@
+import logging
+
+from py_tools.connections.db.mysql import DBManager
+from py_tools.connections.db.mysql.orm_model import BaseOrmTableWithTS
+from sqlalchemy import String, Integer, BigInteger
+from sqlalchemy.orm import Mapped, mapped_column
+
+logger = logging.getLogger(__name__)
+
+# 随业务写入在同一事务中累加的当日计数
+DAILY_COUNTERS = (
+    "users_created", "emby_created", "emby_banned", "emby_unbanned",
+    "codes_issued", "codes_used",
+)
+# 由定时任务刷新的全量快照
+SNAPSHOT_FIELDS = (
+    "total_users", "emby_users", "banned_users", "whitelist_users",
+    "unused_codes",
+)
+
+
+class DailyStats(BaseOrmTableWithTS):
+    """按天汇总的统计数据，每天一行"""
+    __tablename__ = "stats_daily"
+
+    day: Mapped[str] = mapped_column(
+        String(10), index=True, unique=True, nullable=False
+    )
+    users_created: Mapped[int] = mapped_column(Integer, nullable=False,
+                                               default=0)
+    emby_created: Mapped[int] = mapped_column(Integer, nullable=False,
+                                              default=0)
+    emby_banned: Mapped[int] = mapped_column(Integer, nullable=False,
+                                             default=0)
+    emby_unbanned: Mapped[int] = mapped_column(Integer, nullable=False,
+                                               default=0)
+    codes_issued: Mapped[int] = mapped_column(Integer, nullable=False,
+                                              default=0)
+    codes_used: Mapped[int] = mapped_column(Integer, nullable=False,
+                                            default=0)
+    total_users: Mapped[int] = mapped_column(Integer, nullable=False,
+                                             default=0)
+    emby_users: Mapped[int] = mapped_column(Integer, nullable=False,
+                                            default=0)
+    banned_users: Mapped[int] = mapped_column(Integer, nullable=False,
+                                              default=0)
+    whitelist_users: Mapped[int] = mapped_column(Integer, nullable=False,
+                                                 default=0)
+    unused_codes: Mapped[int] = mapped_column(Integer, nullable=False,
+                                              default=0)
+    # 快照刷新时间戳，为空表示当天还没有刷新过
+    snapshot_time: Mapped[int] = mapped_column(BigInteger, nullable=True)
+
+
+class DailyStatsOrm(DBManager):
+    orm_table = DailyStats
+
+
+logger.info("DailyStats model initialized")
@@ -0,0 +1,51 @@
+import logging
+from typing import Optional
+
+from py_tools.connections.db.mysql import DBManager
+from py_tools.connections.db.mysql.orm_model import BaseOrmTableWithTS
+from sqlalchemy import String
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Mapped, mapped_column
+
+from models.upsert import upsert
+
+logger = logging.getLogger(__name__)
+
+
+class SyncState(BaseOrmTableWithTS):
+    """通用的键值状态，如表结构版本号、增量同步的水位"""
+    __tablename__ = "sync_state"
+
+    name: Mapped[str] = mapped_column(
+        String(50), index=True, unique=True, nullable=False
+    )
+    value: Mapped[str] = mapped_column(String(255), nullable=True)
+
+    def __repr__(self):
+        return f"<SyncState(name={self.name}, value={self.value})>"
+
+
+class SyncStateOrm(DBManager):
+    orm_table = SyncState
+
+
+async def get_state(name: str,
+                    session: Optional[AsyncSession] = None) -> Optional[str]:
+    state = await SyncStateOrm().query_one(conds=[SyncState.name == name],
+                                           session=session)
+    return state.value if state else None
+
+
+async def set_state(name: str, value: Optional[str],
+                    session: Optional[AsyncSession] = None) -> None:
+    """写入状态，不存在时插入；传入 session 时与其他写入在同一事务中提交"""
+    stmt = upsert(SyncState, lambda inserted: {"value": inserted.value},
+                  index_elements=["name"])
+    if session is not None:
+        await session.execute(stmt, [{"name": name, "value": value}])
+        return
+    async with SyncStateOrm().transaction() as session:
+        await session.execute(stmt, [{"name": name, "value": value}])
+
+
+logger.info("SyncState model initialized")
@@ -0,0 +1,34 @@
+from typing import Any, Callable, Dict, Sequence
+
+from sqlalchemy import func
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from config import config
+
+
+def upsert(orm_table, update: Callable[[Any], Dict],
+           index_elements: Sequence[str]):
+    """
+    构造 INSERT ... ON DUPLICATE KEY UPDATE 语句，SQLite 下为
+    INSERT ... ON CONFLICT DO UPDATE。
+    :param orm_table: ORM 表映射类
+    :param update: 接收 inserted 伪表，返回冲突时需要更新的列
+    :param index_elements: 判定冲突的唯一索引列，SQLite 需要显式指定
+    :return: 可配合参数列表批量执行的 insert 语句
+    """
+    if config.db_type == "sqlite":
+        stmt = sqlite_insert(orm_table)
+        return stmt.on_conflict_do_update(
+            index_elements=list(index_elements),
+            set_=update(stmt.excluded),
+        )
+    stmt = mysql_insert(orm_table)
+    return stmt.on_duplicate_key_update(**update(stmt.inserted))
+
+
+def greatest(*args):
+    """取多个值中的最大值，SQLite 下为多参数的 MAX"""
+    if config.db_type == "sqlite":
+        return func.max(*args)
+    return func.greatest(*args)
@@ -16,11 +16,16 @@ class User(BaseOrmTableWithTS):
     telegram_id: Mapped[int] = mapped_column(
         BigInteger, index=True, unique=True, nullable=False
     )
-    telegram_name: Mapped[str] = mapped_column(String(100), nullable=True)
+    # Telegram 用户名（小写，不含 @），由收到的更新保持最新，用于解析 @username
+    telegram_name: Mapped[str] = mapped_column(String(100), index=True,
+                                               nullable=True)
     emby_name: Mapped[str] = mapped_column(String(50), nullable=True)
     emby_id: Mapped[str] = mapped_column(
         String(50), index=True, unique=True, nullable=True
     )
+    # 账号所在的 Emby 服务器，为空表示默认服务器
+    emby_server: Mapped[str] = mapped_column(String(50), index=True,
+                                             nullable=True)
     is_admin: Mapped[bool] = mapped_column(Boolean, default=False,
                                            nullable=False)
     is_whitelist: Mapped[bool] = mapped_column(Boolean, default=False,
@@ -37,6 +42,7 @@ class User(BaseOrmTableWithTS):
             f"telegram_name={self.telegram_name}, "
             f"emby_name={self.emby_name}, "
             f"emby_id={self.emby_id}, "
+            f"emby_server={self.emby_server}, "
             f"is_admin={self.is_admin}, "
             f"is_whitelist={self.is_whitelist}, "
             f"enable_register={self.enable_register}, "
@@ -112,6 +118,20 @@ class User(BaseOrmTableWithTS):
         return self.ban_time, self.reason
 
 
+class EmbyAccountArchive(BaseOrmTableWithTS):
+    """长期禁用后被清理的 Emby 账号归档，created_at 为清理时间"""
+    __tablename__ = "emby_account_archive"
+
+    telegram_id: Mapped[int] = mapped_column(BigInteger, index=True,
+                                             nullable=False)
+    emby_id: Mapped[str] = mapped_column(String(50), index=True,
+                                         nullable=False)
+    emby_name: Mapped[str] = mapped_column(String(50), nullable=True)
+    emby_server: Mapped[str] = mapped_column(String(50), nullable=True)
+    ban_time: Mapped[int] = mapped_column(BigInteger, nullable=True)
+    reason: Mapped[str] = mapped_column(String(100), nullable=True)
+
+
 class UserOrm(DBManager):
     orm_table = User
 
@@ -0,0 +1,195 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import bindparam, delete, func, select, update
+
+from core.database import mark_user_written, read_session
+from core.emby_api import EmbyNotFound
+from models import User
+from models.user_model import EmbyAccountArchive, UserOrm
+from services.user_service import UserService
+
+logger = logging.getLogger(__name__)
+
+_user_table = User.__table__
+
+ProgressCallback = Callable[[Dict], Awaitable[None]]
+
+
+class BanCleanupService:
+    """
+    清理禁用时间超过保留期的 Emby 账号：删除 Emby 上的账号（可先写入归档表），
+    并解除 user 表中的绑定。用户行本身保留，之后可像新用户一样重新获得注册资格。
+    """
+
+    def __init__(self, user_service: UserService, retention_days: float,
+                 archive: bool = True, concurrency: int = 5,
+                 batch_size: int = 100):
+        """
+        :param retention_days: 禁用多少天后清理，0 表示不清理
+        :param archive: 删除前是否写入 emby_account_archive 归档表
+        :param concurrency: 同时进行的 Emby 删除请求数
+        :param batch_size: 每批处理的账号数，每批完成后提交一次
+        """
+        self.user_service = user_service
+        self.emby_pool = user_service.emby_pool
+        self.retention_days = retention_days
+        self.archive = archive
+        self.batch_size = batch_size
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._lock = asyncio.Lock()
+
+    def is_running(self) -> bool:
+        return self._lock.locked()
+
+    def _conds(self, retention_days: Optional[float]) -> list:
+        days = self.retention_days if retention_days is None \
+            else retention_days
+        if not days or days <= 0:
+            raise Exception("未设置禁用账号的保留天数（BAN_RETENTION_DAYS）。")
+        cutoff = int(datetime.now().timestamp() - days * 86400)
+        return [User.emby_id.is_not(None), User.ban_time > 0,
+                User.ban_time <= cutoff]
+
+    async def preview(self, retention_days: Optional[float] = None,
+                      limit: int = 20) -> Dict:
+        """
+        预览将被清理的账号，不做任何修改。
+        :return: {"total", "servers": {服务器: 数量}, "oldest", "samples": [User]}
+        """
+        conds = self._conds(retention_days)
+        async with read_session() as session:
+            result = await session.execute(
+                select(User.emby_server, func.count(User.id),
+                       func.min(User.ban_time))
+                .where(*conds).group_by(User.emby_server))
+            rows = result.all()
+            result = await session.execute(
+                select(User).where(*conds)
+                .order_by(User.ban_time).limit(limit))
+            samples = list(result.scalars().all())
+        servers: Dict[str, int] = {}
+        oldest = None
+        for server, count, min_ban_time in rows:
+            server = server or self.emby_pool.default_name
+            servers[server] = servers.get(server, 0) + count
+            oldest = min_ban_time if oldest is None \
+                else min(oldest, min_ban_time)
+        return {"total": sum(servers.values()), "servers": servers,
+                "oldest": oldest, "samples": samples}
+
+    async def cleanup(self, retention_days: Optional[float] = None,
+                      on_progress: Optional[ProgressCallback] = None) -> Dict:
+        """
+        分批删除符合条件的 Emby 账号。删除失败的账号保持绑定，下次清理时重试；
+        删除前已被解禁或换绑的账号跳过。
+        :return: 清理统计 {"deleted", "skipped", "failed", "errors"}
+        """
+        conds = self._conds(retention_days)
+        if self._lock.locked():
+            raise Exception("已有清理任务在运行，请稍后再试。")
+
+        report = {"deleted": 0, "skipped": 0, "failed": 0, "errors": []}
+        async with self._lock:
+            last_id = 0
+            while True:
+                result = await UserOrm().query_all(
+                    conds=[*conds, User.id > last_id],
+                    orders=[User.id],
+                    limit=self.batch_size,
+                )
+                users = list(result)
+                if not users:
+                    break
+                last_id = users[-1].id
+                archive_ids = await self._archive(users) if self.archive \
+                    else {}
+                results = await asyncio.gather(
+                    *(self._delete_emby_user(user) for user in users),
+                    return_exceptions=True)
+                deleted: List[User] = []
+                kept: List[User] = []
+                for user, outcome in zip(users, results, strict=True):
+                    if isinstance(outcome, Exception):
+                        report["failed"] += 1
+                        if len(report["errors"]) < 10:
+                            report["errors"].append(
+                                f"{user.telegram_id}：{outcome}")
+                        kept.append(user)
+                    elif outcome:
+                        deleted.append(user)
+                    else:
+                        report["skipped"] += 1
+                        kept.append(user)
+                if archive_ids and kept:
+                    await self._drop_archive(
+                        [archive_ids[user.id] for user in kept])
+                if deleted:
+                    await self._unbind(deleted)
+                    report["deleted"] += len(deleted)
+                if on_progress is not None:
+                    await on_progress(report)
+
+        if report["deleted"] or report["failed"]:
+            logger.info(
+                f"长期禁用账号清理完成：删除 {report['deleted']}，"
+                f"跳过 {report['skipped']}，失败 {report['failed']}，"
+                f"归档：{self.archive}")
+        return report
+
+    @staticmethod
+    async def _archive(users: List[User]) -> Dict[int, int]:
+        """删除 Emby 账号前写入归档表，返回 user.id -> 归档记录 id"""
+        archives = [
+            EmbyAccountArchive(
+                telegram_id=user.telegram_id, emby_id=user.emby_id,
+                emby_name=user.emby_name, emby_server=user.emby_server,
+                ban_time=user.ban_time, reason=user.reason)
+            for user in users
+        ]
+        async with UserOrm().transaction() as session:
+            session.add_all(archives)
+            await session.flush()
+        return {user.id: archive.id
+                for user, archive in zip(users, archives, strict=True)}
+
+    @staticmethod
+    async def _drop_archive(archive_ids: List[int]) -> None:
+        """删除失败或跳过的账号仍保持绑定，撤回其归档记录"""
+        async with UserOrm().transaction() as session:
+            await session.execute(delete(EmbyAccountArchive).where(
+                EmbyAccountArchive.id.in_(archive_ids)))
+
+    async def _delete_emby_user(self, user: User) -> bool:
+        """删除 Emby 账号，返回 False 表示账号已被解禁、重新禁用或换绑，未删除"""
+        async with self._semaphore:
+            current = await UserOrm().query_one(conds=[
+                User.id == user.id, User.emby_id == user.emby_id,
+                User.ban_time == user.ban_time])
+            if not current:
+                return False
+            emby_api = self.user_service.emby_for(user)
+            try:
+                await asyncio.to_thread(emby_api.delete_user, user.emby_id)
+            except EmbyNotFound:
+                # Emby 上的账号已被手动删除，视为删除成功并解除绑定
+                logger.info(f"Emby 账号 {user.emby_id} 已不存在，直接解除绑定")
+            return True
+
+    async def _unbind(self, users: List[User]) -> None:
+        """批量解除已删除账号的绑定，期间被解禁或换绑的用户不受影响"""
+        # Emby 账号已经删除，禁用记录随之清除，用户需要重新获得注册资格
+        async with UserOrm().transaction() as session:
+            await session.execute(
+                update(_user_table)
+                .where(_user_table.c.id == bindparam("uid"),
+                       _user_table.c.emby_id == bindparam("eid"),
+                       _user_table.c.ban_time > 0)
+                .values(emby_id=None, emby_name=None, emby_server=None,
+                        ban_time=None, reason=None, enable_register=False),
+                [{"uid": user.id, "eid": user.emby_id} for user in users])
+        for user in users:
+            mark_user_written(user.telegram_id)
+            self.user_service.invalidate_emby_profile(user.emby_id)
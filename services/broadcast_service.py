@@ -0,0 +1,225 @@
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import func, or_, select
+
+from models import Broadcast, User
+from models.broadcast_model import BroadcastOrm, BroadcastStatus
+from models.user_model import UserOrm
+from utils.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+SendFunc = Callable[[int, str], Awaitable[None]]
+NotifyFunc = Callable[[Broadcast], Awaitable[None]]
+
+# 接收者范围：名称 -> (说明, 查询条件)
+AUDIENCES = {
+    "emby": ("Emby 账号正常的用户", [
+        User.emby_id.is_not(None),
+        or_(User.ban_time.is_(None), User.ban_time <= 0),
+    ]),
+    "all": ("所有用户", []),
+    "banned": ("Emby 账号已被禁用的用户", [User.ban_time > 0]),
+    "whitelist": ("白名单用户", [User.is_whitelist.is_(True)]),
+    "noemby": ("尚未创建 Emby 账号的用户", [User.emby_id.is_(None)]),
+}
+# 同一接收者因限流被推迟的最大次数
+MAX_RETRIES = 3
+
+
+class RetryAfter(Exception):
+    """发送被限流，需要等待 seconds 秒后重试（对应 Telegram 的 FloodWait）"""
+
+    def __init__(self, seconds: float):
+        super().__init__(f"retry after {seconds}s")
+        self.seconds = seconds
+
+
+class RecipientUnreachable(Exception):
+    """接收者屏蔽了 Bot、已注销或从未与 Bot 对话，不再重试"""
+
+
+class BroadcastService:
+    """
+    群发消息：所有任务共用一个令牌桶限制发送速率，并用信号量限制同时进行的请求数。
+    收到限流时整个令牌桶暂停，等待结束后重试被限流的接收者。
+    """
+
+    def __init__(self, send: SendFunc, notify: Optional[NotifyFunc] = None,
+                 rate: float = 20, concurrency: int = 10,
+                 batch_size: int = 50,
+                 is_leader: Optional[Callable[[], bool]] = None):
+        """
+        :param send: 发送一条消息，限流时抛出 RetryAfter，接收者不可达时抛出 RecipientUnreachable
+        :param notify: 任务完成后的回调，用于通知发起人
+        :param rate: 每秒最多发送的消息数
+        :param concurrency: 同时进行的发送请求数
+        :param batch_size: 每批接收者数量，每批完成后保存一次进度
+        :param is_leader: 多实例部署时判断本实例是否负责发送，默认总是发送
+        """
+        self.send = send
+        self.notify = notify
+        self.batch_size = batch_size
+        self.is_leader = is_leader or (lambda: True)
+        self._bucket = TokenBucket(rate)
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._stopping = False
+
+    @staticmethod
+    def audience_conds(audience: str) -> list:
+        if audience not in AUDIENCES:
+            raise Exception(
+                f"未知的接收者范围：{audience}，可选：{', '.join(AUDIENCES)}")
+        return AUDIENCES[audience][1]
+
+    async def create(self, content: str, audience: str,
+                     created_by: int) -> Broadcast:
+        """创建群发任务并在本实例负责发送时立即开始"""
+        conds = self.audience_conds(audience)
+        async with BroadcastOrm().transaction() as session:
+            total = await session.scalar(
+                select(func.count(User.id)).where(*conds))
+            broadcast = Broadcast(content=content, audience=audience,
+                                  created_by=created_by, total=total or 0,
+                                  status=BroadcastStatus.RUNNING)
+            await BroadcastOrm().add(broadcast, session=session)
+        logger.info(f"创建群发任务 {broadcast.id}：{audience}，共 {total} 人")
+        self.start(broadcast.id)
+        return broadcast
+
+    def start(self, broadcast_id: int) -> bool:
+        """在后台开始发送，已在发送或本实例不负责发送时返回 False"""
+        if broadcast_id in self._tasks or self._stopping \
+                or not self.is_leader():
+            return False
+        task = asyncio.create_task(self._run(broadcast_id))
+        self._tasks[broadcast_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(broadcast_id, None))
+        return True
+
+    async def resume(self) -> None:
+        """定时任务：继续发送未完成的任务，如重启前中断的任务或其他实例交接过来的任务"""
+        if not self.is_leader():
+            return
+        pending = await BroadcastOrm().query_all(
+            cols=[Broadcast.id],
+            conds=[Broadcast.status == BroadcastStatus.RUNNING],
+            flat=True,
+        )
+        for broadcast_id in pending:
+            if self.start(broadcast_id):
+                logger.info(f"恢复群发任务 {broadcast_id}")
+
+    async def cancel(self, broadcast_id: int) -> bool:
+        """取消任务，正在发送的批次完成后停止"""
+        rowcount = await BroadcastOrm().update(
+            {"status": BroadcastStatus.CANCELLED,
+             "finish_time": int(datetime.now().timestamp())},
+            conds=[Broadcast.id == broadcast_id,
+                   Broadcast.status == BroadcastStatus.RUNNING],
+        )
+        return bool(rowcount)
+
+    async def get(self, broadcast_id: int) -> Optional[Broadcast]:
+        # query_one 查不到时返回空字典
+        return await BroadcastOrm().query_one(
+            conds=[Broadcast.id == broadcast_id]) or None
+
+    async def recent(self, limit: int = 5) -> List[Broadcast]:
+        return list(await BroadcastOrm().query_all(
+            orders=[Broadcast.id.desc()], limit=limit))
+
+    async def stop(self, timeout: float = 30) -> None:
+        """
+        停止本实例上正在发送的任务：等待正在发送的一批完成并保存进度，重启后从下一批继续。
+        超过 timeout 秒仍未完成时直接取消，该批会在恢复后重新发送。
+        """
+        self._stopping = True
+        tasks = list(self._tasks.values())
+        if not tasks:
+            return
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _deliver(self, telegram_id: int, content: str) -> str:
+        async with self._semaphore:
+            for _ in range(MAX_RETRIES):
+                await self._bucket.acquire()
+                try:
+                    await self.send(telegram_id, content)
+                    return "delivered"
+                except RetryAfter as e:
+                    logger.warning(f"群发触发限流，暂停发送 {e.seconds} 秒")
+                    self._bucket.pause(e.seconds)
+                except RecipientUnreachable:
+                    return "blocked"
+                except Exception as e:
+                    logger.warning(f"群发消息给 {telegram_id} 失败: {e}")
+                    return "failed"
+            return "failed"
+
+    async def _run(self, broadcast_id: int) -> None:
+        try:
+            await self._send_all(broadcast_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # 进度已按批保存，由 resume 定时任务稍后继续
+            logger.error(f"群发任务 {broadcast_id} 中断: {e}", exc_info=True)
+
+    async def _send_all(self, broadcast_id: int) -> None:
+        while not self._stopping:
+            broadcast = await self.get(broadcast_id)
+            if broadcast is None \
+                    or broadcast.status != BroadcastStatus.RUNNING:
+                return
+            if not self.is_leader():
+                logger.info(f"本实例不再负责发送，群发任务 {broadcast_id} 暂停")
+                return
+            recipients = await UserOrm().query_all(
+                cols=[User.id, User.telegram_id],
+                conds=[*self.audience_conds(broadcast.audience),
+                       User.id > broadcast.cursor],
+                orders=[User.id],
+                limit=self.batch_size,
+            )
+            if not recipients:
+                break
+            results = Counter(await asyncio.gather(
+                *(self._deliver(r["telegram_id"], broadcast.content)
+                  for r in recipients)))
+            # 批次发送期间被取消时仍记录本批计数，下一轮读取到状态后退出
+            await BroadcastOrm().update(
+                {"cursor": recipients[-1]["id"],
+                 "delivered": Broadcast.delivered + results["delivered"],
+                 "blocked": Broadcast.blocked + results["blocked"],
+                 "failed": Broadcast.failed + results["failed"]},
+                conds=[Broadcast.id == broadcast_id],
+            )
+        if self._stopping:
+            return
+
+        finished = await BroadcastOrm().update(
+            {"status": BroadcastStatus.DONE,
+             "finish_time": int(datetime.now().timestamp())},
+            conds=[Broadcast.id == broadcast_id,
+                   Broadcast.status == BroadcastStatus.RUNNING],
+        )
+        if not finished:
+            return
+        broadcast = await self.get(broadcast_id)
+        logger.info(
+            f"群发任务 {broadcast_id} 完成：送达 {broadcast.delivered}，"
+            f"屏蔽 {broadcast.blocked}，失败 {broadcast.failed}")
+        if self.notify is not None:
+            try:
+                await self.notify(broadcast)
+            except Exception as e:
+                logger.warning(f"通知群发任务 {broadcast_id} 的发起人失败: {e}")
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Optional
+
+from core.database import mark_user_written
+from models import User
+from models.user_model import UserOrm
+from services.user_service import UserService
+
+logger = logging.getLogger(__name__)
+
+# 迁移成功后的回调：用户、目标服务器上的用户名与新密码
+MovedCallback = Callable[[User, str, str], Awaitable[None]]
+ProgressCallback = Callable[[Dict], Awaitable[None]]
+
+
+class EmbyMoveService:
+    """在 Emby 服务器之间批量迁移账号"""
+
+    def __init__(self, user_service: UserService):
+        self.user_service = user_service
+        self.emby_pool = user_service.emby_pool
+        self._lock = asyncio.Lock()
+
+    def is_running(self) -> bool:
+        return self._lock.locked()
+
+    async def move_users(
+            self, source: str, target: str, limit: Optional[int] = None,
+            batch_size: int = 20,
+            on_moved: Optional[MovedCallback] = None,
+            on_progress: Optional[ProgressCallback] = None,
+    ) -> Dict:
+        """
+        把 source 上的账号迁移到 target，每批 batch_size 个并发处理，批与批之间串行。
+        Emby 无法导出密码，迁移后的账号使用新生成的密码，通过 on_moved 通知用户。
+        :param limit: 最多迁移的账号数，为空时迁移全部；不会超过目标服务器的剩余名额
+        :return: 迁移统计 {"moved", "failed", "errors"}
+        """
+        source = self.emby_pool.resolve(source)
+        target = self.emby_pool.resolve(target)
+        if source == target:
+            raise Exception("源服务器与目标服务器相同。")
+        if self._lock.locked():
+            raise Exception("已有迁移任务在运行，请稍后再试。")
+
+        capacity = self.emby_pool.capacity[target]
+        if capacity:
+            usage = await self.user_service.emby_server_usage()
+            remaining = capacity - usage[target]
+            if remaining <= 0:
+                raise Exception(f"目标服务器 {target} 的账号数已达到上限。")
+            limit = remaining if limit is None else min(limit, remaining)
+
+        report = {"moved": 0, "failed": 0, "errors": []}
+        async with self._lock:
+            last_id = 0
+            while limit is None or report["moved"] + report["failed"] < limit:
+                size = batch_size if limit is None else min(
+                    batch_size, limit - report["moved"] - report["failed"])
+                result = await UserOrm().query_all(
+                    conds=[self.user_service.emby_server_cond(source),
+                           User.emby_id.is_not(None), User.id > last_id],
+                    orders=[User.id],
+                    limit=size,
+                )
+                users = list(result)
+                if not users:
+                    break
+                last_id = users[-1].id
+                results = await asyncio.gather(
+                    *(self._move_user(user, source, target)
+                      for user in users),
+                    return_exceptions=True)
+                for user, outcome in zip(users, results, strict=True):
+                    if isinstance(outcome, Exception):
+                        report["failed"] += 1
+                        if len(report["errors"]) < 10:
+                            report["errors"].append(
+                                f"{user.telegram_id}：{outcome}")
+                        continue
+                    report["moved"] += 1
+                    if on_moved is not None:
+                        await on_moved(user, *outcome)
+                if on_progress is not None:
+                    await on_progress(report)
+
+        logger.info(
+            f"Emby 账号迁移 {source} -> {target} 完成：成功 {report['moved']}，"
+            f"失败 {report['failed']}")
+        return report
+
+    async def _move_user(self, user: User, source: str, target: str):
+        source_api = self.emby_pool.get(source)
+        target_api = self.emby_pool.get(target)
+        old_id = user.emby_id
+        name = user.emby_name or f"tg{user.telegram_id}"
+        password = UserService.gen_default_passwd()
+
+        emby_user = await asyncio.to_thread(target_api.create_user, name)
+        if not emby_user or not emby_user.get("Id"):
+            raise Exception("在目标服务器创建账号失败")
+        new_id = emby_user["Id"]
+        try:
+            await asyncio.to_thread(target_api.set_user_password, new_id,
+                                    password)
+            set_policy = target_api.ban_user if user.is_emby_baned() \
+                else target_api.set_default_policy
+            await asyncio.to_thread(set_policy, new_id)
+            # 以旧 emby_id 为条件，迁移期间账号被解绑或重建时放弃本次迁移
+            rowcount = await UserOrm().update(
+                {"emby_id": new_id, "emby_name": name,
+                 "emby_server": self.emby_pool.storage_name(target)},
+                conds=[User.id == user.id, User.emby_id == old_id],
+            )
+            if not rowcount:
+                raise Exception("账号在迁移过程中发生了变化")
+        except Exception:
+            await asyncio.to_thread(target_api.delete_user, new_id)
+            raise
+        mark_user_written(user.telegram_id)
+        self.user_service.invalidate_emby_profile(old_id)
+
+        # 以下步骤失败不影响迁移结果，只记录日志
+        router_api = self.user_service.emby_router_api
+        try:
+            route = await asyncio.to_thread(router_api.query_user_route,
+                                            old_id)
+            if route and route.get("index") is not None:
+                await asyncio.to_thread(router_api.update_user_route, new_id,
+                                        str(route["index"]))
+        except Exception as e:
+            logger.warning(f"迁移用户 {user.telegram_id} 的线路设置失败: {e}")
+        try:
+            await asyncio.to_thread(source_api.delete_user, old_id)
+        except Exception as e:
+            logger.warning(
+                f"删除源服务器 {source} 上的旧账号 {old_id} 失败: {e}")
+        return name, password
+
+    async def server_overview(self) -> Dict[str, Dict]:
+        """各服务器的账号数、上限、权重与在线状态"""
+        usage = await self.user_service.emby_server_usage()
+        names = self.emby_pool.names
+        online = await asyncio.gather(
+            *(asyncio.to_thread(self.emby_pool.get(name).check_emby_site)
+              for name in names))
+        return {
+            name: {
+                "accounts": usage.get(name, 0),
+                "capacity": self.emby_pool.capacity[name],
+                "weight": self.emby_pool.weight[name],
+                "online": is_online,
+                "default": name == self.emby_pool.default_name,
+            }
+            for name, is_online in zip(names, online, strict=True)
+        }
@@ -0,0 +1,97 @@
+import asyncio
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+import tempfile
+from datetime import datetime
+from typing import List, Sequence, Tuple
+
+from sqlalchemy import select
+
+from models import User
+from models.user_model import UserOrm
+
+logger = logging.getLogger(__name__)
+
+EXPORT_COLUMNS = [
+    "id", "telegram_id", "telegram_name", "emby_name", "emby_id",
+    "emby_server",
+    "is_admin", "is_whitelist", "enable_register", "ban_time", "reason",
+    "created_at", "updated_at",
+]
+EXPORT_FORMATS = ("csv", "jsonl")
+
+
+def _to_plain(value):
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return value
+
+
+def _serialize_csv(rows: Sequence, header: bool) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    writer.writerows([_to_plain(v) for v in row] for row in rows)
+    return buffer.getvalue()
+
+
+def _serialize_jsonl(rows: Sequence) -> str:
+    return "".join(
+        json.dumps(dict(zip(EXPORT_COLUMNS, map(_to_plain, row), strict=True)),
+                   ensure_ascii=False) + "\n"
+        for row in rows
+    )
+
+
+class ExportService:
+    """导出 user 表，通过服务端游标分块读取，内存占用与总行数无关"""
+
+    @staticmethod
+    async def export_users(fmt: str = "csv",
+                           chunk_size: int = 1000) -> Tuple[str, int]:
+        """
+        把 user 表导出为 gzip 压缩的 CSV / JSONL 文件。
+        :param fmt: csv 或 jsonl
+        :param chunk_size: 每次从游标读取的行数
+        :return: (临时文件路径, 导出行数)，调用方负责删除文件
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise Exception(f"不支持的导出格式：{fmt}，可选 csv / jsonl")
+
+        columns: List = [getattr(User, name) for name in EXPORT_COLUMNS]
+        fd, path = tempfile.mkstemp(prefix="users-", suffix=f".{fmt}.gz")
+        os.close(fd)
+        total = 0
+        try:
+            gz_file = await asyncio.to_thread(gzip.open, path, "wt",
+                                              encoding="utf-8", newline="")
+            try:
+                async with UserOrm().transaction() as session:
+                    result = await session.stream(
+                        select(*columns).order_by(User.id).execution_options(
+                            yield_per=chunk_size)
+                    )
+                    async for rows in result.partitions(chunk_size):
+                        if fmt == "csv":
+                            text = _serialize_csv(rows, header=total == 0)
+                        else:
+                            text = _serialize_jsonl(rows)
+                        # 压缩与写盘放到线程里，保持事件循环空闲
+                        await asyncio.to_thread(gz_file.write, text)
+                        total += len(rows)
+                    if fmt == "csv" and total == 0:
+                        await asyncio.to_thread(
+                            gz_file.write, _serialize_csv([], header=True))
+            finally:
+                await asyncio.to_thread(gz_file.close)
+        except BaseException:
+            os.remove(path)
+            raise
+
+        logger.info(f"用户导出完成，共 {total} 行，格式 {fmt}")
+        return path, total
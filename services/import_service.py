@@ -0,0 +1,207 @@
+import asyncio
+import csv
+import gzip
+import io
+import json
+import logging
+import re
+import time
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import case, func, or_, select
+
+from config import config
+from core.emby_api import EmbyApiPool
+from models import User
+from models.upsert import upsert
+from models.user_model import UserOrm
+from services.username_service import normalize_username
+
+logger = logging.getLogger(__name__)
+
+# 旧版 Bot 导出文件的字段别名，key 为 user 表字段
+LEGACY_FIELD_ALIASES = {
+    "telegram_id": ("telegram_id", "tg", "tgid", "tg_id", "user_id"),
+    "telegram_name": ("telegram_name", "tg_name", "tgname", "username"),
+    "emby_id": ("emby_id", "embyid"),
+    "emby_name": ("emby_name", "embyname", "name"),
+    "emby_server": ("emby_server",),
+    "is_whitelist": ("is_whitelist", "whitelist"),
+    "ban_time": ("ban_time", "bantime"),
+    "reason": ("reason", "ban_reason"),
+    # 小草 EmbyBot 的用户等级：a 白名单，b 普通，c 已禁用
+    "lv": ("lv", "level"),
+}
+EMBY_ID_PATTERN = re.compile(r"^[0-9a-fA-F-]{32,36}$")
+TRUE_VALUES = {"1", "true", "yes", "y", "t"}
+
+
+def _read_rows(path: str) -> List[Dict]:
+    """读取 CSV / JSON / JSONL（可 gzip 压缩）格式的导出文件"""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8-sig") as f:
+        content = f.read()
+    name = path[:-3] if path.endswith(".gz") else path
+    stripped = content.lstrip()
+    if name.endswith(".json") or stripped.startswith("["):
+        rows = json.loads(content)
+    elif name.endswith(".jsonl") or stripped.startswith("{"):
+        rows = [json.loads(line) for line in content.splitlines()
+                if line.strip()]
+    else:
+        rows = list(csv.DictReader(io.StringIO(content)))
+    if not isinstance(rows, list):
+        raise Exception("导入文件格式不正确，需为 CSV / JSON 数组 / JSONL。")
+    return rows
+
+
+def _pick(row: Dict, field: str):
+    for alias in LEGACY_FIELD_ALIASES[field]:
+        value = row.get(alias)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def map_legacy_row(row: Dict) -> Dict:
+    """校验并把旧版 Bot 的一行数据映射为 user 表字段，不合法时抛出 ValueError"""
+    row = {str(k).strip().lower(): v for k, v in row.items()}
+    telegram_id = _pick(row, "telegram_id")
+    if telegram_id is None or not str(telegram_id).lstrip("-").isdigit():
+        raise ValueError(f"telegram_id 不合法: {telegram_id}")
+    telegram_id = int(telegram_id)
+
+    emby_id = _pick(row, "emby_id")
+    if emby_id is not None:
+        emby_id = str(emby_id).strip()
+        if not EMBY_ID_PATTERN.match(emby_id):
+            raise ValueError(f"emby_id 不合法: {emby_id}")
+
+    level = str(_pick(row, "lv") or "").lower()
+    is_whitelist = (str(_pick(row, "is_whitelist") or "").lower()
+                    in TRUE_VALUES or level == "a")
+    ban_time = _pick(row, "ban_time")
+    ban_time = int(float(ban_time)) if ban_time is not None else None
+    reason = _pick(row, "reason")
+    if level == "c" and not ban_time:
+        ban_time = int(time.time())
+        reason = reason or "旧版 Bot 导入时已禁用"
+
+    emby_name = _pick(row, "emby_name")
+    emby_server = _pick(row, "emby_server")
+    telegram_name = normalize_username(str(_pick(row, "telegram_name") or ""))
+    return {
+        "telegram_id": telegram_id,
+        "telegram_name": telegram_name[:100] if telegram_name else None,
+        "emby_id": emby_id,
+        "emby_name": str(emby_name)[:50] if emby_name and emby_id else None,
+        "emby_server": str(emby_server)[:50] if emby_server and emby_id
+        else None,
+        "is_admin": telegram_id in config.admin_list,
+        "is_whitelist": is_whitelist,
+        "enable_register": False,
+        "ban_time": ban_time,
+        "reason": str(reason)[:100] if reason else None,
+    }
+
+
+def _unbind_emby(row: Dict) -> None:
+    row["emby_id"], row["emby_name"], row["emby_server"] = None, None, None
+
+
+def _chunks(items: List, size: int) -> Iterable[List]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _user_upsert():
+    """已存在的用户以 Bot 当前数据为准，只补全缺失字段"""
+    return upsert(User, lambda inserted: {
+        "telegram_name": func.coalesce(inserted.telegram_name,
+                                       User.telegram_name),
+        # 必须排在 emby_id 之前：MySQL 按顺序赋值，后面的表达式会读到更新后的 emby_id
+        "emby_server": case((User.emby_id.is_(None), inserted.emby_server),
+                            else_=User.emby_server),
+        "emby_id": func.coalesce(User.emby_id, inserted.emby_id),
+        "emby_name": func.coalesce(User.emby_name, inserted.emby_name),
+        "is_whitelist": or_(User.is_whitelist, inserted.is_whitelist),
+        "ban_time": func.coalesce(User.ban_time, inserted.ban_time),
+        "reason": func.coalesce(User.reason, inserted.reason),
+    }, index_elements=["telegram_id"])
+
+
+class ImportService:
+    """从旧版 Bot 的导出文件批量导入用户"""
+
+    @staticmethod
+    async def import_users(path: str,
+                           emby_pool: Optional[EmbyApiPool] = None,
+                           batch_size: int = 1000) -> Dict:
+        """
+        读取导出文件，校验映射后以 upsert 语句分批写入。
+        :param path: 导出文件路径
+        :param emby_pool: 传入时会通过各服务器的用户列表校验 emby_id 并确定所在服务器
+        :param batch_size: 每条 INSERT 语句包含的行数
+        :return: 导入统计
+        """
+        started = time.perf_counter()
+        raw_rows = await asyncio.to_thread(_read_rows, path)
+
+        report = {"total": len(raw_rows), "imported": 0, "invalid": 0,
+                  "emby_unverified": 0, "emby_conflict": 0, "errors": []}
+        mapped: Dict[int, Dict] = {}
+        for line_no, raw in enumerate(raw_rows, start=1):
+            try:
+                row = map_legacy_row(raw)
+            except (ValueError, TypeError, AttributeError) as e:
+                report["invalid"] += 1
+                if len(report["errors"]) < 10:
+                    report["errors"].append(f"第 {line_no} 行：{e}")
+                continue
+            mapped[row["telegram_id"]] = row
+        rows = list(mapped.values())
+
+        if emby_pool is not None:
+            user_servers = await asyncio.to_thread(
+                emby_pool.get_user_servers)
+            for row in rows:
+                if not row["emby_id"]:
+                    continue
+                server = user_servers.get(row["emby_id"])
+                if server is None:
+                    _unbind_emby(row)
+                    report["emby_unverified"] += 1
+                else:
+                    row["emby_server"] = emby_pool.storage_name(server)
+
+        seen_emby_ids = set()
+        for row in rows:
+            if row["emby_id"] in seen_emby_ids:
+                _unbind_emby(row)
+                report["emby_conflict"] += 1
+            elif row["emby_id"]:
+                seen_emby_ids.add(row["emby_id"])
+
+        stmt = _user_upsert()
+        for batch in _chunks(rows, batch_size):
+            async with UserOrm().transaction() as session:
+                # emby_id 已被其他 telegram 用户绑定时不覆盖
+                emby_ids = [row["emby_id"] for row in batch if row["emby_id"]]
+                if emby_ids:
+                    result = await session.execute(
+                        select(User.emby_id, User.telegram_id).where(
+                            User.emby_id.in_(emby_ids)))
+                    owners = dict(result.all())
+                    for row in batch:
+                        owner = owners.get(row["emby_id"])
+                        if owner is not None and owner != row["telegram_id"]:
+                            _unbind_emby(row)
+                            report["emby_conflict"] += 1
+                await session.execute(stmt, batch)
+            report["imported"] += len(batch)
+
+        report["elapsed"] = round(time.perf_counter() - started, 2)
+        logger.info(
+            f"用户导入完成：共 {report['total']} 行，导入 {report['imported']}，"
+            f"无效 {report['invalid']}，耗时 {report['elapsed']}s")
+        return report
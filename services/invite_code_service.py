@@ -0,0 +1,100 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import delete, func, insert, select
+
+from models import InviteCode
+from models.invite_code_model import InviteCodeArchive, InviteCodeOrm
+from services.user_service import UserService
+
+logger = logging.getLogger(__name__)
+
+_ARCHIVE_COLUMNS = [
+    "code", "telegram_id", "code_type", "is_used", "used_time",
+    "used_user_id", "expire_time", "batch_id",
+]
+
+
+class InviteCodeService:
+    """邀请码的过期清理、归档与撤销"""
+
+    @staticmethod
+    async def _purge_where(cond, archive: bool, chunk_size: int) -> int:
+        total = 0
+        while True:
+            async with InviteCodeOrm().transaction() as session:
+                result = await session.execute(
+                    select(InviteCode.id).where(cond)
+                    .order_by(InviteCode.id).limit(chunk_size)
+                )
+                ids = result.scalars().all()
+                if not ids:
+                    break
+                if archive:
+                    source = select(
+                        *[getattr(InviteCode, c) for c in _ARCHIVE_COLUMNS],
+                        InviteCode.created_at, func.now(), func.now(),
+                    ).where(InviteCode.id.in_(ids))
+                    await session.execute(
+                        insert(InviteCodeArchive).from_select(
+                            _ARCHIVE_COLUMNS + ["code_created_at",
+                                                "created_at", "updated_at"],
+                            source,
+                        )
+                    )
+                await session.execute(
+                    delete(InviteCode).where(InviteCode.id.in_(ids)))
+            total += len(ids)
+            # 每批单独提交并让出事件循环，避免长时间持有锁
+            await asyncio.sleep(0)
+        return total
+
+    @staticmethod
+    async def purge_invite_codes(retention_days: float, archive: bool = False,
+                                 chunk_size: int = 1000) -> int:
+        """
+        分批清理已过期未使用的邀请码，以及使用时间早于保留期的邀请码。
+        :param retention_days: 已使用邀请码的保留天数
+        :param archive: 是否在删除前写入归档表
+        :param chunk_size: 每批处理的行数
+        :return: 清理的邀请码数量
+        """
+        now = int(datetime.now().timestamp())
+        expired = await InviteCodeService._purge_where(
+            (InviteCode.expire_time < now) & (InviteCode.is_used.is_(False)),
+            archive, chunk_size,
+        )
+        used = await InviteCodeService._purge_where(
+            InviteCode.used_time < now - int(retention_days * 86400),
+            archive, chunk_size,
+        )
+        if expired or used:
+            logger.info(
+                f"邀请码清理完成：过期 {expired} 个，已使用 {used} 个，"
+                f"归档：{archive}")
+        return expired + used
+
+    @staticmethod
+    async def revoke_invite_codes(operator_telegram_id: int,
+                                  creator_id: Optional[int] = None,
+                                  batch_id: Optional[str] = None) -> int:
+        """撤销指定创建者或批次中尚未使用的邀请码，返回撤销数量"""
+        operator = await UserService.get_or_create_user_by_telegram_id(
+            operator_telegram_id)
+        if not operator.check_create_invite_code():
+            raise Exception("您没有权限撤销邀请码。")
+        if creator_id is None and not batch_id:
+            raise Exception("请指定邀请码创建者或批次号。")
+
+        conds = [InviteCode.is_used.is_(False)]
+        if creator_id is not None:
+            conds.append(InviteCode.telegram_id == creator_id)
+        if batch_id:
+            conds.append(InviteCode.batch_id == batch_id)
+        rowcount = await InviteCodeOrm().delete(conds=conds)
+        logger.info(
+            f"管理员 {operator_telegram_id} 撤销了 {rowcount} 个邀请码，"
+            f"创建者：{creator_id}，批次：{batch_id}")
+        return rowcount
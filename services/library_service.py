@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from pypinyin import Style, lazy_pinyin
+from sqlalchemy import delete
+
+from core.emby_api import EmbyApi, EmbyApiPool
+from models import LibraryItem
+from models.library_model import LibraryItemOrm
+from models.sync_state_model import get_state, set_state
+from models.upsert import upsert
+from utils.search_index import SearchIndex
+
+logger = logging.getLogger(__name__)
+
+# 媒体库数据的版本，同步到变化后更新，各实例据此判断是否需要重建索引
+VERSION_STATE = "library_version"
+# 增量同步的起点向前多取的时间，容忍 Bot 与 Emby 之间的时钟偏差
+SYNC_OVERLAP = timedelta(minutes=5)
+_CJK = re.compile(r"[一-鿿]")
+_UPDATE_COLUMNS = ("item_type", "name", "original_title", "year", "pinyin",
+                   "initials")
+
+
+def _pinyin(name: str) -> Dict[str, Optional[str]]:
+    """中文标题的全拼与首字母，非中文标题返回空值"""
+    if not _CJK.search(name):
+        return {"pinyin": None, "initials": None}
+    return {
+        "pinyin": "".join(lazy_pinyin(name))[:512],
+        "initials": "".join(
+            lazy_pinyin(name, style=Style.FIRST_LETTER))[:255],
+    }
+
+
+class LibraryService:
+    """
+    媒体库搜索：定时任务从各 Emby 服务器分页同步电影与剧集到 library_item 表，
+    每个实例从表中构建内存索引，/search 只查询内存索引，不请求 Emby。
+    """
+
+    def __init__(self, emby_pool: EmbyApiPool, page_size: int = 500):
+        """
+        :param page_size: 每次从 Emby 读取的条目数
+        """
+        self.emby_pool = emby_pool
+        self.page_size = page_size
+        self._index: Optional[SearchIndex] = None
+        self._version: Optional[str] = None
+
+    @staticmethod
+    def _state_name(server: str) -> str:
+        return f"library_saved:{server}"
+
+    async def sync(self, full: bool = False) -> None:
+        """
+        定时任务：同步各服务器上次同步后新增或修改的条目。
+        :param full: 全量同步，并删除 Emby 中已不存在的条目
+        """
+        changed = 0
+        for name, emby_api in self.emby_pool.apis.items():
+            try:
+                changed += await self._sync_server(name, emby_api, full)
+            except Exception as e:
+                logger.warning(f"同步 Emby 服务器 {name} 的媒体库失败: {e}")
+        if changed:
+            logger.info(f"媒体库同步完成，{changed} 个条目有变化")
+            await set_state(VERSION_STATE, str(time.time_ns()))
+            await self.refresh()
+
+    async def full_sync(self) -> None:
+        await self.sync(full=True)
+
+    async def _sync_server(self, name: str, emby_api: EmbyApi,
+                           full: bool) -> int:
+        state_name = self._state_name(name)
+        since = None if full else await get_state(state_name)
+        started = datetime.now(timezone.utc) - SYNC_OVERLAP
+        seen = set()
+        changed = 0
+        start_index = 0
+        while True:
+            items, total = await asyncio.to_thread(
+                emby_api.get_items, start_index, self.page_size, since)
+            if not items:
+                break
+            start_index += len(items)
+            rows = [self._row(name, item) for item in items
+                    if item.get("Id") and item.get("Name")]
+            if rows:
+                async with LibraryItemOrm().transaction() as session:
+                    await session.execute(upsert(LibraryItem, lambda inserted: {
+                        column: getattr(inserted, column)
+                        for column in _UPDATE_COLUMNS
+                    }, index_elements=["server", "item_id"]), rows)
+                seen.update(row["item_id"] for row in rows)
+                changed += len(rows)
+            if start_index >= total:
+                break
+
+        if full:
+            changed += await self._prune(name, seen)
+        await set_state(state_name,
+                        started.strftime("%Y-%m-%dT%H:%M:%S.000Z"))
+        return changed
+
+    @staticmethod
+    def _row(server: str, item: Dict) -> Dict:
+        name = item["Name"][:255]
+        original_title = item.get("OriginalTitle")
+        return {
+            "server": server,
+            "item_id": item["Id"],
+            "item_type": item.get("Type") or "Movie",
+            "name": name,
+            "original_title": original_title[:255]
+            if original_title and original_title != name else None,
+            "year": item.get("ProductionYear"),
+            **_pinyin(name),
+        }
+
+    @staticmethod
+    async def _prune(server: str, seen: set, chunk_size: int = 500) -> int:
+        """删除全量同步中未出现的条目"""
+        existing = await LibraryItemOrm().query_all(
+            cols=[LibraryItem.item_id],
+            conds=[LibraryItem.server == server],
+            flat=True,
+        )
+        stale = [item_id for item_id in existing if item_id not in seen]
+        for i in range(0, len(stale), chunk_size):
+            async with LibraryItemOrm().transaction() as session:
+                await session.execute(delete(LibraryItem).where(
+                    LibraryItem.server == server,
+                    LibraryItem.item_id.in_(stale[i:i + chunk_size])))
+        return len(stale)
+
+    async def refresh(self) -> None:
+        """定时任务：媒体库数据有变化时从数据库重建本实例的内存索引"""
+        version = await get_state(VERSION_STATE)
+        if self._index is not None and version == self._version:
+            return
+        rows = await LibraryItemOrm().query_all(
+            cols=[LibraryItem.item_type, LibraryItem.name,
+                  LibraryItem.original_title, LibraryItem.year,
+                  LibraryItem.pinyin, LibraryItem.initials],
+        )
+        self._index = await asyncio.to_thread(self._build, rows)
+        self._version = version
+        logger.info(f"媒体库索引已重建，共 {len(self._index)} 个条目")
+
+    @staticmethod
+    def _build(rows: List[Dict]) -> SearchIndex:
+        # 多台服务器上的同一部影片只保留一条
+        items = {}
+        for row in rows:
+            items.setdefault((row["name"], row["year"], row["item_type"]), row)
+        return SearchIndex(
+            (row, [row["name"], row["original_title"], row["pinyin"],
+                   row["initials"]])
+            for row in items.values()
+        )
+
+    def search(self, query: str, limit: int = 10) -> List[Dict]:
+        """
+        在内存索引中搜索，支持标题、原名、拼音与首字母的前缀、子串与模糊匹配。
+        :return: 匹配的条目，包含 item_type、name、original_title、year
+        """
+        if self._index is None or (not len(self._index)
+                                   and self._version is None):
+            raise Exception("媒体库索引尚未建立，请稍后再试。")
+        return [item for item, _ in self._index.search(query, limit)]
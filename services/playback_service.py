@@ -0,0 +1,176 @@
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from sqlalchemy import case, desc, func, select
+
+from core.database import read_session
+from core.emby_api import EmbyApi, EmbyApiPool
+from models import PlaybackDaily, User
+from models.playback_model import PlaybackDailyOrm
+from models.sync_state_model import get_state, set_state
+from models.upsert import upsert
+from models.user_model import UserOrm
+from utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# 排行榜周期：名称 -> (说明, 天数)，天数为空表示全部
+RANK_PERIODS = {
+    "day": ("今日", 1),
+    "week": ("近 7 天", 7),
+    "month": ("近 30 天", 30),
+    "all": ("累计", None),
+}
+
+
+def _since(days: int) -> str:
+    return (datetime.now() - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+
+
+class PlaybackService:
+    """
+    播放统计：定时任务按 rowid 水位从各 Emby 服务器的 Playback Reporting 插件增量拉取
+    播放记录，累加到 playback_daily 汇总表；/rank 与 /info 只读汇总表，结果缓存到下次同步。
+    """
+
+    def __init__(self, emby_pool: EmbyApiPool, batch_size: int = 1000,
+                 max_batches: int = 50, cache_ttl: float = 300):
+        """
+        :param batch_size: 每次从 Emby 读取的播放记录数，每批与水位在同一事务中提交
+        :param max_batches: 单次同步每台服务器最多读取的批数，剩余的留到下次
+        :param cache_ttl: 排行榜与用户统计的缓存时间（秒），本实例同步到新数据时提前失效
+        """
+        self.emby_pool = emby_pool
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self._rank_cache = TTLCache(maxsize=32, ttl=cache_ttl)
+        self._summary_cache = TTLCache(maxsize=10000, ttl=cache_ttl)
+
+    @staticmethod
+    def _state_name(server: str) -> str:
+        return f"playback_rowid:{server}"
+
+    async def sync(self) -> None:
+        """定时任务：同步所有服务器的新增播放记录"""
+        total = 0
+        for name, emby_api in self.emby_pool.apis.items():
+            try:
+                total += await self._sync_server(name, emby_api)
+            except Exception as e:
+                logger.warning(f"同步 Emby 服务器 {name} 的播放记录失败: {e}")
+        if total:
+            self._rank_cache.clear()
+            self._summary_cache.clear()
+            logger.info(f"已同步 {total} 条播放记录")
+
+    async def _sync_server(self, name: str, emby_api: EmbyApi) -> int:
+        state_name = self._state_name(name)
+        watermark = int(await get_state(state_name) or 0)
+        total = 0
+        for _ in range(self.max_batches):
+            rows = await asyncio.to_thread(
+                emby_api.get_playback_activity, watermark, self.batch_size)
+            if not rows:
+                break
+            rollups = await self._rollup(rows)
+            watermark = int(rows[-1]["rowid"])
+            async with PlaybackDailyOrm().transaction() as session:
+                if rollups:
+                    stmt = upsert(PlaybackDaily, lambda inserted: {
+                        "plays": PlaybackDaily.plays + inserted.plays,
+                        "duration": PlaybackDaily.duration
+                        + inserted.duration,
+                    }, index_elements=["day", "telegram_id"])
+                    await session.execute(stmt, rollups)
+                # 汇总与水位一起提交，中断后重新同步不会重复累加
+                await set_state(state_name, str(watermark), session=session)
+            total += len(rows)
+            if len(rows) < self.batch_size:
+                break
+        return total
+
+    @staticmethod
+    async def _rollup(rows: List[Dict]) -> List[Dict]:
+        """把一批播放记录按 (日期, telegram_id) 汇总，未绑定 Bot 用户的 Emby 账号忽略"""
+        owners = await UserOrm().query_all(
+            cols=[User.emby_id, User.telegram_id],
+            conds=[User.emby_id.in_({row["UserId"] for row in rows})],
+        )
+        telegram_ids = {o["emby_id"]: o["telegram_id"] for o in owners}
+        totals = defaultdict(lambda: [0, 0])
+        for row in rows:
+            telegram_id = telegram_ids.get(row["UserId"])
+            if telegram_id is None:
+                continue
+            # DateCreated 为 Emby 服务器本地时间，如 2024-05-01 20:13:45.1234567
+            total = totals[(str(row["DateCreated"])[:10], telegram_id)]
+            total[0] += 1
+            total[1] += int(float(row["PlayDuration"] or 0))
+        return [{"day": day, "telegram_id": telegram_id,
+                 "plays": plays, "duration": duration}
+                for (day, telegram_id), (plays, duration) in totals.items()]
+
+    async def user_summary(self, telegram_id: int) -> Dict[str, int]:
+        """
+        用户的观看统计。
+        :return: {"today", "week", "total"} 观看时长（秒）与 "plays" 累计播放次数
+        """
+        summary = self._summary_cache.get(telegram_id)
+        if summary is not None:
+            return summary
+        today = datetime.now().strftime("%Y-%m-%d")
+        duration = PlaybackDaily.duration
+        async with read_session() as session:
+            result = await session.execute(
+                select(
+                    func.sum(case((PlaybackDaily.day == today, duration),
+                                  else_=0)),
+                    func.sum(case((PlaybackDaily.day >= _since(7), duration),
+                                  else_=0)),
+                    func.sum(duration),
+                    func.sum(PlaybackDaily.plays),
+                ).where(PlaybackDaily.telegram_id == telegram_id))
+            today_seconds, week_seconds, total_seconds, plays = result.one()
+        summary = {"today": today_seconds or 0, "week": week_seconds or 0,
+                   "total": total_seconds or 0, "plays": plays or 0}
+        self._summary_cache.set(telegram_id, summary)
+        return summary
+
+    async def rank(self, period: str = "week",
+                   limit: int = 10) -> List[Dict]:
+        """
+        观看时长排行榜。
+        :param period: 统计周期，见 RANK_PERIODS
+        :return: 按观看时长倒序的 [{"telegram_id", "emby_name", "duration", "plays"}]
+        """
+        if period not in RANK_PERIODS:
+            raise Exception(
+                f"未知的统计周期：{period}，可选：{', '.join(RANK_PERIODS)}")
+        cache_key = (period, limit)
+        ranking = self._rank_cache.get(cache_key)
+        if ranking is not None:
+            return ranking
+        days = RANK_PERIODS[period][1]
+        total_duration = func.sum(PlaybackDaily.duration).label("duration")
+        stmt = select(
+            PlaybackDaily.telegram_id, total_duration,
+            func.sum(PlaybackDaily.plays).label("plays"),
+        ).group_by(PlaybackDaily.telegram_id) \
+            .order_by(desc(total_duration)).limit(limit)
+        if days is not None:
+            stmt = stmt.where(PlaybackDaily.day >= _since(days))
+        async with read_session() as session:
+            rows = (await session.execute(stmt)).all()
+            names = dict((await session.execute(
+                select(User.telegram_id, User.emby_name).where(
+                    User.telegram_id.in_([row[0] for row in rows]))
+            )).all()) if rows else {}
+        ranking = [{"telegram_id": telegram_id,
+                    "emby_name": names.get(telegram_id),
+                    "duration": duration or 0, "plays": plays or 0}
+                   for telegram_id, duration, plays in rows]
+        self._rank_cache.set(cache_key, ranking)
+        return ranking
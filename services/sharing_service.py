@@ -0,0 +1,241 @@
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import and_, delete, func, or_, select
+
+from core.database import read_session
+from models import SharingReview, User
+from models.session_model import SessionDaily, SessionObservation, \
+    SharingReviewOrm, SharingReviewStatus
+from models.upsert import greatest, upsert
+from models.user_model import UserOrm
+from services.user_service import UserService
+
+logger = logging.getLogger(__name__)
+
+NotifyFunc = Callable[[List[SharingReview]], Awaitable[None]]
+
+BAN_REASON = "疑似共享账号"
+# 会话观察数据至少保留的天数
+MIN_RETENTION_DAYS = 30
+
+
+def _since(days: int) -> str:
+    return (datetime.now() - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+
+
+class SharingService:
+    """
+    账号共享检测：定时轮询各 Emby 服务器的会话，按用户按天记录设备、IP 与同时播放数；
+    评分任务对统计窗口内的数据做一次分组聚合，超过阈值的用户进入审核队列或被自动禁用。
+    """
+
+    def __init__(self, user_service: UserService, window_days: int = 7,
+                 max_ips: int = 10, max_devices: int = 6,
+                 max_streams: int = 2, auto_ban: bool = False,
+                 notify: Optional[NotifyFunc] = None):
+        """
+        :param window_days: 评分统计的天数
+        :param max_ips: 窗口内允许的不同 IP 数
+        :param max_devices: 窗口内允许的不同设备数
+        :param max_streams: 允许的同时播放数
+        :param auto_ban: 超过阈值时直接禁用账号，否则进入审核队列
+        :param notify: 有新的标记时的回调，用于通知管理员
+        """
+        self.user_service = user_service
+        self.emby_pool = user_service.emby_pool
+        self.window_days = window_days
+        self.max_ips = max_ips
+        self.max_devices = max_devices
+        self.max_streams = max_streams
+        self.auto_ban = auto_ban
+        self.notify = notify
+
+    async def poll(self) -> None:
+        """定时任务：记录所有服务器当前会话的设备、IP 与每个用户的同时播放数"""
+        sessions = []
+        for name, emby_api in self.emby_pool.apis.items():
+            try:
+                sessions += await asyncio.to_thread(emby_api.get_sessions)
+            except Exception as e:
+                logger.warning(f"获取 Emby 服务器 {name} 的会话失败: {e}")
+        sessions = [s for s in sessions if s.get("UserId")]
+        if not sessions:
+            return
+
+        owners = await UserOrm().query_all(
+            cols=[User.emby_id, User.telegram_id],
+            conds=[User.emby_id.in_({s["UserId"] for s in sessions})],
+        )
+        telegram_ids = {o["emby_id"]: o["telegram_id"] for o in owners}
+        now = int(datetime.now().timestamp())
+        day = datetime.now().strftime("%Y-%m-%d")
+        observations: Dict[tuple, Dict] = {}
+        streams = Counter()
+        for s in sessions:
+            telegram_id = telegram_ids.get(s["UserId"])
+            if telegram_id is None:
+                continue
+            device_id = (s.get("DeviceId") or "unknown")[:100]
+            ip = (s.get("RemoteEndPoint") or "unknown")[:64]
+            observations[(telegram_id, device_id, ip)] = {
+                "day": day, "telegram_id": telegram_id,
+                "device_id": device_id,
+                "device_name": (s.get("DeviceName") or "")[:100] or None,
+                "ip": ip, "first_seen": now, "last_seen": now, "samples": 1,
+            }
+            if s.get("NowPlayingItem"):
+                streams[telegram_id] += 1
+        if not observations:
+            return
+
+        async with SharingReviewOrm().transaction() as session:
+            await session.execute(upsert(SessionObservation, lambda inserted: {
+                "device_name": inserted.device_name,
+                "last_seen": inserted.last_seen,
+                "samples": SessionObservation.samples + 1,
+            }, index_elements=["day", "telegram_id", "device_id", "ip"]),
+                list(observations.values()))
+            if streams:
+                await session.execute(upsert(SessionDaily, lambda inserted: {
+                    "peak_streams": greatest(SessionDaily.peak_streams,
+                                             inserted.peak_streams),
+                }, index_elements=["day", "telegram_id"]), [
+                    {"day": day, "telegram_id": telegram_id,
+                     "peak_streams": count}
+                    for telegram_id, count in streams.items()
+                ])
+
+    async def _suspects(self) -> List[Dict]:
+        """在数据库中分组聚合窗口内的指标，返回超过阈值的用户"""
+        since = _since(self.window_days)
+        devices = select(
+            SessionObservation.telegram_id,
+            func.count(SessionObservation.ip.distinct()).label("ips"),
+            func.count(SessionObservation.device_id.distinct())
+            .label("devices"),
+        ).where(SessionObservation.day >= since) \
+            .group_by(SessionObservation.telegram_id).subquery()
+        peaks = select(
+            SessionDaily.telegram_id,
+            func.max(SessionDaily.peak_streams).label("peak"),
+        ).where(SessionDaily.day >= since) \
+            .group_by(SessionDaily.telegram_id).subquery()
+        peak = func.coalesce(peaks.c.peak, 0)
+        stmt = select(devices.c.telegram_id, devices.c.ips, devices.c.devices,
+                      peak) \
+            .outerjoin(peaks, peaks.c.telegram_id == devices.c.telegram_id) \
+            .join(User, User.telegram_id == devices.c.telegram_id) \
+            .where(
+                or_(devices.c.ips > self.max_ips,
+                    devices.c.devices > self.max_devices,
+                    peak > self.max_streams),
+                User.emby_id.is_not(None),
+                or_(User.ban_time.is_(None), User.ban_time <= 0),
+                User.is_whitelist.is_(False),
+                User.is_admin.is_(False),
+            )
+        async with read_session() as session:
+            rows = (await session.execute(stmt)).all()
+        return [{"telegram_id": telegram_id, "distinct_ips": ips,
+                 "distinct_devices": device_count, "peak_streams": streams}
+                for telegram_id, ips, device_count, streams in rows]
+
+    async def score(self) -> List[SharingReview]:
+        """定时任务：标记超过阈值的用户，已在队列中或窗口期内处理过的用户跳过"""
+        suspects = await self._suspects()
+        if suspects:
+            recent = int(datetime.now().timestamp()) - self.window_days * 86400
+            reviewed = set(await SharingReviewOrm().query_all(
+                cols=[SharingReview.telegram_id],
+                conds=[SharingReview.telegram_id.in_(
+                    [s["telegram_id"] for s in suspects]),
+                    or_(SharingReview.status == SharingReviewStatus.PENDING,
+                        SharingReview.review_time >= recent)],
+                flat=True,
+            ))
+            suspects = [s for s in suspects
+                        if s["telegram_id"] not in reviewed]
+
+        reviews = [SharingReview(**s) for s in suspects]
+        if reviews:
+            await SharingReviewOrm().bulk_add(reviews, flush=True)
+            logger.info(f"标记了 {len(reviews)} 个疑似共享的账号")
+            if self.auto_ban:
+                for review in reviews:
+                    await self._auto_ban(review)
+            if self.notify is not None:
+                try:
+                    await self.notify(reviews)
+                except Exception as e:
+                    logger.warning(f"通知管理员疑似共享账号失败: {e}")
+        await self._purge()
+        return reviews
+
+    async def _auto_ban(self, review: SharingReview) -> None:
+        try:
+            banned = await self.user_service.emby_ban(review.telegram_id,
+                                                      BAN_REASON)
+        except Exception as e:
+            logger.warning(f"自动禁用用户 {review.telegram_id} 失败: {e}")
+            return
+        if banned:
+            review.status = SharingReviewStatus.BANNED
+            review.review_time = int(datetime.now().timestamp())
+            await SharingReviewOrm().update(
+                {"status": review.status, "review_time": review.review_time},
+                conds=[SharingReview.id == review.id],
+            )
+
+    async def _purge(self) -> None:
+        """删除超过保留期的会话观察数据"""
+        before = _since(max(self.window_days, MIN_RETENTION_DAYS))
+        async with SharingReviewOrm().transaction() as session:
+            await session.execute(delete(SessionObservation).where(
+                SessionObservation.day < before))
+            await session.execute(delete(SessionDaily).where(
+                SessionDaily.day < before))
+
+    async def pending(self, limit: int = 20) -> List[SharingReview]:
+        return list(await SharingReviewOrm().query_all(
+            conds=[SharingReview.status == SharingReviewStatus.PENDING],
+            orders=[SharingReview.id], limit=limit))
+
+    async def get(self, review_id: int) -> Optional[SharingReview]:
+        # query_one 查不到时返回空字典
+        return await SharingReviewOrm().query_one(
+            conds=[SharingReview.id == review_id]) or None
+
+    async def observations(self, telegram_id: int,
+                           limit: int = 20) -> List[SessionObservation]:
+        """用户在统计窗口内最近使用的设备与 IP"""
+        async with read_session() as session:
+            result = await session.execute(
+                select(SessionObservation).where(and_(
+                    SessionObservation.telegram_id == telegram_id,
+                    SessionObservation.day >= _since(self.window_days)))
+                .order_by(SessionObservation.last_seen.desc()).limit(limit))
+            return list(result.scalars().all())
+
+    async def resolve(self, review_id: int, operator_telegram_id: int,
+                      ban: bool) -> SharingReview:
+        """处理审核：ban 为 True 时禁用账号，否则标记为正常使用"""
+        review = await self.get(review_id)
+        if review is None or review.status != SharingReviewStatus.PENDING:
+            raise Exception("审核记录不存在或已处理。")
+        if ban and not await self.user_service.emby_ban(
+                review.telegram_id, BAN_REASON, operator_telegram_id):
+            raise Exception("禁用 Emby 账号失败。")
+        review.status = SharingReviewStatus.BANNED if ban \
+            else SharingReviewStatus.DISMISSED
+        review.reviewed_by = operator_telegram_id
+        review.review_time = int(datetime.now().timestamp())
+        await SharingReviewOrm().update(
+            {"status": review.status, "reviewed_by": review.reviewed_by,
+             "review_time": review.review_time},
+            conds=[SharingReview.id == review_id],
+        )
+        return review
@@ -0,0 +1,83 @@
+import logging
+from datetime import datetime, timedelta
+from typing import List
+
+from sqlalchemy import case, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.database import read_session
+from models import DailyStats, InviteCode, User
+from models.stats_model import DailyStatsOrm, DAILY_COUNTERS, \
+    SNAPSHOT_FIELDS
+from models.upsert import upsert
+
+logger = logging.getLogger(__name__)
+
+
+def _today() -> str:
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+async def incr_daily_stats(session: AsyncSession, **counters: int) -> None:
+    """
+    在调用方的事务中累加当日计数，与业务写入一起提交或回滚。
+    :param session: 业务所在的数据库会话
+    :param counters: 计数字段及增量，字段见 DAILY_COUNTERS
+    """
+    unknown = set(counters) - set(DAILY_COUNTERS)
+    if unknown:
+        raise ValueError(f"unknown stats counters: {unknown}")
+    stmt = upsert(DailyStats, lambda inserted: {
+        name: getattr(DailyStats, name) + getattr(inserted, name)
+        for name in counters
+    }, index_elements=["day"])
+    await session.execute(stmt, [{"day": _today(), **counters}])
+
+
+class StatsService:
+    """管理员统计：当日计数实时累加，全量数据由定时任务刷新快照"""
+
+    @staticmethod
+    async def refresh_snapshot() -> None:
+        """定时任务：统计全量数据并写入当天的统计行"""
+        now = datetime.now()
+        async with DailyStatsOrm().transaction() as session:
+            result = await session.execute(select(
+                func.count(User.id),
+                func.sum(case((User.emby_id.is_not(None), 1), else_=0)),
+                func.sum(case((User.ban_time > 0, 1), else_=0)),
+                func.sum(case((User.is_whitelist.is_(True), 1), else_=0)),
+            ))
+            total_users, emby_users, banned_users, whitelist_users = \
+                result.one()
+            unused_codes = await session.scalar(
+                select(func.count(InviteCode.id)).where(
+                    InviteCode.is_used.is_(False)))
+
+            snapshot = {
+                "total_users": total_users or 0,
+                "emby_users": emby_users or 0,
+                "banned_users": banned_users or 0,
+                "whitelist_users": whitelist_users or 0,
+                "unused_codes": unused_codes or 0,
+                "snapshot_time": int(now.timestamp()),
+            }
+            stmt = upsert(DailyStats, lambda inserted: {
+                name: getattr(inserted, name)
+                for name in (*SNAPSHOT_FIELDS, "snapshot_time")
+            }, index_elements=["day"])
+            await session.execute(
+                stmt, [{"day": now.strftime("%Y-%m-%d"), **snapshot}])
+        logger.debug(f"统计快照已刷新: {snapshot}")
+
+    @staticmethod
+    async def get_daily_stats(days: int = 7) -> List[DailyStats]:
+        """获取最近若干天的统计，按日期倒序"""
+        since = (datetime.now() - timedelta(days=days - 1)).strftime(
+            "%Y-%m-%d")
+        async with read_session() as session:
+            return await DailyStatsOrm().query_all(
+                conds=[DailyStats.day >= since],
+                orders=[DailyStats.day.desc()],
+                session=session,
+            )
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import re
 import string
@@ -6,14 +7,22 @@ from random import sample
 from typing import Optional, List, Dict, Tuple
 
 import shortuuid
-from sqlalchemy import select
+from sqlalchemy import func, select
 
 from config import config
-from core.emby_api import EmbyApi, EmbyRouterAPI
+from core.database import lock_for_write, mark_user_written, read_session
+from core.emby_api import EmbyApi, EmbyApiPool, EmbyRouterAPI
+from core.route_prober import RouteProber, parse_probe_urls
 from models import User, Config, InviteCode
 from models.config_model import ConfigOrm
 from models.invite_code_model import InviteCodeOrm, InviteCodeType
 from models.user_model import UserOrm
+from services.library_service import LibraryService
+from services.playback_service import PlaybackService
+from services.stats_service import incr_daily_stats
+from services.username_service import UsernameService, normalize_username
+from utils.cache import TTLCache
+from utils.time_helper import parse_iso8601_to_normal_date
 
 logger = logging.getLogger(__name__)
 
@@ -43,35 +52,132 @@ async def _check_register_permission(user: User,
                  < emby_config.register_public_time)
     ):
         enable_register = True
-    if 0 < emby_config.register_public_time < datetime.now().timestamp():
-        await ConfigOrm().update(
-            values={"register_public_time": 0}, conds=[Config.id == 1]
-        )
     return enable_register
 
 
+async def expire_register_public_time() -> None:
+    """定时任务：限时注册到期后关闭公共注册时间窗口"""
+    rowcount = await ConfigOrm().update(
+        values={"register_public_time": 0},
+        conds=[
+            Config.id == 1,
+            Config.register_public_time > 0,
+            Config.register_public_time < datetime.now().timestamp(),
+        ],
+    )
+    if rowcount:
+        logger.info("限时注册已到期，公共注册时间窗口已关闭")
+
+
+def build_emby_profile(emby_user: Dict) -> Dict:
+    """从 Emby 用户信息中提取 /info 需要的字段，日期字段预先格式化"""
+    last_activity_date = emby_user.get("LastActivityDate")
+    date_created = emby_user.get("DateCreated")
+    return {
+        "id": emby_user.get("Id"),
+        "name": emby_user.get("Name"),
+        "last_activity_date": parse_iso8601_to_normal_date(
+            last_activity_date) if last_activity_date else None,
+        "date_created": parse_iso8601_to_normal_date(
+            date_created) if date_created else None,
+        "is_disabled": (emby_user.get("Policy") or {}).get("IsDisabled",
+                                                          False),
+    }
+
+
 class UserService:
     """用户与 Emby 相关的业务逻辑层"""
 
-    def __init__(self, emby_api: EmbyApi, emby_router_api: EmbyRouterAPI):
+    def __init__(self, emby_api: EmbyApi, emby_router_api: EmbyRouterAPI,
+                 emby_pool: Optional[EmbyApiPool] = None):
+        """
+        :param emby_api: 默认 Emby 服务器
+        :param emby_pool: 多台 Emby 服务器，未传入时只使用 emby_api
+        """
         self.emby_api = emby_api
+        self.emby_pool = emby_pool or EmbyApiPool({"default": emby_api})
         self.emby_router_api = emby_router_api
+        # Emby 用户资料缓存，key 为 emby_id
+        self.emby_profile_cache = TTLCache(
+            maxsize=config.emby_user_cache_size,
+            ttl=config.emby_user_cache_ttl,
+        )
+        # 影片数量缓存，媒体库变化时由 webhook 主动失效
+        self.emby_count_cache = TTLCache(maxsize=1,
+                                         ttl=config.emby_count_cache_ttl)
+        # 各服务器正在播放的会话数，load 分配策略使用
+        self.emby_load_cache = TTLCache(maxsize=len(self.emby_pool.names),
+                                        ttl=30)
+        self.route_prober = RouteProber(
+            parse_probe_urls(config.route_probe_urls),
+            path=config.route_probe_path,
+            timeout=config.route_probe_timeout,
+            window=config.route_probe_window,
+        )
+        self.username_service = UsernameService()
+        self.playback_service = PlaybackService(
+            self.emby_pool,
+            batch_size=config.playback_sync_batch_size,
+            cache_ttl=max(config.playback_sync_interval, 60),
+        )
+        self.library_service = LibraryService(
+            self.emby_pool, page_size=config.library_sync_page_size)
+
+    def emby_for(self, user: User) -> EmbyApi:
+        """用户账号所在服务器的 EmbyApi"""
+        return self.emby_pool.get(user.emby_server)
+
+    def invalidate_emby_profile(self, emby_id: Optional[str]) -> None:
+        """Emby 用户资料发生变化时清除缓存"""
+        if emby_id:
+            self.emby_profile_cache.pop(str(emby_id))
+
+    def get_emby_profile(self, emby_id: str,
+                         emby_server: Optional[str] = None) -> Dict:
+        """获取 Emby 用户资料，优先读取缓存"""
+        emby_id = str(emby_id)
+        profile = self.emby_profile_cache.get(emby_id)
+        if profile is not None:
+            return profile
+        emby_user = self.emby_pool.get(emby_server).get_user(emby_id)
+        if not emby_user:
+            raise Exception(
+                "从 Emby 服务器获取用户信息失败，请检查 Emby 服务是否正常。"
+            )
+        profile = build_emby_profile(emby_user)
+        self.emby_profile_cache.set(emby_id, profile)
+        return profile
 
     @staticmethod
-    async def get_or_create_user_by_telegram_id(telegram_id: int) -> User:
-        """通过 telegram_id 从数据库获取用户，如果不存在则创建一个默认用户"""
-        user = await UserOrm().query_one(
-            conds=[User.telegram_id == telegram_id])
+    async def get_or_create_user_by_telegram_id(
+            telegram_id: int, read_replica: bool = False
+    ) -> User:
+        """
+        通过 telegram_id 从数据库获取用户，如果不存在则创建一个默认用户。
+        :param read_replica: 可容忍复制延迟的读请求（过滤器、/info）传 True，
+            优先读副本，副本中查不到时再回主库确认，避免重复创建
+        """
+        user = None
+        if read_replica:
+            async with read_session(telegram_id) as session:
+                user = await UserOrm().query_one(
+                    conds=[User.telegram_id == telegram_id], session=session)
+        if not user:
+            user = await UserOrm().query_one(
+                conds=[User.telegram_id == telegram_id])
         if not user:
             default_user = User(
                 telegram_id=telegram_id,
                 is_admin=telegram_id in config.admin_list,
-                telegram_name=config.group_members.get(telegram_id,
-                                                       {}).username
+                telegram_name=normalize_username(
+                    config.group_members[telegram_id].username)
                 if config.group_members.get(telegram_id)
                 else None,
             )
-            user_id = await UserOrm().add(default_user)
+            async with UserOrm().transaction() as session:
+                user_id = await UserOrm().add(default_user, session=session)
+                await incr_daily_stats(session, users_created=1)
+            mark_user_written(telegram_id)
             user = default_user
             user.id = user_id
         return user
@@ -82,9 +188,11 @@ class UserService:
         user = await UserService.get_or_create_user_by_telegram_id(telegram_id)
         return user and user.is_admin
 
-    async def must_get_user(self, telegram_id: int) -> User:
+    async def must_get_user(self, telegram_id: int,
+                            read_replica: bool = False) -> User:
         """获取指定用户信息，不存在则抛出异常"""
-        user = await self.get_or_create_user_by_telegram_id(telegram_id)
+        user = await self.get_or_create_user_by_telegram_id(
+            telegram_id, read_replica=read_replica)
         if user is None:
             raise Exception("未找到该用户的信息。")
         return user
@@ -103,7 +211,9 @@ class UserService:
     ) -> User:
         """内部使用：真正调用 Emby API 创建用户，并设置初始密码"""
         user = await self.get_or_create_user_by_telegram_id(telegram_id)
-        emby_user = self.emby_api.create_user(username)
+        server = await self.choose_emby_server()
+        emby_api = self.emby_pool.get(server)
+        emby_user = emby_api.create_user(username)
         if not emby_user or not emby_user.get("Id"):
             raise Exception(
                 "在 Emby 系统中创建账号失败，请检查 Emby 服务是否正常。")
@@ -111,11 +221,13 @@ class UserService:
         emby_id = emby_user["Id"]
         user.emby_id = emby_id
         user.emby_name = username
+        user.emby_server = self.emby_pool.storage_name(server)
         user.enable_register = False
 
         # 设置初始密码 & 默认Policy
-        self.emby_api.set_user_password(emby_id, password)
-        self.emby_api.set_default_policy(emby_id)
+        emby_api.set_user_password(emby_id, password)
+        emby_api.set_default_policy(emby_id)
+        self.invalidate_emby_profile(emby_id)
         return user
 
     @staticmethod
@@ -133,51 +245,69 @@ class UserService:
         """批量生成白名单邀请码"""
         return [f"epw-{str(shortuuid.uuid())}" for _ in range(num)]
 
+    @staticmethod
+    def _invite_code_expire_time(expire_days: Optional[float]) -> Optional[int]:
+        """计算邀请码过期时间戳，expire_days 为空时使用全局配置，0 表示永不过期"""
+        if expire_days is None:
+            expire_days = config.invite_code_expire_days
+        if not expire_days or expire_days <= 0:
+            return None
+        return int(datetime.now().timestamp() + expire_days * 86400)
+
     async def create_invite_code(
-            self, telegram_id: int, count: int = 1
+            self, telegram_id: int, count: int = 1,
+            expire_days: Optional[float] = None
     ) -> List[InviteCode]:
         """创建普通邀请码，需检测用户是否有权限"""
         user = await self.must_get_user(telegram_id)
         if not user.check_create_invite_code():
             raise Exception("您没有权限生成普通邀请码。")
 
+        expire_time = self._invite_code_expire_time(expire_days)
+        batch_id = shortuuid.ShortUUID().random(length=10)
         code_objs = [
             InviteCode(
                 code=code, telegram_id=telegram_id,
-                code_type=InviteCodeType.REGISTER
+                code_type=InviteCodeType.REGISTER,
+                expire_time=expire_time, batch_id=batch_id
             )
             for code in self.gen_register_code(count)
         ]
-        return await InviteCodeOrm().bulk_add(code_objs)
+        async with InviteCodeOrm().transaction() as session:
+            await InviteCodeOrm().bulk_add(code_objs, session=session)
+            await incr_daily_stats(session, codes_issued=len(code_objs))
+        return code_objs
 
     async def create_whitelist_code(
-            self, telegram_id: int, count: int = 1
+            self, telegram_id: int, count: int = 1,
+            expire_days: Optional[float] = None
     ) -> List[InviteCode]:
         """创建白名单邀请码，需检测用户是否有权限"""
         user = await self.must_get_user(telegram_id)
         if not user.check_create_whitelist_code():
             raise Exception("您没有权限生成白名单邀请码。")
 
+        expire_time = self._invite_code_expire_time(expire_days)
+        batch_id = shortuuid.ShortUUID().random(length=10)
         code_objs = [
             InviteCode(
                 code=code, telegram_id=telegram_id,
-                code_type=InviteCodeType.WHITELIST
+                code_type=InviteCodeType.WHITELIST,
+                expire_time=expire_time, batch_id=batch_id
             )
             for code in self.gen_whitelist_code(count)
         ]
-        return await InviteCodeOrm().bulk_add(code_objs)
+        async with InviteCodeOrm().transaction() as session:
+            await InviteCodeOrm().bulk_add(code_objs, session=session)
+            await incr_daily_stats(session, codes_issued=len(code_objs))
+        return code_objs
 
     async def emby_info(self, telegram_id: int) -> Tuple[User, Dict]:
-        """获取当前用户在 Emby 的信息"""
-        user = await self.must_get_user(telegram_id)
+        """获取当前用户在 Emby 的信息，返回用户与 Emby 资料（见 build_emby_profile）"""
+        user = await self.must_get_user(telegram_id, read_replica=True)
         if not user.has_emby_account():
             raise Exception("该用户尚未绑定 Emby 账号。")
-        emby_user = self.emby_api.get_user(str(user.emby_id))
-        if not emby_user:
-            raise Exception(
-                "从 Emby 服务器获取用户信息失败，请检查 Emby 服务是否正常。"
-            )
-        return user, emby_user
+        return user, self.get_emby_profile(user.emby_id, user.emby_server)
 
     async def emby_create_user(
             self, telegram_id: int, username: str, password: str
@@ -196,6 +326,16 @@ class UserService:
             raise Exception("当前没有可用的注册权限或名额，创建账号被拒绝。")
 
         async with ConfigOrm().transaction() as session:
+            # 锁定配置行后重新读取，防止并发注册超出公共名额
+            await lock_for_write(session)
+            result = await session.execute(
+                select(Config).where(Config.id == emby_config.id)
+                .with_for_update())
+            emby_config = result.scalars().one()
+            if not await _check_register_permission(user, emby_config):
+                raise Exception(
+                    "当前没有可用的注册权限或名额，创建账号被拒绝。")
+
             if (not user.enable_register
                     and emby_config.register_public_user > 0):
                 emby_config.register_public_user -= 1
@@ -206,7 +346,9 @@ class UserService:
 
             session.add(new_user)
             session.add(emby_config)
+            await incr_daily_stats(session, emby_created=1)
             await session.commit()
+        mark_user_written(telegram_id)
         return new_user
 
     async def redeem_code(self, telegram_id: int, code: str):
@@ -218,7 +360,9 @@ class UserService:
         user = await self.must_get_user(telegram_id)
 
         # 使用事务块，并通过行锁防止并发问题
+        need_unban = False
         async with InviteCodeOrm().transaction() as session:
+            await lock_for_write(session)
             # 构造 SELECT 语句，并加上 FOR UPDATE 行锁
             stmt = select(InviteCode).where(
                 InviteCode.code == code).with_for_update()
@@ -227,14 +371,15 @@ class UserService:
 
             if not valid_code or valid_code.is_used:
                 raise Exception("该邀请码无效或已被使用。")
+            if valid_code.is_expired(datetime.now().timestamp()):
+                raise Exception("该邀请码已过期。")
 
             # 根据邀请码类型执行不同的业务逻辑校验
             if valid_code.code_type == InviteCodeType.REGISTER:
                 user.check_use_redeem_code()
             elif valid_code.code_type == InviteCodeType.WHITELIST:
                 user.check_use_whitelist_code()
-                if user.is_emby_baned():
-                    await self.emby_unban(telegram_id)
+                need_unban = user.is_emby_baned()
 
             # 标记邀请码已使用，并记录使用时间和使用者
             valid_code.is_used = True
@@ -249,8 +394,13 @@ class UserService:
 
             session.add(valid_code)
             session.add(user)
+            await incr_daily_stats(session, codes_used=1)
             await session.commit()
+        mark_user_written(telegram_id)
 
+        # 解禁会开启新的写事务，放在邀请码事务提交之后，避免等待自身持有的锁
+        if need_unban:
+            await self.emby_unban(telegram_id)
         return valid_code
 
     async def reset_password(self, telegram_id: int,
@@ -258,12 +408,15 @@ class UserService:
         """重置用户的 Emby 密码。"""
         user = await self.must_get_emby_user(telegram_id)
         try:
-            self.emby_api.reset_user_password(user.emby_id)
-            self.emby_api.set_user_password(user.emby_id, password)
+            emby_api = self.emby_for(user)
+            emby_api.reset_user_password(user.emby_id)
+            emby_api.set_user_password(user.emby_id, password)
             return True
         except Exception as e:
             logger.error(f"重置密码失败: {e}")
             return False
+        finally:
+            self.invalidate_emby_profile(user.emby_id)
 
     async def emby_ban(
             self, telegram_id: int, reason: str,
@@ -279,17 +432,23 @@ class UserService:
         user.check_emby_ban()
 
         try:
-            self.emby_api.ban_user(str(user.emby_id))
+            self.emby_for(user).ban_user(str(user.emby_id))
             user.ban_time = int(datetime.now().timestamp())
             user.reason = reason
-            await UserOrm().update(
-                {"ban_time": user.ban_time, "reason": reason},
-                conds=[User.id == user.id],
-            )
+            async with UserOrm().transaction() as session:
+                await UserOrm().update(
+                    {"ban_time": user.ban_time, "reason": reason},
+                    conds=[User.id == user.id],
+                    session=session,
+                )
+                await incr_daily_stats(session, emby_banned=1)
+            mark_user_written(telegram_id)
             return True
         except Exception as e:
             logger.error(f"禁用用户失败: {e}")
             return False
+        finally:
+            self.invalidate_emby_profile(user.emby_id)
 
     async def emby_unban(
             self, telegram_id: int, operator_telegram_id: Optional[int] = None
@@ -304,16 +463,23 @@ class UserService:
         user.check_emby_unban()
 
         try:
-            self.emby_api.set_default_policy(str(user.emby_id))
+            self.emby_for(user).set_default_policy(str(user.emby_id))
             user.ban_time = 0
             user.reason = ""
-            await UserOrm().update(
-                {"ban_time": 0, "reason": None}, conds=[User.id == user.id]
-            )
+            async with UserOrm().transaction() as session:
+                await UserOrm().update(
+                    {"ban_time": 0, "reason": None},
+                    conds=[User.id == user.id],
+                    session=session,
+                )
+                await incr_daily_stats(session, emby_unbanned=1)
+            mark_user_written(telegram_id)
             return True
         except Exception as e:
             logger.error(f"解禁用户失败: {e}")
             return False
+        finally:
+            self.invalidate_emby_profile(user.emby_id)
 
     async def set_emby_config(
             self,
@@ -343,23 +509,118 @@ class UserService:
         )
         return emby_config
 
+    def emby_server_cond(self, server: str):
+        """查询某台服务器上账号的条件，默认服务器包含 emby_server 为空的账号"""
+        if server == self.emby_pool.default_name:
+            return (User.emby_server == server) | User.emby_server.is_(None)
+        return User.emby_server == server
+
+    async def emby_server_usage(self) -> Dict[str, int]:
+        """各 Emby 服务器上已绑定的账号数"""
+        async with read_session() as session:
+            result = await session.execute(
+                select(User.emby_server, func.count(User.id))
+                .where(User.emby_id.is_not(None))
+                .group_by(User.emby_server))
+            rows = result.all()
+        usage = dict.fromkeys(self.emby_pool.names, 0)
+        for server, count in rows:
+            server = server or self.emby_pool.default_name
+            usage[server] = usage.get(server, 0) + count
+        return usage
+
+    async def emby_server_load(self, server: str) -> int:
+        """服务器上正在播放的会话数，结果缓存 30 秒"""
+        load = self.emby_load_cache.get(server)
+        if load is None:
+            sessions = await asyncio.to_thread(
+                self.emby_pool.get(server).get_sessions)
+            load = sum(1 for s in sessions if s.get("NowPlayingItem"))
+            self.emby_load_cache.set(server, load)
+        return load
+
+    async def choose_emby_server(self) -> str:
+        """
+        为新账号选择服务器：排除已达账号上限的服务器，capacity 策略选账号数 / 权重最小的，
+        load 策略选正在播放的会话数 / 权重最小的（查询失败的服务器跳过），账号数作为次要排序。
+        """
+        pool = self.emby_pool
+        if len(pool.names) == 1:
+            return pool.default_name
+        usage = await self.emby_server_usage()
+        candidates = [name for name in pool.names
+                      if not pool.capacity[name]
+                      or usage[name] < pool.capacity[name]]
+        if not candidates:
+            raise Exception("所有 Emby 服务器的账号数均已达到上限，暂时无法创建账号。")
+
+        scores = {}
+        for name in candidates:
+            accounts = usage[name] / pool.weight[name]
+            if config.emby_placement != "load":
+                scores[name] = (accounts,)
+                continue
+            try:
+                load = await self.emby_server_load(name)
+            except Exception as e:
+                logger.warning(f"获取 Emby 服务器 {name} 负载失败，跳过: {e}")
+                continue
+            scores[name] = (load / pool.weight[name], accounts)
+        if not scores:
+            raise Exception("Emby 服务器均不可用，请稍后重试。")
+        return min(scores, key=scores.get)
+
     def emby_count(self) -> Dict:
-        """从 Emby API 获取当前影片数量统计"""
-        return self.emby_api.count()
+        """从 Emby API 获取当前影片数量统计，优先读取缓存"""
+        count_data = self.emby_count_cache.get("count")
+        if count_data is None:
+            # 多台服务器挂载同一份媒体库，影片数量取默认服务器
+            count_data = self.emby_api.count()
+            if count_data:
+                self.emby_count_cache.set("count", count_data)
+        return count_data
+
+    def invalidate_emby_count(self) -> None:
+        """媒体库发生变化时清除影片数量缓存"""
+        self.emby_count_cache.clear()
 
     async def get_user_router(self, telegram_id: int) -> Dict:
         """获取用户的线路信息"""
         user = await self.must_get_emby_user(telegram_id)
-        return self.emby_router_api.query_user_route(user.emby_id)
+        return await asyncio.to_thread(self.emby_router_api.query_user_route,
+                                       user.emby_id)
 
     async def update_user_router(self, telegram_id: int,
                                  new_index: str) -> bool:
         """更新用户线路信息"""
         user = await self.must_get_emby_user(telegram_id)
-        return self.emby_router_api.update_user_route(str(user.emby_id),
-                                                      str(new_index))
+        return await asyncio.to_thread(self.emby_router_api.update_user_route,
+                                       str(user.emby_id), str(new_index))
+
+    async def refresh_router_list(self) -> None:
+        """定时任务：刷新线路列表缓存"""
+        router_list = await asyncio.to_thread(
+            self.emby_router_api.query_all_route)
+        if router_list:
+            config.router_list = router_list
+
+    async def probe_routes(self) -> None:
+        """定时任务：探测各线路的延迟与可用性"""
+        await self.route_prober.probe(config.router_list or [])
+
+    def get_route_stats(self, index: str) -> Optional[Dict]:
+        """线路的探测统计，见 RouteProber.stats"""
+        return self.route_prober.stats(index)
+
+    async def auto_select_router(self, telegram_id: int) -> Dict:
+        """为用户自动选择健康且延迟接近最快的线路，返回选中的线路"""
+        route = self.route_prober.pick(config.router_list or [], telegram_id)
+        if route is None:
+            raise Exception("暂无可用的线路探测数据，请手动选择线路。")
+        await self.update_user_router(telegram_id, str(route["index"]))
+        return route
 
     async def get_router_list(self, telegram_id: int) -> List[Dict]:
         """获取所有可用线路"""
         await self.must_get_emby_user(telegram_id)
-        return self.emby_router_api.query_all_route()
+        return await asyncio.to_thread(self.emby_router_api.query_all_route)
@@ -0,0 +1,96 @@
+import logging
+from typing import Dict, Optional
+
+from sqlalchemy import bindparam, select, update
+
+from core.database import read_session
+from models import User
+from models.user_model import UserOrm
+from utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+_user_table = User.__table__
+
+
+def normalize_username(username: Optional[str]) -> Optional[str]:
+    """Telegram 用户名不区分大小写，统一去掉 @ 并转为小写后保存和查询"""
+    if not username:
+        return None
+    return username.lstrip("@").lower() or None
+
+
+class UsernameService:
+    """
+    用户名到 telegram_id 的解析缓存：先查内存 LRU，再按 user.telegram_name 索引查库，
+    都查不到时由调用方通过 MTProto 解析并调用 observe 记录结果。
+    收到的更新中携带的用户名通过 observe 记录，定时批量写回 user 表，保持 telegram_name 最新。
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 86400):
+        """
+        :param maxsize: 内存中缓存的用户名数量
+        :param ttl: 缓存有效期（秒），用户名可能被转让，过期后重新查库
+        """
+        self._ids = TTLCache(maxsize=maxsize, ttl=ttl)
+        # 最近一次看到的 telegram_id -> 用户名，用于判断用户名是否发生变化
+        self._names = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._pending: Dict[int, Optional[str]] = {}
+
+    def observe(self, telegram_id: int, username: Optional[str]) -> None:
+        """记录一次 telegram_id 与用户名的对应关系，发生变化时排队写库"""
+        username = normalize_username(username)
+        previous = self._names.get(telegram_id, default=False)
+        if previous == username:
+            return
+        if previous:
+            self._ids.pop(previous)
+        if username:
+            self._ids.set(username, telegram_id)
+        self._names.set(telegram_id, username)
+        self._pending[telegram_id] = username
+
+    async def lookup(self, username: str) -> Optional[int]:
+        """解析用户名，内存与数据库中都没有时返回 None"""
+        username = normalize_username(username)
+        if not username:
+            return None
+        telegram_id = self._ids.get(username)
+        if telegram_id is not None:
+            return telegram_id
+        async with read_session() as session:
+            telegram_id = await session.scalar(
+                select(User.telegram_id)
+                .where(User.telegram_name == username)
+                .order_by(User.updated_at.desc())
+                .limit(1))
+        if telegram_id is not None:
+            self._ids.set(username, telegram_id)
+        return telegram_id
+
+    async def flush(self) -> None:
+        """定时任务：把变化过的用户名批量写回 user 表"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        names = [name for name in pending.values() if name]
+        try:
+            async with UserOrm().transaction() as session:
+                if names:
+                    # 用户名转让给了其他人，清除旧主人的记录
+                    await session.execute(
+                        update(_user_table)
+                        .where(_user_table.c.telegram_name.in_(names),
+                               _user_table.c.telegram_id.not_in(pending))
+                        .values(telegram_name=None))
+                await session.execute(
+                    update(_user_table)
+                    .where(_user_table.c.telegram_id == bindparam("tid"))
+                    .values(telegram_name=bindparam("tname")),
+                    [{"tid": telegram_id, "tname": name}
+                     for telegram_id, name in pending.items()])
+        except Exception:
+            # 写库失败时放回队列，保留期间新观察到的值
+            self._pending = {**pending, **self._pending}
+            raise
+        logger.debug(f"已写回 {len(pending)} 个 Telegram 用户名")
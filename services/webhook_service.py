@@ -0,0 +1,108 @@
+import logging
+from datetime import datetime
+from typing import Dict
+
+from models import User
+from models.user_model import UserOrm
+from services.user_service import UserService
+from utils.time_helper import parse_iso8601_to_normal_date
+
+logger = logging.getLogger(__name__)
+
+
+class EmbyWebhookService:
+    """处理 Emby webhook 通知，增量更新缓存与数据库状态"""
+
+    def __init__(self, user_service: UserService):
+        self.user_service = user_service
+        self.handlers = {
+            "user.created": self.on_user_created,
+            "user.deleted": self.on_user_deleted,
+            "user.policyupdated": self.on_user_policy_updated,
+            "user.passwordchanged": self.on_user_changed,
+            "library.new": self.on_library_changed,
+            "library.deleted": self.on_library_changed,
+            "playback.start": self.on_playback,
+            "playback.stop": self.on_playback,
+            "playback.pause": self.on_playback,
+            "playback.unpause": self.on_playback,
+        }
+
+    async def handle(self, payload: Dict) -> bool:
+        """分发 webhook 事件，返回是否已处理"""
+        event = str(payload.get("Event", "")).lower()
+        handler = self.handlers.get(event)
+        if handler is None:
+            logger.debug(f"忽略未处理的 Emby 事件: {event}")
+            return False
+        await handler(payload)
+        return True
+
+    @staticmethod
+    def _emby_id(payload: Dict) -> str:
+        return (payload.get("User") or {}).get("Id") or ""
+
+    async def on_user_created(self, payload: Dict):
+        emby_id = self._emby_id(payload)
+        self.user_service.invalidate_emby_profile(emby_id)
+        logger.info(f"Emby 用户已创建: {emby_id}")
+
+    async def on_user_changed(self, payload: Dict):
+        self.user_service.invalidate_emby_profile(self._emby_id(payload))
+
+    async def on_user_deleted(self, payload: Dict):
+        """Emby 后台删除用户后，解除数据库中的绑定"""
+        emby_id = self._emby_id(payload)
+        if not emby_id:
+            return
+        self.user_service.invalidate_emby_profile(emby_id)
+        rowcount = await UserOrm().update(
+            {"emby_id": None, "emby_name": None},
+            conds=[User.emby_id == emby_id],
+        )
+        if rowcount:
+            logger.info(f"Emby 用户 {emby_id} 已在后台删除，已解除绑定")
+
+    async def on_user_policy_updated(self, payload: Dict):
+        """Emby 后台修改了禁用状态时，同步数据库中的封禁信息"""
+        emby_id = self._emby_id(payload)
+        if not emby_id:
+            return
+        self.user_service.invalidate_emby_profile(emby_id)
+        policy = (payload.get("User") or {}).get("Policy")
+        if not policy or "IsDisabled" not in policy:
+            return
+
+        if policy["IsDisabled"]:
+            rowcount = await UserOrm().update(
+                {"ban_time": int(datetime.now().timestamp()),
+                 "reason": "Emby 后台禁用"},
+                conds=[User.emby_id == emby_id,
+                       (User.ban_time.is_(None)) | (User.ban_time == 0)],
+            )
+        else:
+            rowcount = await UserOrm().update(
+                {"ban_time": 0, "reason": None},
+                conds=[User.emby_id == emby_id, User.ban_time > 0],
+            )
+        if rowcount:
+            logger.info(
+                f"已同步 Emby 用户 {emby_id} 的禁用状态: "
+                f"{policy['IsDisabled']}")
+
+    async def on_library_changed(self, _: Dict):
+        self.user_service.invalidate_emby_count()
+
+    async def on_playback(self, payload: Dict):
+        """播放事件只更新缓存中的上次活动时间，避免下次 /info 回源"""
+        emby_id = self._emby_id(payload)
+        profile = self.user_service.emby_profile_cache.get(emby_id)
+        if profile is None:
+            return
+        last_activity_date = parse_iso8601_to_normal_date(
+            payload["Date"]) if payload.get("Date") else None
+        self.user_service.emby_profile_cache.set(emby_id, {
+            **profile,
+            "last_activity_date": last_activity_date
+            or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        })
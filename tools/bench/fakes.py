@@ -0,0 +1,324 @@
+"""
+基准测试与压测共用的替身对象：
+- FakeTelegramClient：记录 setup_command_routes 注册的处理器，按 Pyrogram 的规则分发更新，
+  并把 Bot 发出的消息保存在内存中；
+- FakeEmbyApi / FakeEmbyRouterAPI：继承真实的 API 封装，只替换最底层的 HTTP 请求，
+  用于统计每条命令产生的 HTTP 调用次数，可选模拟网络延迟。
+
+必须在导入项目模块之前调用 setup_environment()，把数据库切换到临时的 SQLite 文件。
+"""
+import asyncio
+import contextvars
+import os
+import re
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import count
+from typing import Dict, List, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+ADMIN_ID = 10000
+GROUP_ID = -1001000000000
+_ID_SEGMENT = re.compile(r"/[0-9a-fA-F]{32}(?=/|$)")
+# 并发分发时按任务收集回复，设置后 Bot 发出的消息写入该列表而不是 client.sent
+reply_capture: contextvars.ContextVar[Optional[List[Dict]]] = \
+    contextvars.ContextVar("reply_capture", default=None)
+
+
+def setup_environment(db_path: Optional[str] = None) -> str:
+    """设置运行所需的环境变量并把仓库根目录加入 sys.path，返回 SQLite 文件路径"""
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    db_path = db_path or os.path.join(
+        tempfile.mkdtemp(prefix="embybot-bench-"), "bench.db")
+    # 显式覆盖，避免读取到本地 .env 中的 MySQL 配置
+    os.environ.update({
+        "DB_TYPE": "sqlite",
+        "DB_PATH": db_path,
+        "DB_REPLICA_HOST": "",
+        "DB_REPLICA_PATH": "",
+        "DB_SLOW_QUERY_MS": "0",
+        "TELEGRAM_GROUP_ID": str(GROUP_ID),
+        "ADMIN_LIST": str(ADMIN_ID),
+        "EMBY_URL": "http://emby.bench",
+        "EMBY_API_KEY": "bench",
+        "API_URL": "http://router.bench",
+        "API_KEY": "bench",
+        "WEBHOOK_ENABLED": "false",
+    })
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    return db_path
+
+
+class HttpCounter:
+    """统计替身 API 发出的 HTTP 请求，可选模拟阻塞式请求的耗时"""
+
+    def __init__(self, latency_ms: float = 0):
+        self.latency = latency_ms / 1000
+        self.calls = Counter()
+
+    def hit(self, key: str) -> None:
+        self.calls[key] += 1
+        if self.latency:
+            # 与 requests 一样在当前线程阻塞，如实反映同步调用对事件循环的影响
+            time.sleep(self.latency)
+
+    @property
+    def total(self) -> int:
+        return sum(self.calls.values())
+
+
+def _make_emby_classes():
+    from core.emby_api import EmbyApi, EmbyRouterAPI
+
+    class FakeEmbyApi(EmbyApi):
+        """只替换 _request 的 Emby API，业务方法仍走真实代码"""
+
+        def __init__(self, counter: HttpCounter):
+            super().__init__("http://emby.bench", "bench")
+            self.counter = counter
+            self.users: Dict[str, Dict] = {}
+
+        def _request(self, method: str, path: str, data=None, params=None):
+            self.counter.hit(
+                f"emby {method} {_ID_SEGMENT.sub('/{id}', path)}")
+            now = datetime.now().strftime("%Y-%m-%dT%H:%M:%S.0000000Z")
+            if path == "/emby/Users/New":
+                emby_id = uuid.uuid4().hex
+                self.users[emby_id] = {
+                    "Id": emby_id, "Name": data["Name"], "DateCreated": now,
+                    "LastActivityDate": now, "Policy": {"IsDisabled": False},
+                }
+                return self.users[emby_id]
+            if path == "/emby/Users":
+                return list(self.users.values())
+            if path.startswith("/emby/Users/") and method == "GET":
+                emby_id = path.split("/")[3]
+                return self.users.get(emby_id) or {
+                    "Id": emby_id, "Name": "bench", "DateCreated": now,
+                    "LastActivityDate": now, "Policy": {"IsDisabled": False},
+                }
+            if path == "/emby/Items/Counts":
+                return {"MovieCount": 1200, "SeriesCount": 300,
+                        "EpisodeCount": 9000}
+            return {}
+
+    class FakeEmbyRouterAPI(EmbyRouterAPI):
+        """只替换 call_api 的线路 API"""
+
+        ROUTES = [{"index": str(i), "name": f"线路{i}"} for i in range(1, 6)]
+
+        def __init__(self, counter: HttpCounter):
+            super().__init__("http://router.bench", "bench")
+            self.counter = counter
+            self.user_routes: Dict[str, str] = {}
+
+        def call_api(self, path: str, hedge: bool = True):
+            parts = path.strip("/").split("/")
+            self.counter.hit(
+                "router " + "/".join(["api", "route", "{id}", "{index}"]
+                                     [:len(parts)]))
+            if len(parts) == 2:
+                return self.ROUTES
+            if len(parts) == 3:
+                return {"index": self.user_routes.get(parts[2], "1")}
+            self.user_routes[parts[2]] = parts[3]
+            return {"index": parts[3]}
+
+    return FakeEmbyApi, FakeEmbyRouterAPI
+
+
+def make_fake_apis(counter: HttpCounter):
+    fake_emby_cls, fake_router_cls = _make_emby_classes()
+    return fake_emby_cls(counter), fake_router_cls(counter)
+
+
+class FakeTelegramClient:
+    """
+    替代 pyrogram.Client：on_message / on_callback_query 只记录处理器，
+    dispatch() 与 Pyrogram 的 Dispatcher 一样按分组从小到大，在每个分组中执行第一个匹配的处理器。
+    """
+
+    def __init__(self):
+        from pyrogram.types import User
+
+        self.me = User(id=1, is_bot=True, first_name="bench",
+                       username="bench_bot")
+        # (分组, 处理器)
+        self.handlers: List = []
+        self.sent: List[Dict] = []
+        self.loop = None
+        self.executor = ThreadPoolExecutor(max_workers=4)
+        self._message_ids = count(1)
+
+    def on_message(self, filters=None, group: int = 0):
+        from pyrogram.handlers import MessageHandler
+
+        def decorator(func):
+            self.handlers.append((group, MessageHandler(func, filters)))
+            return func
+
+        return decorator
+
+    def on_callback_query(self, filters=None, group: int = 0):
+        from pyrogram.handlers import CallbackQueryHandler
+
+        def decorator(func):
+            self.handlers.append((group, CallbackQueryHandler(func, filters)))
+            return func
+
+        return decorator
+
+    async def dispatch(self, update) -> bool:
+        """分发一条更新，返回分组不小于 0 的处理器是否处理了它（负数分组只做观察）"""
+        from pyrogram.handlers import CallbackQueryHandler, MessageHandler
+        from pyrogram.types import CallbackQuery, Message
+
+        self.loop = self.loop or asyncio.get_running_loop()
+        handler_type = (CallbackQueryHandler
+                        if isinstance(update, CallbackQuery)
+                        else MessageHandler)
+        if not isinstance(update, (CallbackQuery, Message)):
+            raise TypeError(f"unsupported update: {type(update)}")
+        handled = False
+        for group in sorted({group for group, _ in self.handlers}):
+            for handler_group, handler in self.handlers:
+                if (handler_group == group
+                        and isinstance(handler, handler_type)
+                        and await handler.check(self, update)):
+                    await handler.callback(self, update)
+                    handled = handled or group >= 0
+                    break
+        return handled
+
+    def _append(self, item: Dict) -> None:
+        captured = reply_capture.get()
+        (self.sent if captured is None else captured).append(item)
+
+    def _record(self, kind: str, **kwargs):
+        from pyrogram.types import Chat, Message
+        from pyrogram.enums import ChatType
+
+        self._append({"kind": kind, **kwargs})
+        chat_id = kwargs.get("chat_id", 0)
+        return Message(
+            client=self, id=next(self._message_ids), from_user=self.me,
+            chat=Chat(id=chat_id, type=ChatType.PRIVATE), date=datetime.now(),
+            text=kwargs.get("text"),
+        )
+
+    async def send_message(self, chat_id, text, **kwargs):
+        return self._record("message", chat_id=chat_id, text=text)
+
+    async def edit_message_text(self, chat_id, message_id, text, **kwargs):
+        return self._record("edit", chat_id=chat_id, text=text)
+
+    async def send_document(self, chat_id, document, **kwargs):
+        return self._record("document", chat_id=chat_id,
+                            text=kwargs.get("caption"))
+
+    async def delete_messages(self, chat_id, message_ids, **kwargs):
+        self._append({"kind": "delete", "chat_id": chat_id})
+        return True
+
+    async def answer_callback_query(self, callback_query_id, text=None,
+                                    **kwargs):
+        self._append({"kind": "answer", "text": text})
+        return True
+
+    async def get_users(self, user_ids):
+        """从 config.group_members 中按 ID 或用户名查找，与 Pyrogram 一样单个参数返回单个用户"""
+        from pyrogram.errors import PeerIdInvalid, UsernameNotOccupied
+
+        from config import config
+
+        users = []
+        for user_id in (user_ids if isinstance(user_ids, list)
+                        else [user_ids]):
+            if isinstance(user_id, int):
+                user = config.group_members.get(user_id)
+                if user is None:
+                    raise PeerIdInvalid()
+            else:
+                username = user_id.lstrip("@").lower()
+                user = next((m for m in config.group_members.values()
+                             if (m.username or "").lower() == username),
+                            None)
+                if user is None:
+                    raise UsernameNotOccupied()
+            users.append(user)
+        return users if isinstance(user_ids, list) else users[0]
+
+    def take_sent(self) -> List[Dict]:
+        sent, self.sent = self.sent, []
+        return sent
+
+
+class FakeBotClient:
+    """与 bot.BotClient 接口一致，内部使用 FakeTelegramClient"""
+
+    def __init__(self):
+        self.client = FakeTelegramClient()
+        self.ready = asyncio.Event()
+        self.ready.set()
+
+
+class UpdateFactory:
+    """构造 Pyrogram 的 Message / CallbackQuery 对象"""
+
+    def __init__(self, client: FakeTelegramClient):
+        self.client = client
+        self._ids = count(1)
+
+    @staticmethod
+    def user(telegram_id: int):
+        from pyrogram.types import User
+
+        return User(id=telegram_id, is_bot=False,
+                    first_name=f"user{telegram_id}",
+                    username=f"user{telegram_id}")
+
+    def message(self, telegram_id: int, text: Optional[str] = None,
+                private: bool = True, reply_to: Optional[int] = None,
+                **kwargs):
+        from pyrogram.enums import ChatType
+        from pyrogram.types import Chat, Message
+
+        chat = (Chat(id=telegram_id, type=ChatType.PRIVATE) if private
+                else Chat(id=GROUP_ID, type=ChatType.SUPERGROUP))
+        reply_to_message = None
+        if reply_to is not None:
+            reply_to_message = Message(
+                client=self.client, id=next(self._ids),
+                from_user=self.user(reply_to), chat=chat,
+                date=datetime.now(), text="hi",
+            )
+        return Message(
+            client=self.client, id=next(self._ids),
+            from_user=self.user(telegram_id), chat=chat, date=datetime.now(),
+            text=text, reply_to_message=reply_to_message, **kwargs,
+        )
+
+    def member_joined(self, telegram_id: int):
+        return self.message(telegram_id, private=False,
+                            new_chat_members=[self.user(telegram_id)])
+
+    def member_left(self, telegram_id: int):
+        return self.message(telegram_id, private=False,
+                            left_chat_member=self.user(telegram_id))
+
+    def callback(self, telegram_id: int, data: str):
+        from pyrogram.types import CallbackQuery
+
+        return CallbackQuery(
+            client=self.client, id=str(next(self._ids)),
+            from_user=self.user(telegram_id), chat_instance="bench",
+            message=self.message(telegram_id, "选择线路"), data=data,
+        )
@@ -0,0 +1,363 @@
+"""
+端到端命令基准测试：通过 setup_command_routes 注册的真实处理器（含权限过滤器）分发合成的
+Pyrogram 更新，数据库使用临时 SQLite 文件，Emby 与线路 API 使用替身对象。
+
+每条命令输出 p50/p99 延迟、ops/s，以及每次调用的数据库查询数与 HTTP 调用数。
+查询数与调用数是确定的，可以与基线比较以在 CI 中发现性能回退。
+
+用法：
+    python tools/bench/handler_bench.py
+    python tools/bench/handler_bench.py -n 500 --only info,use_code --emby-latency-ms 50
+    python tools/bench/handler_bench.py --baseline tools/bench/baseline.json --json result.json
+    python tools/bench/handler_bench.py --write-baseline tools/bench/baseline.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import sys
+import time
+from dataclasses import dataclass, field
+from itertools import count
+from typing import Awaitable, Callable, Dict, List
+
+from fakes import ADMIN_ID, FakeBotClient, HttpCounter, UpdateFactory, \
+    make_fake_apis, setup_environment
+
+ERROR_MARKERS = ("❌", "失败", "参数不足")
+
+
+@dataclass
+class Scenario:
+    name: str
+    # 准备阶段不计入耗时与查询数，返回本次要分发的更新
+    prepare: Callable[["BenchContext", int], Awaitable]
+
+
+@dataclass
+class Result:
+    name: str
+    latencies: List[float] = field(default_factory=list)
+    queries: int = 0
+    http_calls: int = 0
+    errors: int = 0
+    elapsed: float = 0.0
+
+    def summary(self) -> Dict:
+        ops = len(self.latencies) or 1
+        ordered = sorted(self.latencies)
+        return {
+            "ops": len(self.latencies),
+            "p50_ms": round(statistics.median(ordered) * 1000, 3),
+            "p99_ms": round(
+                ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+                * 1000, 3),
+            "ops_per_sec": round(ops / self.elapsed, 1) if self.elapsed
+            else 0.0,
+            "queries": round(self.queries / ops, 2),
+            "http": round(self.http_calls / ops, 2),
+            "errors": self.errors,
+        }
+
+
+class BenchContext:
+    """基准测试共享状态：Bot 替身、服务对象与预先创建的用户"""
+
+    def __init__(self, emby_latency_ms: float, pool_size: int):
+        self.counter = HttpCounter(emby_latency_ms)
+        self.pool_size = pool_size
+        self.ids = count(20000)
+        self.bot_client = FakeBotClient()
+        self.client = self.bot_client.client
+        self.updates = UpdateFactory(self.client)
+        self.emby_users: List[int] = []
+        self.ban_targets: List[int] = []
+        # telegram_id -> emby_id
+        self.emby_ids: Dict[int, str] = {}
+
+    async def setup(self):
+        import app
+        from bot.command import CommandHandler
+        from config import config
+        from models.user_model import UserOrm
+        from services import UserService
+
+        await app._init_db()
+        self.emby_api, self.router_api = make_fake_apis(self.counter)
+        self.user_service = UserService(emby_api=self.emby_api,
+                                        emby_router_api=self.router_api)
+        CommandHandler(bot_client=self.bot_client,
+                       user_service=self.user_service)
+        config.router_list = self.router_api.ROUTES
+        config.group_members_loaded = True
+        self.config = config
+
+        await self.user_service.get_or_create_user_by_telegram_id(ADMIN_ID)
+        self.join(ADMIN_ID)
+        users = []
+        for pool in (self.emby_users, self.ban_targets):
+            for _ in range(self.pool_size):
+                telegram_id = self.new_member()
+                users.append(self._emby_user_row(telegram_id))
+                pool.append(telegram_id)
+        await UserOrm().bulk_add(users)
+
+    def _emby_user_row(self, telegram_id: int):
+        from models import User
+
+        emby_user = self.emby_api.create_user(f"bench{telegram_id}")
+        self.emby_ids[telegram_id] = emby_user["Id"]
+        return User(telegram_id=telegram_id, emby_id=emby_user["Id"],
+                    emby_name=emby_user["Name"])
+
+    async def new_emby_member(self) -> int:
+        """新建一个已绑定 Emby 账号的群成员"""
+        from models.user_model import UserOrm
+
+        telegram_id = self.new_member()
+        await UserOrm().add(self._emby_user_row(telegram_id))
+        return telegram_id
+
+    def join(self, telegram_id: int):
+        self.config.group_members[telegram_id] = self.updates.user(
+            telegram_id)
+
+    def new_member(self) -> int:
+        telegram_id = next(self.ids)
+        self.join(telegram_id)
+        return telegram_id
+
+    def emby_user(self, i: int) -> int:
+        return self.emby_users[i % len(self.emby_users)]
+
+    async def fresh_code(self) -> str:
+        codes = await self.user_service.create_invite_code(ADMIN_ID, 1)
+        return codes[0].code
+
+
+async def _use_code(ctx: BenchContext, i: int):
+    code = await ctx.fresh_code()
+    return ctx.updates.message(ctx.new_member(), f"/use_code {code}")
+
+
+async def _create(ctx: BenchContext, i: int):
+    telegram_id = ctx.new_member()
+    await ctx.user_service.redeem_code(telegram_id, await ctx.fresh_code())
+    return ctx.updates.message(telegram_id, f"/create bench{telegram_id}")
+
+
+async def _ban_target(ctx: BenchContext, i: int, banned: bool) -> int:
+    """把目标用户预置为相反的封禁状态，保证每次调用都走完整流程"""
+    from models import User
+    from models.user_model import UserOrm
+
+    target = ctx.ban_targets[i % len(ctx.ban_targets)]
+    await UserOrm().update(
+        {"ban_time": 0 if banned else int(time.time()), "reason": None},
+        conds=[User.telegram_id == target])
+    return target
+
+
+async def _ban(ctx: BenchContext, i: int):
+    return ctx.updates.message(ADMIN_ID, "/ban_emby 基准测试", private=False,
+                               reply_to=await _ban_target(ctx, i, True))
+
+
+async def _ban_username(ctx: BenchContext, i: int):
+    """每次使用新的用户名缓存，都走查库后向 Telegram 解析的路径"""
+    from services.username_service import UsernameService
+
+    ctx.user_service.username_service = UsernameService()
+    target = await _ban_target(ctx, i, True)
+    return ctx.updates.message(ADMIN_ID, f"/ban_emby @user{target}",
+                               private=False)
+
+
+async def _unban(ctx: BenchContext, i: int):
+    return ctx.updates.message(ADMIN_ID, "/unban_emby", private=False,
+                               reply_to=await _ban_target(ctx, i, False))
+
+
+async def _member_leave(ctx: BenchContext, i: int):
+    telegram_id = await ctx.new_emby_member()
+    return ctx.updates.member_left(telegram_id)
+
+
+def _info(warm: bool):
+    """/info 是否请求 Emby 取决于资料缓存，准备阶段固定缓存状态，使每次调用的开销与次数无关"""
+    async def prepare(ctx: BenchContext, i: int):
+        telegram_id = ctx.emby_user(i)
+        emby_id = ctx.emby_ids[telegram_id]
+        if warm:
+            await asyncio.to_thread(ctx.user_service.get_emby_profile,
+                                    emby_id)
+        else:
+            ctx.user_service.invalidate_emby_profile(emby_id)
+        return ctx.updates.message(telegram_id, "/info", private=False)
+
+    return prepare
+
+
+def _message(text: str, private: bool = True, admin: bool = False):
+    async def prepare(ctx: BenchContext, i: int):
+        telegram_id = ADMIN_ID if admin else ctx.emby_user(i)
+        return ctx.updates.message(telegram_id, text, private=private)
+
+    return prepare
+
+
+SCENARIOS = [
+    Scenario("help", _message("/help")),
+    Scenario("count", _message("/count", private=False)),
+    Scenario("info", _info(warm=True)),
+    Scenario("info_cold", _info(warm=False)),
+    Scenario("select_line", _message("/select_line")),
+    Scenario("route_callback", lambda ctx, i: _async(
+        ctx.updates.callback(ctx.emby_user(i), f"SELECTROUTE_{i % 5 + 1}"))),
+    Scenario("reset_emby_password", _message("/reset_emby_password")),
+    Scenario("use_code", _use_code),
+    Scenario("create", _create),
+    Scenario("new_code", _message("/new_code 1", admin=True)),
+    Scenario("ban_emby", _ban),
+    Scenario("ban_emby_username", _ban_username),
+    Scenario("unban_emby", _unban),
+    Scenario("stats", _message("/stats", admin=True)),
+    Scenario("member_join", lambda ctx, i: _async(
+        ctx.updates.member_joined(next(ctx.ids)))),
+    Scenario("member_leave", _member_leave),
+]
+
+
+async def _async(value):
+    return value
+
+
+def _is_error(sent: List[Dict]) -> bool:
+    for item in sent:
+        text = item.get("text") or ""
+        if item["kind"] == "answer" and "失败" in text:
+            return True
+        if item["kind"] != "answer" and any(m in text for m in ERROR_MARKERS):
+            return True
+    return False
+
+
+async def run_scenario(ctx: BenchContext, scenario: Scenario,
+                       iterations: int) -> Result:
+    from core.database import db_metrics
+
+    result = Result(scenario.name)
+    for i in range(iterations):
+        update = await scenario.prepare(ctx, i)
+        ctx.client.take_sent()
+        queries, http_calls = db_metrics.queries, ctx.counter.total
+        started = time.perf_counter()
+        try:
+            handled = await ctx.client.dispatch(update)
+        except Exception as e:
+            logging.getLogger(__name__).warning(
+                f"{scenario.name} raised: {e!r}")
+            handled = False
+        elapsed = time.perf_counter() - started
+        result.latencies.append(elapsed)
+        result.elapsed += elapsed
+        result.queries += db_metrics.queries - queries
+        result.http_calls += ctx.counter.total - http_calls
+        if not handled or _is_error(ctx.client.take_sent()):
+            result.errors += 1
+    return result
+
+
+def compare_baseline(results: Dict[str, Dict], baseline: Dict[str, Dict],
+                     tolerance: float) -> List[str]:
+    """查询数或 HTTP 调用数超过基线（含容差）即视为回退"""
+    regressions = []
+    for name, summary in results.items():
+        if summary["errors"]:
+            regressions.append(f"{name}: {summary['errors']} 次调用失败")
+        expected = baseline.get(name)
+        if not expected:
+            continue
+        for key in ("queries", "http"):
+            limit = expected[key] * (1 + tolerance) + 0.05
+            if summary[key] > limit:
+                regressions.append(
+                    f"{name}: {key} {summary[key]} > 基线 {expected[key]}")
+    return regressions
+
+
+def print_table(results: Dict[str, Dict]) -> None:
+    header = (f"{'command':<22}{'ops':>6}{'p50 ms':>10}{'p99 ms':>10}"
+              f"{'ops/s':>10}{'queries':>9}{'http':>7}{'errors':>8}")
+    print(header)
+    print("-" * len(header))
+    for name, s in results.items():
+        print(f"{name:<22}{s['ops']:>6}{s['p50_ms']:>10.2f}"
+              f"{s['p99_ms']:>10.2f}{s['ops_per_sec']:>10.1f}"
+              f"{s['queries']:>9.2f}{s['http']:>7.2f}{s['errors']:>8}")
+
+
+async def main_async(args) -> int:
+    ctx = BenchContext(args.emby_latency_ms, args.pool_size)
+    await ctx.setup()
+    only = set(args.only.split(",")) if args.only else None
+    results = {}
+    try:
+        for scenario in SCENARIOS:
+            if only and scenario.name not in only:
+                continue
+            # 预热一次，排除首次加载、缓存冷启动的影响
+            await run_scenario(ctx, scenario, 1)
+            result = await run_scenario(ctx, scenario, args.iterations)
+            results[scenario.name] = result.summary()
+    finally:
+        from py_tools.connections.db.mysql import DBManager
+        await DBManager.DB_CLIENT.db_engine.dispose()
+        ctx.client.executor.shutdown(wait=False)
+
+    print_table(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.write_baseline:
+        with open(args.write_baseline, "w", encoding="utf-8") as f:
+            json.dump({name: {"queries": s["queries"], "http": s["http"]}
+                       for name, s in results.items()},
+                      f, ensure_ascii=False, indent=2)
+            f.write("\n")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_baseline(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="命令处理器端到端基准测试")
+    parser.add_argument("-n", "--iterations", type=int, default=200,
+                        help="每条命令的调用次数")
+    parser.add_argument("--pool-size", type=int, default=50,
+                        help="预先创建的 Emby 用户数量")
+    parser.add_argument("--only", help="只运行指定命令，逗号分隔")
+    parser.add_argument("--emby-latency-ms", type=float, default=0,
+                        help="模拟每次 Emby / 线路 HTTP 请求的阻塞耗时")
+    parser.add_argument("--db-path", help="SQLite 文件路径，默认使用临时目录")
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    parser.add_argument("--baseline", help="与基线比较查询数与 HTTP 调用数")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="允许超出基线的比例")
+    parser.add_argument("--write-baseline", help="把本次结果写为基线文件")
+    args = parser.parse_args()
+
+    setup_environment(args.db_path)
+    logging.basicConfig(level=logging.WARNING,
+                        format="%(levelname)s %(name)s - %(message)s")
+    return asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,278 @@
+"""
+Telegram 更新回放压测：按设定速率把合成或录制的更新流投递到与 Pyrogram 相同的
+“队列 + 多 worker” 分发模型中，处理器由 setup_command_routes 注册，
+数据库使用临时 SQLite 文件，Emby 与线路 API 使用替身对象。
+
+输出实际吞吐、排队延迟、处理耗时的分位数以及按类型、按原因统计的错误。
+
+更新流为 JSONL，每行一个事件，t 为相对开始时间的秒数（可省略，按 --rate 均匀投递）：
+    {"t": 0.01, "type": "message", "user": "member", "chat": "group", "text": "大家好"}
+    {"type": "message", "user": "emby", "chat": "private", "text": "/info"}
+    {"type": "message", "user": "new", "chat": "private", "text": "/create {name}"}
+    {"type": "callback", "user": "emby", "data": "SELECTROUTE_2"}
+    {"type": "join"}  {"type": "leave", "user": "emby"}
+user 为 emby（已有账号）、member（群成员）、new（新加入的成员）或具体的 telegram_id。
+
+用法：
+    python tools/bench/loadgen.py --rate 200 --duration 30 --workers 8
+    python tools/bench/loadgen.py --rate 500 --duration 10 --record rush.jsonl
+    python tools/bench/loadgen.py --replay rush.jsonl --speed 2
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import statistics
+import sys
+import time
+from collections import Counter
+from typing import Dict, Iterator, List, Optional
+
+from fakes import reply_capture, setup_environment
+
+# 默认流量构成：注册高峰期的群聊、查询、注册与线路切换
+DEFAULT_MIX = {
+    "chatter": 50,
+    "count": 8,
+    "info": 10,
+    "create": 12,
+    "select_line": 5,
+    "callback": 8,
+    "join": 5,
+    "leave": 2,
+}
+
+
+def synthetic_stream(mix: Dict[str, float], total: int,
+                     seed: int) -> Iterator[Dict]:
+    """按权重随机生成事件，不含时间戳"""
+    rng = random.Random(seed)
+    kinds, weights = zip(*mix.items(), strict=True)
+    for _ in range(total):
+        kind = rng.choices(kinds, weights)[0]
+        if kind == "chatter":
+            yield {"type": "message", "user": "member", "chat": "group",
+                   "text": rng.choice(["大家好", "有新片吗", "求邀请码", "+1"])}
+        elif kind in ("count", "info"):
+            yield {"type": "message", "user": "emby", "chat": "group",
+                   "text": f"/{kind}"}
+        elif kind == "create":
+            yield {"type": "message", "user": "new", "chat": "private",
+                   "text": "/create {name}"}
+        elif kind == "select_line":
+            yield {"type": "message", "user": "emby", "chat": "private",
+                   "text": "/select_line"}
+        elif kind == "callback":
+            yield {"type": "callback", "user": "emby",
+                   "data": f"SELECTROUTE_{rng.randint(1, 5)}"}
+        else:
+            yield {"type": kind, "user": "emby" if kind == "leave" else "new"}
+
+
+def event_kind(event: Dict) -> str:
+    """用于统计的事件类别：命令名、chatter、callback、join、leave"""
+    if event["type"] != "message":
+        return event["type"]
+    text = event.get("text") or ""
+    return text.split()[0].lstrip("/") if text.startswith("/") else "chatter"
+
+
+class LoadGenerator:
+    def __init__(self, ctx, workers: int, queue_size: int):
+        self.ctx = ctx
+        self.workers = workers
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.rng = random.Random(0)
+        self.queue_delays: List[float] = []
+        self.service_times: List[float] = []
+        self.latencies: List[float] = []
+        self.processed = Counter()
+        self.errors = Counter()
+        self.dropped = 0
+
+    def _resolve_user(self, user) -> int:
+        if user == "emby":
+            return self.rng.choice(self.ctx.emby_users)
+        if user == "new":
+            return self.ctx.new_member()
+        if user in (None, "member"):
+            return self.rng.choice(self.ctx.members)
+        return int(user)
+
+    def build_update(self, event: Dict):
+        """把事件转换为 Pyrogram 更新对象"""
+        updates = self.ctx.updates
+        if event["type"] == "join":
+            return updates.member_joined(self.ctx.new_member())
+        if event["type"] == "leave":
+            if event.get("user") == "emby" and len(self.ctx.emby_users) > 1:
+                # 退群的用户会被禁用，移出账号池以免后续事件选中
+                return updates.member_left(self.ctx.emby_users.pop())
+            return updates.member_left(self._resolve_user(event.get("user")))
+        telegram_id = self._resolve_user(event.get("user"))
+        if event["type"] == "callback":
+            return updates.callback(telegram_id, event["data"])
+        text = event["text"].format(name=f"rush{telegram_id}")
+        return updates.message(telegram_id, text,
+                               private=event.get("chat") != "group")
+
+    async def worker(self):
+        from handler_bench import ERROR_MARKERS
+
+        client = self.ctx.client
+        replies: List[Dict] = []
+        reply_capture.set(replies)
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+            kind, update, enqueued = item
+            started = time.perf_counter()
+            self.queue_delays.append(started - enqueued)
+            replies.clear()
+            try:
+                handled = await client.dispatch(update)
+                if not handled and kind != "chatter":
+                    self.errors[(kind, "未被任何处理器处理")] += 1
+            except Exception as e:
+                self.errors[(kind, f"异常 {type(e).__name__}")] += 1
+            finished = time.perf_counter()
+            self.service_times.append(finished - started)
+            self.latencies.append(finished - enqueued)
+            self.processed[kind] += 1
+            for sent in replies:
+                text = (sent.get("text") or "").split("\n")[0]
+                if any(marker in text for marker in ERROR_MARKERS):
+                    self.errors[(kind, text[:60])] += 1
+            self.queue.task_done()
+
+    async def run(self, events: List[Dict], rate: Optional[float],
+                  speed: float) -> float:
+        workers = [asyncio.create_task(self.worker())
+                   for _ in range(self.workers)]
+        started = time.perf_counter()
+        for i, event in enumerate(events):
+            offset = (event["t"] / speed if "t" in event and not rate
+                      else i / rate)
+            delay = started + offset - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            update = self.build_update(event)
+            try:
+                self.queue.put_nowait(
+                    (event_kind(event), update, time.perf_counter()))
+            except asyncio.QueueFull:
+                # 与 Pyrogram 不同，这里不让生产者阻塞，积压超过上限直接计为丢弃
+                self.dropped += 1
+        for _ in workers:
+            await self.queue.put(None)
+        await asyncio.gather(*workers)
+        return time.perf_counter() - started
+
+
+def _percentiles(values: List[float]) -> str:
+    if not values:
+        return "-"
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000
+
+    return (f"p50 {statistics.median(ordered) * 1000:.1f}ms  "
+            f"p95 {pick(0.95):.1f}ms  p99 {pick(0.99):.1f}ms  "
+            f"max {ordered[-1] * 1000:.1f}ms")
+
+
+def print_report(gen: LoadGenerator, offered: int, elapsed: float,
+                 target_rate: Optional[float]) -> None:
+    done = sum(gen.processed.values())
+    print(f"投递事件：{offered}，处理完成：{done}，丢弃：{gen.dropped}")
+    if target_rate:
+        print(f"目标速率：{target_rate:.1f}/s")
+    print(f"实际吞吐：{done / elapsed:.1f}/s（总耗时 {elapsed:.2f}s）")
+    print(f"排队延迟：{_percentiles(gen.queue_delays)}")
+    print(f"处理耗时：{_percentiles(gen.service_times)}")
+    print(f"端到端：  {_percentiles(gen.latencies)}")
+    print("按类型处理数：" + "，".join(
+        f"{k} {v}" for k, v in gen.processed.most_common()))
+    if gen.errors:
+        print("错误统计：")
+        for (kind, reason), n in gen.errors.most_common():
+            print(f"  {kind:<14}{n:>6}  {reason}")
+    else:
+        print("错误统计：无")
+
+
+async def main_async(args) -> int:
+    from handler_bench import BenchContext
+
+    if args.replay:
+        with open(args.replay, encoding="utf-8") as f:
+            events = [json.loads(line) for line in f if line.strip()]
+    else:
+        total = int(args.rate * args.duration)
+        events = list(synthetic_stream(DEFAULT_MIX, total, args.seed))
+        for i, event in enumerate(events):
+            event["t"] = round(i / args.rate, 4)
+    if args.record:
+        with open(args.record, "w", encoding="utf-8") as f:
+            for event in events:
+                f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+    ctx = BenchContext(args.emby_latency_ms, args.pool_size)
+    await ctx.setup()
+    ctx.members = [ctx.new_member() for _ in range(args.pool_size)]
+    await ctx.user_service.set_emby_config(
+        ctx.config.admin_list[0], register_public_user=args.register_slots)
+
+    gen = LoadGenerator(ctx, args.workers, args.queue_size)
+    try:
+        elapsed = await gen.run(events, None if args.replay else args.rate,
+                                args.speed)
+    finally:
+        from py_tools.connections.db.mysql import DBManager
+        await DBManager.DB_CLIENT.db_engine.dispose()
+        ctx.client.executor.shutdown(wait=False)
+
+    print_report(gen, len(events), elapsed,
+                 None if args.replay else args.rate)
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Telegram 更新回放压测")
+    parser.add_argument("--rate", type=float, default=100,
+                        help="每秒投递的更新数（合成流量）")
+    parser.add_argument("--duration", type=float, default=10,
+                        help="合成流量的持续时间（秒）")
+    parser.add_argument("--replay", help="回放录制的 JSONL 更新流")
+    parser.add_argument("--speed", type=float, default=1,
+                        help="回放倍速，按事件中的 t 字段计时")
+    parser.add_argument("--record", help="把本次使用的更新流写入 JSONL 文件")
+    parser.add_argument("--workers", type=int, default=8,
+                        help="并发处理更新的 worker 数，对应 Pyrogram 的 workers")
+    parser.add_argument("--queue-size", type=int, default=10000,
+                        help="更新队列上限，超过后丢弃")
+    parser.add_argument("--pool-size", type=int, default=200,
+                        help="预先创建的 Emby 用户与群成员数量")
+    parser.add_argument("--register-slots", type=int, default=100,
+                        help="开放的公共注册名额，用完后 /create 会被拒绝")
+    parser.add_argument("--emby-latency-ms", type=float, default=0,
+                        help="模拟每次 Emby / 线路 HTTP 请求的阻塞耗时")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db-path", help="SQLite 文件路径，默认使用临时目录")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="输出处理器的错误日志")
+    args = parser.parse_args()
+
+    setup_environment(args.db_path)
+    logging.basicConfig(
+        level=logging.WARNING if args.verbose else logging.CRITICAL,
+        format="%(levelname)s %(name)s - %(message)s")
+    return asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
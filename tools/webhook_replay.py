@@ -0,0 +1,59 @@
+"""
+模拟 Emby 发送 webhook 通知：把录制好的 JSON 负载逐个 POST 到 bot 的 webhook 接收服务。
+
+用法：
+    python tools/webhook_replay.py tools/webhook_payloads
+    python tools/webhook_replay.py --url http://127.0.0.1:8081/emby/webhook \
+        --token webhooktoken --form tools/webhook_payloads/user_deleted.json
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import requests
+
+
+def iter_payload_files(paths):
+    for path in map(Path, paths):
+        if path.is_dir():
+            yield from sorted(path.glob("*.json"))
+        else:
+            yield path
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="回放 Emby webhook 负载")
+    parser.add_argument("paths", nargs="+", help="JSON 文件或包含 JSON 的目录")
+    parser.add_argument("--url", default="http://127.0.0.1:8081/emby/webhook")
+    parser.add_argument("--token", default="")
+    parser.add_argument("--form", action="store_true",
+                        help="使用 multipart/form-data 发送（与 Emby 通知插件一致）")
+    parser.add_argument("--delay", type=float, default=0,
+                        help="每次发送之间的间隔秒数")
+    args = parser.parse_args()
+
+    params = {"token": args.token} if args.token else None
+    failed = 0
+    for path in iter_payload_files(args.paths):
+        payload = json.loads(path.read_text(encoding="utf-8"))
+        if args.form:
+            response = requests.post(
+                args.url, params=params, timeout=10,
+                files={"data": (None, json.dumps(payload, ensure_ascii=False))},
+            )
+        else:
+            response = requests.post(args.url, params=params, json=payload,
+                                     timeout=10)
+        ok = response.status_code < 300
+        failed += not ok
+        print(f"{'OK ' if ok else 'ERR'} {response.status_code} "
+              f"{payload.get('Event')} <- {path}")
+        if args.delay:
+            time.sleep(args.delay)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+import atexit
+import copy
+import json
+import logging
+import queue
+from collections import Counter
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, \
+    RotatingFileHandler, TimedRotatingFileHandler
+from typing import Dict, Optional
+
+TEXT_FORMAT = "%(levelname)s [%(asctime)s] %(name)s - %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+_listener: Optional[QueueListener] = None
+_exc_formatter = logging.Formatter()
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行 JSON，便于日志平台解析"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(
+                timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "module": record.module,
+            "line": record.lineno,
+            "thread": record.threadName,
+        }
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(QueueHandler):
+    """
+    入队前只合并消息参数并把异常格式化为文本，保留 exc_text 字段，
+    由 QueueListener 中的格式化器决定最终输出（文本或 JSON）。
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = (record.exc_text
+                               or _exc_formatter.formatException(
+                                   record.exc_info))
+            record.exc_info = None
+        return record
+
+
+class DebugSampler(logging.Filter):
+    """
+    DEBUG 日志按调用位置采样，每个位置每 rate 条只保留第 1 条，
+    避免高频请求的调试日志淹没其他输出；INFO 及以上级别不受影响。
+    """
+
+    def __init__(self, rate: int):
+        super().__init__()
+        self.rate = rate
+        self._counts: Counter = Counter()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate <= 1:
+            return True
+        key = (record.pathname, record.lineno)
+        self._counts[key] += 1
+        return self._counts[key] % self.rate == 1
+
+
+def parse_levels(spec: str) -> Dict[str, str]:
+    """解析 "core.emby_api=DEBUG,pyrogram=WARNING" 格式的模块日志级别"""
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, level = item.partition("=")
+        if not level:
+            raise ValueError(f"invalid LOG_LEVELS item: {item}")
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def _file_handler(path: str, max_bytes: int, rotate_when: str,
+                  backup_count: int) -> logging.Handler:
+    if rotate_when:
+        return TimedRotatingFileHandler(
+            path, when=rotate_when, backupCount=backup_count,
+            encoding="utf-8")
+    return RotatingFileHandler(path, maxBytes=max_bytes,
+                               backupCount=backup_count, encoding="utf-8")
+
+
+def setup_logging(level: str = "INFO", log_file: str = "",
+                  fmt: str = "text", levels: str = "",
+                  max_bytes: int = 10 * 1024 * 1024, rotate_when: str = "",
+                  backup_count: int = 7,
+                  debug_sample_rate: int = 1) -> QueueListener:
+    """
+    初始化日志：根 logger 只挂一个 QueueHandler，终端与文件输出由后台线程的
+    QueueListener 完成，事件循环中记录日志不会因磁盘 I/O 阻塞。
+    重复调用会替换之前的配置，不会重复添加处理器。
+
+    :param level: 根日志级别
+    :param log_file: 日志文件路径，为空时只输出到终端
+    :param fmt: text 或 json
+    :param levels: 按模块覆盖日志级别，如 "pyrogram=WARNING,core.emby_api=DEBUG"
+    :param max_bytes: 按大小轮转的阈值，0 表示不轮转
+    :param rotate_when: 设置后按时间轮转，取值同 TimedRotatingFileHandler 的 when，如 midnight
+    :param backup_count: 保留的历史日志文件数
+    :param debug_sample_rate: DEBUG 日志每个调用位置每 N 条保留 1 条
+    :return: 已启动的 QueueListener，进程退出时自动停止并刷新剩余日志
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        atexit.unregister(_listener.stop)
+        for handler in _listener.handlers:
+            handler.close()
+
+    formatter = JsonFormatter() if fmt == "json" else logging.Formatter(
+        fmt=TEXT_FORMAT, datefmt=DATE_FORMAT)
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.append(_file_handler(log_file, max_bytes, rotate_when,
+                                      backup_count))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(DebugSampler(debug_sample_rate))
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper())
+    for name, module_level in parse_levels(levels).items():
+        logging.getLogger(name).setLevel(module_level)
+
+    _listener = QueueListener(log_queue, *handlers,
+                              respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
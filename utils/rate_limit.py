@@ -0,0 +1,47 @@
+import asyncio
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    异步令牌桶：平均每秒发放 rate 个令牌，最多积攒 capacity 个用于突发。
+    等待令牌的协程按先来后到排队；pause 可让所有等待者一起暂停，用于处理服务端限流。
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """
+        :param rate: 每秒发放的令牌数
+        :param capacity: 桶容量，默认等于 rate（即最多一秒的突发）
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """取走一个令牌，令牌不足或处于暂停期时等待"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (
+                        now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """在接下来 seconds 秒内不再发放令牌，已积攒的令牌清空，暂停结束后重新积攒"""
+        self._paused_until = max(self._paused_until,
+                                 time.monotonic() + seconds)
+        self._tokens = 0
+        self._updated = self._paused_until
@@ -0,0 +1,105 @@
+import bisect
+import re
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Sequence, Set, Tuple
+
+_STRIP = re.compile(r"[\W_]+")
+
+# 匹配类型的基础分，模糊匹配的分数为二元组重合率（0 ~ 1）
+EXACT_SCORE = 4.0
+PREFIX_SCORE = 3.0
+SUBSTRING_SCORE = 2.0
+
+
+def normalize(text: str) -> str:
+    """小写并去掉空白与标点，用于建立索引和查询"""
+    return _STRIP.sub("", text.lower()) if text else ""
+
+
+def _bigrams(text: str) -> set:
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class SearchIndex:
+    """
+    只读的内存搜索索引。每个条目有多个检索键（如标题、原名、拼音、首字母），支持：
+    - 前缀：在排序后的键列表上二分查找；
+    - 子串与模糊：通过二元组倒排表取候选，再按子串或二元组重合率打分。
+    构建后不再修改，更新时整体重建并替换引用，查询无需加锁。
+    """
+
+    def __init__(self, entries: Iterable[Tuple[Any, Sequence[str]]]):
+        """
+        :param entries: (条目, 检索键列表) 序列
+        """
+        self.items: List[Any] = []
+        self._item_keys: List[List[str]] = []
+        self._keys: List[Tuple[str, int]] = []
+        self._grams: Dict[str, Set[int]] = defaultdict(set)
+        for item, keys in entries:
+            index = len(self.items)
+            self.items.append(item)
+            item_keys = [key for key in {normalize(k) for k in keys if k}
+                         if key]
+            self._item_keys.append(item_keys)
+            for key in item_keys:
+                self._keys.append((key, index))
+                for gram in _bigrams(key):
+                    self._grams[gram].add(index)
+        self._keys.sort()
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def _key_matches(self, query: str) -> Dict[int, float]:
+        """精确与前缀匹配"""
+        scores: Dict[int, float] = {}
+        position = bisect.bisect_left(self._keys, (query, -1))
+        while position < len(self._keys):
+            key, index = self._keys[position]
+            if not key.startswith(query):
+                break
+            score = EXACT_SCORE if key == query else PREFIX_SCORE
+            scores[index] = max(scores.get(index, 0), score)
+            position += 1
+        return scores
+
+    def _gram_matches(self, query: str,
+                      min_ratio: float) -> Dict[int, float]:
+        """子串与模糊匹配，按查询的二元组在条目中出现的比例打分"""
+        grams = _bigrams(query)
+        if not grams:
+            return {}
+        counts: Dict[int, int] = defaultdict(int)
+        for gram in grams:
+            for index in self._grams.get(gram, ()):
+                counts[index] += 1
+        scores: Dict[int, float] = {}
+        for index, count in counts.items():
+            ratio = count / len(grams)
+            if ratio < min_ratio:
+                continue
+            scores[index] = ratio
+        return scores
+
+    def search(self, query: str, limit: int = 10,
+               min_ratio: float = 0.6) -> List[Tuple[Any, float]]:
+        """
+        :param query: 查询词
+        :param limit: 最多返回的条目数
+        :param min_ratio: 模糊匹配要求的最低二元组重合率
+        :return: 按得分倒序的 (条目, 得分)
+        """
+        query = normalize(query)
+        if not query:
+            return []
+        scores = self._gram_matches(query, min_ratio)
+        # 全部二元组都命中的候选再确认是否为子串
+        for index, ratio in scores.items():
+            if ratio == 1 and any(
+                    query in key for key in self._item_keys[index]):
+                scores[index] = SUBSTRING_SCORE
+        for index, score in self._key_matches(query).items():
+            scores[index] = max(scores.get(index, 0), score)
+        ranked = sorted(scores.items(), key=lambda s: s[1], reverse=True)
+        return [(self.items[index], score) for index, score in ranked[:limit]]